@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Category, Module, Video, Task, TaskQuestion, UserCourse, StudentProgress, TaskSubmission
+from django.db.models import Count
+from .models import (
+    Category, Module, Video, Task, BankQuestion, TaskQuestion, UserCourse, StudentProgress, VideoCompletion,
+    TaskCompletion, TaskSubmission, UploadSession, VideoWatchState,
+)
 
 
 @admin.register(Category)
@@ -32,10 +36,18 @@ class TaskAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description']
 
 
+@admin.register(BankQuestion)
+class BankQuestionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'question', 'correct_answer', 'updated_at']
+    search_fields = ['question', 'description']
+
+
 @admin.register(TaskQuestion)
 class TaskQuestionAdmin(admin.ModelAdmin):
-    list_display = ['id', 'task', 'question', 'order']
+    list_display = ['id', 'task', 'bank_question', 'order']
     list_filter = ['task']
+    list_select_related = ['task', 'bank_question']
+    raw_id_fields = ['bank_question']
     ordering = ['task', 'order']
 
 
@@ -50,18 +62,52 @@ class UserCourseAdmin(admin.ModelAdmin):
 class StudentProgressAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'completed_videos_count', 'completed_tasks_count']
     search_fields = ['user__username']
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            num_videos=Count('user__video_completions', distinct=True),
+            num_tasks=Count('user__task_completions', distinct=True),
+        )
+
     def completed_videos_count(self, obj):
-        return len(obj.completed_videos) if obj.completed_videos else 0
+        return obj.num_videos
     completed_videos_count.short_description = 'Completed Videos'
-    
+
     def completed_tasks_count(self, obj):
-        return len(obj.completed_tasks) if obj.completed_tasks else 0
+        return obj.num_tasks
     completed_tasks_count.short_description = 'Completed Tasks'
 
 
+@admin.register(VideoCompletion)
+class VideoCompletionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'video', 'completed_at']
+    list_filter = ['completed_at', 'video__category']
+    search_fields = ['user__username', 'video__title']
+
+
+@admin.register(TaskCompletion)
+class TaskCompletionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'task', 'completed_at']
+    list_filter = ['completed_at']
+    search_fields = ['user__username', 'task__title']
+
+
+@admin.register(VideoWatchState)
+class VideoWatchStateAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'video', 'position', 'watched_seconds', 'updated_at']
+    list_filter = ['updated_at', 'video__category']
+    search_fields = ['user__username', 'video__title']
+
+
 @admin.register(TaskSubmission)
 class TaskSubmissionAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'task', 'score', 'total', 'submitted_at']
     list_filter = ['submitted_at', 'task__video__category']
     search_fields = ['user__username', 'task__title']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'purpose', 'filename', 'size', 'offset', 'status', 'created_at']
+    list_filter = ['purpose', 'status', 'created_at']
+    search_fields = ['user__username', 'filename']
@@ -0,0 +1,98 @@
+import logging
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import VideoWatchState
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_TIMEOUT = 60 * 5
+# Share of the video a viewer has to have watched to count as completing it
+COMPLETION_THRESHOLD = 0.9
+
+
+def _key(video_id):
+    return f'analytics:retention:{video_id}'
+
+
+def _ranges(value):
+    """A row's watched ranges as an (n, 2) array; None if they aren't a list of [start, end] pairs"""
+    try:
+        return np.asarray(value or [], dtype=np.float64).reshape(-1, 2)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_watch_data(video_id):
+    """(viewer index of each range, watched ranges as an (n, 2) array of [start, end], viewer count) of a video
+
+    A row whose ranges are malformed still counts as a viewer, with none of its ranges.
+    """
+    rows = VideoWatchState.objects.filter(video_id=video_id).values_list('pk', 'watched_ranges')
+    viewers, arrays = 0, []
+    for pk, value in rows.iterator():
+        ranges = _ranges(value)
+        if ranges is None:
+            logger.warning(f'Skipping malformed watched ranges of watch state {pk}')
+            ranges = np.empty((0, 2))
+        arrays.append(ranges)
+        viewers += 1
+    if not arrays:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2)), 0
+    counts = np.fromiter((len(ranges) for ranges in arrays), dtype=np.int64, count=viewers)
+    return np.repeat(np.arange(viewers), counts), np.concatenate(arrays), viewers
+
+
+def watch_time(viewer, intervals, viewers, duration):
+    """Seconds each viewer watched, counting only ranges within the video's duration"""
+    clipped = np.clip(intervals, 0, duration)
+    return np.bincount(viewer, weights=clipped[:, 1] - clipped[:, 0], minlength=viewers)
+
+
+def retention_curve(intervals, duration):
+    """How many viewers watched each second of the video
+
+    A viewer's ranges never overlap, so rounding both ends to whole seconds
+    counts each viewer at most once per second; the curve is the running sum
+    of +1 at every range start and -1 at every range end.
+    """
+    bounds = np.clip(np.rint(intervals), 0, duration).astype(np.int64)
+    changes = (
+        np.bincount(bounds[:, 0], minlength=duration + 1)
+        - np.bincount(bounds[:, 1], minlength=duration + 1)
+    )
+    return np.cumsum(changes[:duration])
+
+
+def compute(video):
+    """Retention curve, median watch time and completion rate of a video from its watch states"""
+    viewer, intervals, viewers = load_watch_data(video.pk)
+    duration = video.duration_seconds or (int(np.ceil(intervals[:, 1].max())) if len(intervals) else 0)
+    if not viewers:
+        return {
+            'video_id': video.pk, 'duration_seconds': duration, 'viewers': 0, 'retention': [],
+            'median_watch_seconds': 0, 'average_watch_seconds': 0, 'completion_rate': 0,
+        }
+    # Recomputed from the clipped ranges rather than trusting the stored watched_seconds
+    watched = watch_time(viewer, intervals, viewers, duration)
+    completed = np.count_nonzero(watched >= COMPLETION_THRESHOLD * duration) if duration else 0
+    return {
+        'video_id': video.pk,
+        'duration_seconds': duration,
+        'viewers': viewers,
+        # Viewers still watching at each second; divide by `viewers` for the share
+        'retention': retention_curve(intervals, duration).tolist(),
+        'median_watch_seconds': round(float(np.median(watched)), 1),
+        'average_watch_seconds': round(float(watched.mean()), 1),
+        'completion_rate': round(completed * 100 / viewers, 1),
+    }
+
+
+def video_analytics(video):
+    """compute() cached for ANALYTICS_TIMEOUT seconds per video"""
+    result = cache.get(_key(video.pk))
+    if result is None:
+        result = compute(video)
+        cache.set(_key(video.pk), result, ANALYTICS_TIMEOUT)
+    return result
@@ -0,0 +1,35 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _run(fn, args):
+    close_old_connections()
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception(f'Background job {fn.__name__}{args} failed')
+    finally:
+        # Worker threads outlive the request; don't leave their connections open
+        connections.close_all()
+
+
+def submit(fn, *args):
+    """Run fn(*args) on the shared worker thread pool, off the request path"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background'
+        )
+    return _executor.submit(_run, fn, args)
+
+
+def init_worker_process():
+    """ProcessPoolExecutor initializer: connections inherited from the parent must not be shared"""
+    connections.close_all()
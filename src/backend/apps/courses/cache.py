@@ -0,0 +1,75 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+GLOBAL_SCOPE = 'all'
+
+
+def _version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def get_catalog_version(scope=GLOBAL_SCOPE):
+    """Current catalog version for a category id (or the global scope)"""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version key lost to eviction never
+        # reuses a number an older payload was cached under
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(category_id=None):
+    """Invalidate cached catalog payloads of a category and every cross-category listing"""
+    scopes = [GLOBAL_SCOPE]
+    if category_id is not None:
+        scopes.append(category_id)
+
+    def bump():
+        for scope in scopes:
+            key = _version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                get_catalog_version(scope)
+            else:
+                # Backends without a native incr (file, database) re-set the key with
+                # the default timeout; versions must not expire
+                cache.touch(key, None)
+
+    # Readers must not cache a payload built from rows that are about to be rolled back
+    transaction.on_commit(bump)
+
+
+class CatalogCacheMixin:
+    """Serve catalog GET responses from the cache, keyed by catalog version, with strong ETags"""
+
+    def catalog_response(self, request, build, scope=GLOBAL_SCOPE):
+        user = request.user
+        audience = 'staff' if (user.is_staff or user.is_superuser) else 'student'
+        variant = '|'.join([
+            request.get_host(), request.get_full_path(), audience, str(get_catalog_version(scope)),
+        ])
+        digest = hashlib.sha256(variant.encode()).hexdigest()
+        etag = f'"{digest}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        key = f'catalog:payload:{digest}'
+        payload = cache.get(key)
+        if payload is None:
+            # Round-trip through JSON so only plain data (no serializer references) is pickled
+            payload = json.loads(json.dumps(build(), cls=JSONEncoder))
+            cache.set(key, payload, CATALOG_CACHE_TIMEOUT)
+        return Response(payload, headers={'ETag': etag})
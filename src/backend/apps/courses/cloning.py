@@ -0,0 +1,73 @@
+import logging
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .models import Category, Module, Video, Task, TaskQuestion
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# Per-row state that belongs to the original, not to the course content
+RESET_FIELDS = {
+    Video: {'view_count': 0},
+}
+
+
+def _copy(instance, **overrides):
+    """Unsaved copy of a row; file fields keep pointing at the same stored files"""
+    model = type(instance)
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+    }
+    values.update(RESET_FIELDS.get(model, {}))
+    values.update(overrides)
+    return model(**values)
+
+
+def _bulk_copy(queryset, remap):
+    """Copy every row of `queryset` with `remap(row)` overrides; returns {old id: new id}"""
+    originals = list(queryset)
+    copies = [_copy(row, **remap(row)) for row in originals]
+    # Needs a backend that returns ids from bulk inserts (PostgreSQL, SQLite 3.35+, MariaDB 10.5+)
+    queryset.model.objects.bulk_create(copies, batch_size=BATCH_SIZE)
+    return {original.pk: copy.pk for original, copy in zip(originals, copies)}
+
+
+def clone_category(category, name=None, is_active=False):
+    """Deep-copy a course with its modules, videos, tasks and question links in one transaction
+
+    Each level is inserted with batched bulk_create and the new ids are used to
+    rewrite the foreign keys of the next level, so the query count depends on
+    the number of batches, not rows. Bank questions are shared, not copied. The
+    clone starts inactive so it can be edited before students see it.
+    """
+    with transaction.atomic():
+        clone = _copy(category, name=name or f'{category.name} (copy)', is_active=is_active)
+        clone.save()
+
+        module_ids = _bulk_copy(Module.objects.filter(category=category), lambda module: {
+            'category_id': clone.pk,
+        })
+        video_ids = _bulk_copy(Video.objects.filter(category=category), lambda video: {
+            'category_id': clone.pk,
+            'module_id': module_ids.get(video.module_id),
+        })
+        task_ids = _bulk_copy(Task.objects.filter(video__category=category), lambda task: {
+            'video_id': video_ids[task.video_id],
+        })
+        _bulk_copy(TaskQuestion.objects.filter(task__video__category=category), lambda question: {
+            'task_id': task_ids[question.task_id],
+        })
+
+        # bulk_create() skips the save signals
+        bump_catalog_version(clone.pk)
+
+    logger.info(
+        f'Cloned category {category.pk} into {clone.pk}: '
+        f'{len(module_ids)} modules, {len(video_ids)} videos, {len(task_ids)} tasks'
+    )
+    return clone
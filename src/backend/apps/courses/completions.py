@@ -0,0 +1,121 @@
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import summaries
+from .models import Task, TaskCompletion, Video, VideoCompletion
+
+MAX_SYNC_EVENTS = 500
+
+# Event type -> (completion model, item field, item model); the cursor has one part per type in this order
+KINDS = {
+    'video': (VideoCompletion, 'video_id', Video),
+    'task': (TaskCompletion, 'task_id', Task),
+}
+
+
+def complete(user, video_ids=(), task_ids=()):
+    """Record completions; ones the user already has keep their original timestamp
+
+    Each kind is one INSERT ... ON CONFLICT DO NOTHING against the unique
+    (user, item) index, so repeated and concurrent calls are safe.
+    """
+    with transaction.atomic():
+        VideoCompletion.objects.bulk_create(
+            [VideoCompletion(user=user, video_id=video_id) for video_id in video_ids], ignore_conflicts=True,
+        )
+        TaskCompletion.objects.bulk_create(
+            [TaskCompletion(user=user, task_id=task_id) for task_id in task_ids], ignore_conflicts=True,
+        )
+        refresh_summaries(user, video_ids, task_ids)
+
+
+def refresh_summaries(user, video_ids=(), task_ids=()):
+    """Update the user's progress summaries of the courses these videos and tasks belong to"""
+    category_ids = set()
+    if video_ids:
+        category_ids.update(Video.objects.filter(pk__in=video_ids).values_list('category_id', flat=True))
+    if task_ids:
+        category_ids.update(Task.objects.filter(pk__in=task_ids).values_list('video__category_id', flat=True))
+    summaries.refresh((user.pk, category_id) for category_id in category_ids)
+
+
+def _parse_cursor(cursor):
+    if not cursor:
+        return [0] * len(KINDS)
+    try:
+        after = [int(part) for part in str(cursor).split('-')]
+    except ValueError:
+        after = []
+    if len(after) != len(KINDS):
+        raise ValueError('Invalid cursor')
+    return after
+
+
+def _parse_time(value, now):
+    # Missing or unparsable times count as now; clocks ahead of the server are clamped to now
+    try:
+        moment = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        return now
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return min(moment, now)
+
+
+def _parse_events(events):
+    """{type: {item id: earliest completion time}}"""
+    if not isinstance(events, list):
+        raise ValueError('events must be a list')
+    if len(events) > MAX_SYNC_EVENTS:
+        raise ValueError(f'At most {MAX_SYNC_EVENTS} events per sync')
+    now = timezone.now()
+    parsed = {kind: {} for kind in KINDS}
+    for event in events:
+        try:
+            items, item_id = parsed[event['type']], int(event['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Invalid event: {event}')
+        completed_at = _parse_time(event.get('completed_at'), now)
+        if item_id not in items or completed_at < items[item_id]:
+            items[item_id] = completed_at
+    return parsed
+
+
+def sync(user, events, cursor=None):
+    """Apply a batch of completion events and return the user's completions added after `cursor`
+
+    Events are {type: 'video'|'task', id, completed_at} and are applied in one
+    transaction with ON CONFLICT DO NOTHING, so replaying a batch is harmless.
+    Events for unknown ids are counted in `ignored`. The delta also contains
+    completions made on other devices; pass the returned cursor next time.
+    """
+    after = _parse_cursor(cursor)
+    parsed = _parse_events(events)
+    delta, next_cursor, ignored, applied = {}, [], 0, {}
+
+    with transaction.atomic():
+        for (kind, (model, field, item_model)), after_id in zip(KINDS.items(), after):
+            items = parsed[kind]
+            known = set(item_model.objects.filter(pk__in=items).values_list('pk', flat=True)) if items else set()
+            ignored += len(items) - len(known)
+            applied[kind] = known
+            model.objects.bulk_create(
+                [model(user=user, completed_at=items[item_id], **{field: item_id}) for item_id in known],
+                ignore_conflicts=True,
+            )
+            rows = list(model.objects.filter(user=user, pk__gt=after_id).order_by('pk').values_list('pk', field))
+            delta[kind] = [item_id for _, item_id in rows]
+            next_cursor.append(rows[-1][0] if rows else after_id)
+        refresh_summaries(user, applied['video'], applied['task'])
+
+    return {
+        'completed_videos': delta['video'],
+        'completed_tasks': delta['task'],
+        'ignored': ignored,
+        'cursor': '-'.join(str(part) for part in next_cursor),
+    }
@@ -0,0 +1,99 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import CATALOG_CACHE_TIMEOUT, get_catalog_version
+from .models import Category, UserCourse
+
+ENTITLEMENTS_TIMEOUT = 60 * 60
+
+
+def _version_key(user_id):
+    return f'entitlements:version:{user_id}'
+
+
+def _key(user_id, version):
+    return f'entitlements:{user_id}:{version}'
+
+
+def _grants_version(user_id):
+    """Version of a user's grants, bumped by forget()"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock like the catalog versions, so a lost key never reuses an old number
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _load(user_id):
+    """({category id: frozenset(granted module ids)}, seconds until the earliest grant expires)"""
+    now = timezone.now()
+    courses = (
+        UserCourse.objects.filter(user_id=user_id)
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .prefetch_related('modules')
+    )
+    grants, timeout = {}, ENTITLEMENTS_TIMEOUT
+    for course in courses:
+        grants[course.category_id] = frozenset(module.pk for module in course.modules.all())
+        if course.expires_at:
+            timeout = min(timeout, max(int((course.expires_at - now).total_seconds()), 1))
+    return grants, timeout
+
+
+def for_user(user_id):
+    """The user's course grants, loaded once and cached until one of them changes or expires"""
+    key = _key(user_id, _grants_version(user_id))
+    grants = cache.get(key)
+    if grants is None:
+        grants, timeout = _load(user_id)
+        cache.set(key, grants, timeout)
+    return grants
+
+
+def forget(user_ids):
+    """Invalidate cached grants once the change that affects them is committed"""
+    user_ids = set(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            key = _version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                continue  # Never read, so nothing is cached under it
+            # Backends without a native incr re-set the key with the default timeout
+            cache.touch(key, None)
+
+    if user_ids:
+        transaction.on_commit(bump)
+
+
+def _modular_categories():
+    """Ids of the modular categories; the only part of an access check that depends on the catalog"""
+    key = f'entitlements:modular:{get_catalog_version()}'
+    category_ids = cache.get(key)
+    if category_ids is None:
+        category_ids = frozenset(Category.objects.filter(is_modular=True).values_list('id', flat=True))
+        cache.set(key, category_ids, CATALOG_CACHE_TIMEOUT)
+    return category_ids
+
+
+def has_module(grants, category_id, module_id):
+    """Whether the grants cover a module of a course; module_id None stands for videos outside modules
+
+    A course that isn't modular covers all its videos, whatever modules its grant lists.
+    """
+    modules = grants.get(category_id)
+    if modules is None:
+        return False
+    return module_id is None or module_id in modules or category_id not in _modular_categories()
+
+
+def has_video(grants, video):
+    return has_module(grants, video.category_id, video.module_id)
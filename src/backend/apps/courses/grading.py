@@ -0,0 +1,108 @@
+import json
+import logging
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from . import stats
+from .models import Task, TaskQuestion, TaskSubmission
+
+logger = logging.getLogger(__name__)
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+UNANSWERED = -1
+REGRADE_BATCH_SIZE = 500
+
+
+def _answer_key_cache_key(task_id):
+    return f'grading:answer_key:{task_id}'
+
+
+def answer_key(task_id):
+    """(question link ids, correct option per question) of a task as arrays in question order"""
+    key = cache.get(_answer_key_cache_key(task_id))
+    if key is None:
+        rows = list(
+            TaskQuestion.objects.filter(task_id=task_id)
+            .order_by('order', 'id')
+            .values_list('id', 'bank_question__correct_answer')
+        )
+        key = (
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.int64),
+        )
+        cache.set(_answer_key_cache_key(task_id), key, timeout=ANSWER_KEY_TIMEOUT)
+    return key
+
+
+def forget_answer_keys(task_ids):
+    """Drop compiled answer keys once the question edits are committed"""
+    keys = [_answer_key_cache_key(task_id) for task_id in set(task_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def normalize_answers(raw):
+    """{question id (str): selected option (int)} from a JSON object or its string form"""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            return {}
+    if not isinstance(raw, dict):
+        return {}
+    answers = {}
+    for question_id, option in raw.items():
+        try:
+            answers[str(question_id)] = int(option)
+        except (TypeError, ValueError):
+            continue
+    return answers
+
+
+def answer_matrix(question_ids, answers_list):
+    """One row per submission, one column per question; UNANSWERED where no option was chosen"""
+    columns = [str(question_id) for question_id in question_ids.tolist()]
+    return np.array(
+        [[answers.get(column, UNANSWERED) for column in columns] for answers in answers_list],
+        dtype=np.int64,
+    ).reshape(len(answers_list), len(columns))
+
+
+def score_matrix(matrix, correct):
+    return (matrix == correct).sum(axis=1)
+
+
+def grade(task_id, answers):
+    """(score, total) of one test submission"""
+    question_ids, correct = answer_key(task_id)
+    score = score_matrix(answer_matrix(question_ids, [answers]), correct)[0]
+    return int(score), len(question_ids)
+
+
+def regrade_task(task_id):
+    """Rescore every stored submission of a task in one pass; returns how many scores changed"""
+    # Rebuild the key from the database rather than trusting a possibly stale cached one
+    cache.delete(_answer_key_cache_key(task_id))
+    question_ids, correct = answer_key(task_id)
+    submissions = list(TaskSubmission.objects.filter(task_id=task_id).only('id', 'answers', 'score', 'total'))
+    if not submissions:
+        return 0
+
+    scores = score_matrix(
+        answer_matrix(question_ids, [normalize_answers(s.answers) for s in submissions]), correct
+    )
+    total = len(question_ids)
+    changed = []
+    for submission, score in zip(submissions, scores.tolist()):
+        if submission.score != score or submission.total != total:
+            submission.score, submission.total = score, total
+            changed.append(submission)
+    with transaction.atomic():
+        TaskSubmission.objects.bulk_update(changed, ['score', 'total'], batch_size=REGRADE_BATCH_SIZE)
+        if changed:
+            # bulk_update() bypasses the incremental stats updates
+            stats.rebuild_stats(Task.objects.filter(pk=task_id).values('video_id'))
+    logger.info(f'Regraded task {task_id}: {len(changed)} of {len(submissions)} scores changed')
+    return len(changed)
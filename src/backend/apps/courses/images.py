@@ -0,0 +1,130 @@
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (160, 320, 640)
+
+# (key, Pillow format, save options)
+DERIVATIVE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+# model label -> (image field, variants field, lookup of the catalog categories to invalidate)
+IMAGE_FIELDS = {
+    'courses.Video': ('thumbnail', 'thumbnail_variants', 'category_id'),
+    'courses.BankQuestion': ('image', 'image_variants', 'task_links__task__video__category_id'),
+    'users.User': ('avatar', 'avatar_variants', None),
+}
+
+
+def derivative_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}_w{width}.{extension}'
+
+
+def needs_derivatives(instance, label):
+    image_field, variants_field, _ = IMAGE_FIELDS[label]
+    name = getattr(instance, image_field).name or None
+    return name != (getattr(instance, variants_field) or {}).get('source')
+
+
+def _flatten(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA')
+    return image
+
+
+def generate_derivatives(field_file):
+    """Write resized WebP/JPEG copies next to the original; returns the variants mapping"""
+    storage = field_file.storage
+    with field_file.open('rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    # Never upscale: tiny images get a single variant at their own width
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original.width] or [original.width]
+    variants = {'source': field_file.name}
+    for key, image_format, options in DERIVATIVE_FORMATS:
+        variants[key] = {}
+        for width in widths:
+            resized = original.copy()
+            resized.thumbnail((width, original.height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            _flatten(resized, image_format).save(buffer, image_format, **options)
+
+            name = derivative_name(field_file.name, width, key)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[key][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def _delete_variants(storage, variants):
+    for key, _, _ in DERIVATIVE_FORMATS:
+        for name in (variants or {}).get(key, {}).values():
+            storage.delete(name)
+
+
+def process_image(label, pk):
+    """Bring the derivatives of one instance's image up to date with its current file"""
+    model = apps.get_model(label)
+    image_field, variants_field, category_lookup = IMAGE_FIELDS[label]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_derivatives(instance, label):
+        return
+
+    field_file = getattr(instance, image_field)
+    old_variants = getattr(instance, variants_field)
+    variants = generate_derivatives(field_file) if field_file else {}
+
+    # Only store the result if the image wasn't replaced while we were resizing
+    if field_file:
+        unchanged = Q(**{image_field: field_file.name})
+    else:
+        unchanged = Q(**{f'{image_field}__isnull': True}) | Q(**{image_field: ''})
+    updated = model.objects.filter(unchanged, pk=pk).update(**{variants_field: variants})
+    if not updated:
+        _delete_variants(field_file.storage, variants)
+        return
+    old_source = (old_variants or {}).get('source')
+    # Cloned courses share image files (and their variants) with the original
+    shared = model.objects.filter(**{image_field: old_source}).exclude(pk=pk).exists() if old_source else False
+    if old_source and old_source != variants.get('source') and not shared:
+        _delete_variants(field_file.storage, old_variants)
+    if category_lookup:
+        # queryset.update() skips the save signals, so invalidate cached catalog payloads here
+        category_ids = model.objects.filter(pk=pk).values_list(category_lookup, flat=True).distinct()
+        for category_id in category_ids:
+            bump_catalog_version(category_id)
+    logger.info(f'Generated image derivatives for {label} {pk}')
+
+
+def srcset(variants, storage, request=None):
+    """{'webp': 'url 160w, url 320w', 'jpeg': ...} for <source srcset>, or None"""
+    if not variants or 'source' not in variants:
+        return None
+    result = {}
+    for key, _, _ in DERIVATIVE_FORMATS:
+        entries = []
+        for width, name in sorted(variants.get(key, {}).items(), key=lambda item: int(item[0])):
+            url = storage.url(name)
+            if request:
+                url = request.build_absolute_uri(url)
+            entries.append(f'{url} {width}w')
+        result[key] = ', '.join(entries)
+    return result
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.courses.cloning import clone_category
+from apps.courses.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Deep-copy a category with its modules, videos, tasks and questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_id', type=int)
+        parser.add_argument('--name', help='Name of the copy (default: "<name> (copy)")')
+        parser.add_argument('--active', action='store_true', help='Make the copy visible to students right away')
+
+    def handle(self, *args, **options):
+        category = Category.objects.filter(pk=options['category_id']).first()
+        if category is None:
+            raise CommandError(f'Category {options["category_id"]} does not exist')
+        clone = clone_category(category, name=options['name'], is_active=options['active'])
+        self.stdout.write(f'Cloned "{category.name}" into category {clone.pk} "{clone.name}"')
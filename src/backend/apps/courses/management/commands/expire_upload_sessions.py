@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.courses.uploads import expire_sessions, remove_orphaned_parts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable upload sessions and their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and clean up every N seconds (default: clean up once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            sessions = expire_sessions()
+            parts = remove_orphaned_parts()
+            self.stdout.write(f'Expired {sessions} upload sessions, removed {parts} orphaned partial files')
+            if not interval:
+                break
+            time.sleep(interval)
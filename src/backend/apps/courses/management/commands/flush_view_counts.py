@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.courses.view_counter import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered video view counts to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and flush every N seconds (default: flush once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            flushed = flush_view_counts()
+            self.stdout.write(f'Flushed {flushed} views')
+            if not interval:
+                break
+            time.sleep(interval)
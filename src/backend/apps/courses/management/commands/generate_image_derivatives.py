@@ -0,0 +1,46 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.courses.background import init_worker_process
+from apps.courses.images import IMAGE_FIELDS, needs_derivatives, process_image
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized WebP/JPEG variants for thumbnails, avatars and question images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of images resized in parallel (default: one per CPU core)',
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+        for label, (image_field, variants_field, _) in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for instance in model.objects.only('pk', image_field, variants_field).iterator():
+                if needs_derivatives(instance, label):
+                    jobs.append((label, instance.pk))
+
+        if not jobs:
+            self.stdout.write('All image derivatives are up to date')
+            return
+
+        self.stdout.write(f'Processing {len(jobs)} images with {options["workers"]} workers')
+        # Forked workers open their own connections
+        connections.close_all()
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker_process) as pool:
+            futures = {pool.submit(process_image, label, pk): (label, pk) for label, pk in jobs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    label, pk = futures[future]
+                    self.stderr.write(f'{label} {pk}: {e}')
+        self.stdout.write(f'Done, {len(jobs) - failed} processed, {failed} failed')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.models import Video
+from apps.courses.probing import probe_video
+
+
+class Command(BaseCommand):
+    help = 'Read duration, resolution and bitrate of uploaded videos that have not been probed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Probe every uploaded video again')
+
+    def handle(self, *args, **options):
+        queryset = Video.objects.exclude(video_file='').exclude(video_file__isnull=True)
+        if not options['all']:
+            queryset = queryset.filter(height__isnull=True)
+        video_ids = list(queryset.values_list('id', flat=True))
+        for video_id in video_ids:
+            probe_video(video_id)
+        self.stdout.write(f'Probed {len(video_ids)} videos')
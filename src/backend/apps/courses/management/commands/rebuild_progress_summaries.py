@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.summaries import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute every per-student course progress summary from the completions'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Rebuilt {rebuild()} progress summaries')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recount the task/video submission stats tables from task_submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int, help='Videos to recount (default: all)')
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(options['video_ids'] or None)
+        self.stdout.write(f'Rebuilt stats of {count} tasks')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.grading import regrade_task
+from apps.courses.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Rescore stored test submissions against the current answer key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('task_ids', nargs='*', type=int, help='Tasks to regrade')
+        parser.add_argument('--all', action='store_true', help='Regrade every test task')
+
+    def handle(self, *args, **options):
+        task_ids = options['task_ids']
+        if options['all']:
+            task_ids = list(Task.objects.filter(task_type='test').values_list('id', flat=True))
+        for task_id in task_ids:
+            changed = regrade_task(task_id)
+            self.stdout.write(f'Task {task_id}: {changed} scores changed')
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.courses.background import init_worker_process
+from apps.courses.models import Video
+from apps.courses.transcoding import STALE_AFTER_MINUTES, claim_video, requeue_stale, transcode_video
+
+
+class Command(BaseCommand):
+    help = 'Transcode uploaded videos into multi-bitrate HLS using a pool of ffmpeg worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=max((os.cpu_count() or 2) // 2, 1),
+            help='Number of videos transcoded in parallel (default: half the CPU cores)',
+        )
+        parser.add_argument('--video', type=int, action='append', dest='video_ids', help='Only this video id')
+        parser.add_argument(
+            '--queue-existing', action='store_true',
+            help='Also queue uploaded videos that were never transcoded, and retry failed ones',
+        )
+        parser.add_argument(
+            '--requeue-stale', type=int, nargs='?', const=STALE_AFTER_MINUTES, metavar='MINUTES',
+            help='Requeue videos stuck in processing (e.g. after a worker crashed) whose worker has not reported '
+                 f'progress for MINUTES (default: {STALE_AFTER_MINUTES})',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep polling for new uploads every N seconds (default: process the queue once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        if options['queue_existing']:
+            queued = Video.objects.filter(hls_status__in=['none', 'failed']).exclude(video_file='').exclude(
+                video_file__isnull=True
+            ).update(hls_status='pending', hls_progress=0)
+            self.stdout.write(f'Queued {queued} existing videos')
+
+        while True:
+            if options['requeue_stale'] is not None:
+                requeued = requeue_stale(options['requeue_stale'])
+                if requeued:
+                    self.stdout.write(f'Requeued {requeued} stale videos')
+            self.process_queue(options['workers'], options['video_ids'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def process_queue(self, workers, video_ids):
+        queryset = Video.objects.filter(hls_status='pending')
+        if video_ids:
+            queryset = queryset.filter(pk__in=video_ids)
+        claimed = [video_id for video_id in queryset.values_list('id', flat=True) if claim_video(video_id)]
+        if not claimed:
+            return
+
+        self.stdout.write(f'Transcoding {len(claimed)} videos with {workers} workers')
+        # Forked workers open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_process) as pool:
+            futures = [pool.submit(transcode_video, video_id) for video_id in claimed]
+            for future in as_completed(futures):
+                video_id, error = future.result()
+                if error:
+                    self.stderr.write(f'Video {video_id}: failed ({error})')
+                else:
+                    self.stdout.write(f'Video {video_id}: ready')
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskquestion',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:41
+
+import re
+
+from django.db import migrations, models
+
+
+def _parse_duration(text):
+    # Frozen copy of probing.parse_duration so later changes don't alter this migration
+    text = (text or '').strip().lower()
+    if not text:
+        return None
+    if ':' in text:
+        parts = text.split(':')
+        if not all(part.strip().isdigit() for part in parts):
+            return None
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + int(part)
+        return seconds
+    numbers = re.findall(r'\d+', text)
+    if len(numbers) != 1:
+        return None
+    value = int(numbers[0])
+    if 'h' in text or 'soat' in text:
+        return value * 3600
+    if 'm' in text or 'daq' in text:
+        return value * 60
+    return value
+
+
+def parse_existing_durations(apps, schema_editor):
+    Video = apps.get_model('courses', 'Video')
+    videos = list(Video.objects.only('id', 'duration'))
+    for video in videos:
+        video.duration_seconds = _parse_duration(video.duration)
+    Video.objects.bulk_update(videos, ['duration_seconds'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='bitrate',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='duration_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(parse_existing_durations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_video_media_info'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='module',
+            name='order',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='order',
+            field=models.FloatField(default=0),
+        ),
+    ]
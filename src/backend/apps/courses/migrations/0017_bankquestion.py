@@ -0,0 +1,37 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_fractional_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='question_images/')),
+                ('image_variants', models.JSONField(blank=True, default=dict)),
+                ('options', models.JSONField()),
+                ('correct_answer', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'bank_questions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='taskquestion',
+            name='bank_question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='task_links', to='courses.bankquestion'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import json
+
+from django.db import migrations
+
+
+def move_questions_to_bank(apps, schema_editor):
+    """One bank question per distinct question; identical copies (e.g. from link_to_video) share it"""
+    TaskQuestion = apps.get_model('courses', 'TaskQuestion')
+    BankQuestion = apps.get_model('courses', 'BankQuestion')
+
+    bank = {}
+    links = []
+    for link in TaskQuestion.objects.order_by('id').iterator():
+        key = (
+            link.question,
+            link.description or '',
+            link.image.name or '',
+            json.dumps(link.options, sort_keys=True),
+            link.correct_answer,
+        )
+        if key not in bank:
+            bank[key] = BankQuestion.objects.create(
+                question=link.question,
+                description=link.description,
+                image=link.image.name or None,
+                image_variants=link.image_variants,
+                options=link.options,
+                correct_answer=link.correct_answer,
+            )
+        link.bank_question_id = bank[key].pk
+        links.append(link)
+    TaskQuestion.objects.bulk_update(links, ['bank_question'], batch_size=500)
+
+
+def copy_questions_back(apps, schema_editor):
+    TaskQuestion = apps.get_model('courses', 'TaskQuestion')
+    links = list(TaskQuestion.objects.select_related('bank_question'))
+    for link in links:
+        question = link.bank_question
+        link.question = question.question
+        link.description = question.description
+        link.image = question.image.name or None
+        link.image_variants = question.image_variants
+        link.options = question.options
+        link.correct_answer = question.correct_answer
+    TaskQuestion.objects.bulk_update(
+        links,
+        ['question', 'description', 'image', 'image_variants', 'options', 'correct_answer'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_bankquestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_questions_to_bank, copy_questions_back),
+    ]
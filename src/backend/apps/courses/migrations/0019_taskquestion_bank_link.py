@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_move_questions_to_bank'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='correct_answer',
+        ),
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='image',
+        ),
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='image_variants',
+        ),
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='options',
+        ),
+        migrations.RemoveField(
+            model_name='taskquestion',
+            name='question',
+        ),
+        migrations.AlterField(
+            model_name='taskquestion',
+            name='bank_question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='task_links', to='courses.bankquestion'),
+        ),
+    ]
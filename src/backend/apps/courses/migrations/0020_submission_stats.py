@@ -0,0 +1,72 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    """Count the existing submissions into the new tables"""
+    Task = apps.get_model('courses', 'Task')
+    TaskSubmission = apps.get_model('courses', 'TaskSubmission')
+    TaskStats = apps.get_model('courses', 'TaskStats')
+    VideoStats = apps.get_model('courses', 'VideoStats')
+
+    task_stats, video_stats = {}, {}
+    video_of = dict(Task.objects.values_list('id', 'video_id'))
+    for status, score, total, task_id in TaskSubmission.objects.values_list('status', 'score', 'total', 'task_id'):
+        stats = task_stats.setdefault(task_id, TaskStats(task_id=task_id))
+        video = video_stats.setdefault(video_of[task_id], VideoStats(video_id=video_of[task_id]))
+        stats.total_submissions += 1
+        video.total_submissions += 1
+        if status in ('pending', 'approved', 'rejected'):
+            setattr(stats, status, getattr(stats, status) + 1)
+            field = f'{status}_submissions'
+            setattr(video, field, getattr(video, field) + 1)
+        if total > 0:
+            stats.graded += 1
+            stats.percent_sum += score * 100.0 / total
+    TaskStats.objects.bulk_create(task_stats.values(), batch_size=500)
+    VideoStats.objects.bulk_create(video_stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_taskquestion_bank_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.task')),
+                ('total_submissions', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('graded', models.IntegerField(default=0)),
+                ('percent_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Task stats',
+                'db_table': 'task_stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoStats',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.video')),
+                ('total_submissions', models.IntegerField(default=0)),
+                ('pending_submissions', models.IntegerField(default=0)),
+                ('approved_submissions', models.IntegerField(default=0)),
+                ('rejected_submissions', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Video stats',
+                'db_table': 'video_stats',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# (JSON list field, completion model, item field, item model)
+COMPLETIONS = [
+    ('completed_videos', 'VideoCompletion', 'video_id', 'Video'),
+    ('completed_tasks', 'TaskCompletion', 'task_id', 'Task'),
+]
+
+
+def _ids(values):
+    ids = []
+    for value in values or []:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def json_to_rows(apps, schema_editor):
+    """One row per id in the JSON lists, in list order; ids of deleted items are dropped"""
+    StudentProgress = apps.get_model('courses', 'StudentProgress')
+    for list_field, model_name, id_field, item_model_name in COMPLETIONS:
+        model = apps.get_model('courses', model_name)
+        existing = set(apps.get_model('courses', item_model_name).objects.values_list('id', flat=True))
+        rows = []
+        for user_id, values in StudentProgress.objects.order_by('id').values_list('user_id', list_field):
+            seen = set()
+            for item_id in _ids(values):
+                if item_id in existing and item_id not in seen:
+                    seen.add(item_id)
+                    rows.append(model(user_id=user_id, **{id_field: item_id}))
+        model.objects.bulk_create(rows, batch_size=500)
+
+
+def rows_to_json(apps, schema_editor):
+    StudentProgress = apps.get_model('courses', 'StudentProgress')
+    lists = {}
+    for list_field, model_name, id_field, _ in COMPLETIONS:
+        model = apps.get_model('courses', model_name)
+        for user_id, item_id in model.objects.order_by('completed_at', 'id').values_list('user_id', id_field):
+            lists.setdefault(user_id, {}).setdefault(list_field, []).append(item_id)
+    for user_id, values in lists.items():
+        StudentProgress.objects.update_or_create(user_id=user_id, defaults=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0020_submission_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='video_completions', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='courses.video')),
+            ],
+            options={
+                'db_table': 'video_completions',
+                'unique_together': {('user', 'video')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='courses.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_completions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'task_completions',
+                'unique_together': {('user', 'task')},
+            },
+        ),
+        migrations.RunPython(json_to_rows, rows_to_json),
+        migrations.RemoveField(
+            model_name='studentprogress',
+            name='completed_tasks',
+        ),
+        migrations.RemoveField(
+            model_name='studentprogress',
+            name='completed_videos',
+        ),
+    ]
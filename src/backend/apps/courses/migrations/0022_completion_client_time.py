@@ -0,0 +1,24 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_completions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskcompletion',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='videocompletion',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
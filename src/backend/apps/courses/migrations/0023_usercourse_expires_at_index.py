@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_completion_client_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usercourse',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0023_usercourse_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_videos', models.IntegerField(default=0)),
+                ('total_videos', models.IntegerField(default=0)),
+                ('completed_tasks', models.IntegerField(default=0)),
+                ('total_tasks', models.IntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to='courses.category')),
+                ('next_video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.video')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'course_progress_summaries',
+                'unique_together': {('user', 'category')},
+            },
+        ),
+    ]
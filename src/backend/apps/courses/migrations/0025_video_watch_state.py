@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0024_course_progress_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoWatchState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.FloatField(default=0)),
+                ('watched_ranges', models.JSONField(default=list)),
+                ('watched_seconds', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_states', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_states', to='courses.video')),
+            ],
+            options={
+                'db_table': 'video_watch_states',
+                'unique_together': {('user', 'video')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0025_video_watch_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
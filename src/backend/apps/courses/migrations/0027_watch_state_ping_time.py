@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0026_video_hls_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videowatchstate',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
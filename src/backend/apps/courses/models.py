@@ -1,7 +1,69 @@
+import uuid
+
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from apps.users.models import User
 
 
+def _aggregate_subquery(queryset, field, aggregate):
+    """Correlated aggregate over `queryset` rows whose `field` points at the outer row"""
+    totals = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=aggregate)
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), 0)
+
+
+def _count_subquery(queryset, field):
+    return _aggregate_subquery(queryset, field, Count('pk'))
+
+
+class CategoryQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate video/module counts and total duration so serializers don't query per row"""
+        return self.annotate(
+            num_videos=_count_subquery(Video.objects.all(), 'category'),
+            num_modules=_count_subquery(Module.objects.all(), 'category'),
+            sum_duration=_aggregate_subquery(Video.objects.all(), 'category', Sum('duration_seconds')),
+        )
+
+
+class ModuleQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            num_videos=_count_subquery(Video.objects.all(), 'module'),
+            sum_duration=_aggregate_subquery(Video.objects.all(), 'module', Sum('duration_seconds')),
+        )
+
+
+class VideoQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Everything the slim list representation needs, in a fixed number of queries"""
+        return (
+            self.select_related('category', 'module')
+            .annotate(num_tasks=_count_subquery(Task.objects.all(), 'video'))
+            .prefetch_related(models.Prefetch('tasks', queryset=Task.objects.only('id', 'video_id')))
+        )
+
+    def with_task_trees(self):
+        return self.select_related('category', 'module').prefetch_related(
+            models.Prefetch('tasks', queryset=Task.objects.with_questions())
+        )
+
+
+class TaskQuerySet(models.QuerySet):
+    def with_questions(self):
+        """Prefetch the question links together with their bank questions"""
+        return self.prefetch_related(
+            models.Prefetch('questions', queryset=TaskQuestion.objects.select_related('bank_question'))
+        )
+
+
 class Category(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
@@ -13,16 +75,31 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True)  # Whether course is active/visible
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     @property
     def video_count(self):
+        if hasattr(self, 'num_videos'):
+            return self.num_videos
         return self.videos.count()
     
     @property
     def module_count(self):
-        return self.modules.count() if self.is_modular else 0
+        if not self.is_modular:
+            return 0
+        if hasattr(self, 'num_modules'):
+            return self.num_modules
+        return self.modules.count()
+
+    @property
+    def total_duration(self):
+        """Sum of video durations in seconds"""
+        if hasattr(self, 'sum_duration'):
+            return self.sum_duration
+        return self.videos.aggregate(total=Sum('duration_seconds'))['total'] or 0
 
     class Meta:
         db_table = 'categories'
@@ -35,36 +112,66 @@ class Module(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='modules')
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
-    order = models.IntegerField(default=0)
+    order = models.FloatField(default=0)  # Fractional rank, see ordering.py
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Optional separate price
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ModuleQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.category.name} - {self.name}"
 
     @property
     def video_count(self):
+        if hasattr(self, 'num_videos'):
+            return self.num_videos
         return self.videos.count()
 
+    @property
+    def total_duration(self):
+        """Sum of video durations in seconds"""
+        if hasattr(self, 'sum_duration'):
+            return self.sum_duration
+        return self.videos.aggregate(total=Sum('duration_seconds'))['total'] or 0
+
     class Meta:
         db_table = 'modules'
         ordering = ['category', 'order']
 
 
 class Video(models.Model):
+    HLS_STATUS_CHOICES = (
+        ('none', 'None'),
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='videos')
     module = models.ForeignKey(Module, on_delete=models.SET_NULL, null=True, blank=True, related_name='videos')
     title = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
-    duration = models.CharField(max_length=10)
+    duration = models.CharField(max_length=10)  # Display string, e.g. '12:30'
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)  # Probed from the file or parsed from `duration`
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True)  # bits per second
     thumbnail = models.ImageField(upload_to='thumbnails/', null=True, blank=True)
     thumbnail_url = models.URLField(null=True, blank=True)
+    thumbnail_variants = models.JSONField(default=dict, blank=True)  # Resized copies, see images.py
     video_file = models.FileField(upload_to='videos/', null=True, blank=True)
     video_url = models.URLField(null=True, blank=True)
-    order = models.IntegerField(default=0)
+    order = models.FloatField(default=0)  # Fractional rank, see ordering.py
     view_count = models.IntegerField(default=0)
+    hls_status = models.CharField(max_length=12, choices=HLS_STATUS_CHOICES, default='none', db_index=True)
+    hls_progress = models.PositiveSmallIntegerField(default=0)  # Transcoding progress, percent
+    hls_playlist = models.CharField(max_length=255, null=True, blank=True)  # Master playlist path in media storage
+    hls_claimed_at = models.DateTimeField(null=True, blank=True)  # When a worker claimed it, refreshed with progress
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = VideoQuerySet.as_manager()
+
     def __str__(self):
         return self.title
     
@@ -74,6 +181,15 @@ class Video(models.Model):
             return self.video_file.url
         return self.video_url
     
+    def mark_new_upload(self):
+        """Reset media info and queue the new file for probing and transcoding (caller saves)"""
+        self.hls_status = 'pending'
+        self.hls_progress = 0
+        self.hls_playlist = None
+        self.width = None
+        self.height = None
+        self.bitrate = None
+
     def get_thumbnail_url(self):
         """Return thumbnail file URL or external URL"""
         if self.thumbnail:
@@ -108,6 +224,8 @@ class Task(models.Model):
     requires_approval = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TaskQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -116,13 +234,29 @@ class Task(models.Model):
         ordering = ['created_at']
 
 
-class TaskQuestion(models.Model):
-    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='questions')
+class BankQuestion(models.Model):
+    """A reusable question; tasks include it through ordered TaskQuestion links"""
     question = models.TextField()
     description = models.TextField(blank=True, null=True)  # Per-question explanation/description
     image = models.ImageField(upload_to='question_images/', blank=True, null=True)  # Per-question image
+    image_variants = models.JSONField(default=dict, blank=True)  # Resized copies, see images.py
     options = models.JSONField()
     correct_answer = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.question[:80]
+
+    class Meta:
+        db_table = 'bank_questions'
+        ordering = ['-created_at']
+
+
+class TaskQuestion(models.Model):
+    """A bank question's place in a task; TaskSubmission.answers is keyed by this id"""
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='questions')
+    bank_question = models.ForeignKey(BankQuestion, on_delete=models.PROTECT, related_name='task_links')
     order = models.IntegerField(default=0)
 
     def __str__(self):
@@ -144,22 +278,20 @@ class UserCourse(models.Model):
     modules = models.ManyToManyField(Module, blank=True, related_name='user_courses')  # For modular courses
     granted_by = models.CharField(max_length=10, choices=GRANTED_BY_CHOICES)
     granted_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True)  # Swept by expire_entitlements
 
     def __str__(self):
         return f"{self.user.username} - {self.category.name}"
     
     def has_access_to_module(self, module):
-        """Check if user has access to a specific module"""
-        if not self.category.is_modular:
-            return True  # Non-modular courses give full access
-        return self.modules.filter(id=module.id).exists()
-    
+        """Check if user has access to a specific module, from the cached grants in entitlements.py"""
+        from . import entitlements  # entitlements imports this module
+        return entitlements.has_module(entitlements.for_user(self.user_id), self.category_id, module.pk)
+
     def has_access_to_video(self, video):
-        """Check if user has access to a specific video"""
-        if not self.category.is_modular or not video.module:
-            return True  # Non-modular or video without module
-        return self.modules.filter(id=video.module.id).exists()
+        """Check if user has access to a specific video (videos outside modules are always included)"""
+        from . import entitlements
+        return entitlements.has_module(entitlements.for_user(self.user_id), self.category_id, video.module_id)
 
     class Meta:
         db_table = 'user_courses'
@@ -169,16 +301,102 @@ class UserCourse(models.Model):
 
 class StudentProgress(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='progress')
-    completed_videos = models.JSONField(default=list)  # List of video IDs
-    completed_tasks = models.JSONField(default=list)  # List of task IDs
 
     def __str__(self):
         return f"{self.user.username} - Progress"
 
+    @property
+    def completed_videos(self):
+        """Ids of the user's completed videos in completion order"""
+        return list(
+            VideoCompletion.objects.filter(user_id=self.user_id)
+            .order_by('completed_at', 'id')
+            .values_list('video_id', flat=True)
+        )
+
+    @property
+    def completed_tasks(self):
+        """Ids of the user's completed tasks in completion order"""
+        return list(
+            TaskCompletion.objects.filter(user_id=self.user_id)
+            .order_by('completed_at', 'id')
+            .values_list('task_id', flat=True)
+        )
+
     class Meta:
         db_table = 'student_progress'
 
 
+class VideoCompletion(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_completions')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='completions')
+    completed_at = models.DateTimeField(default=timezone.now)  # Client time for synced offline completions
+
+    def __str__(self):
+        return f"{self.user.username} - {self.video.title}"
+
+    class Meta:
+        db_table = 'video_completions'
+        unique_together = ['user', 'video']
+
+
+class TaskCompletion(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_completions')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='completions')
+    completed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.task.title}"
+
+    class Meta:
+        db_table = 'task_completions'
+        unique_together = ['user', 'task']
+
+
+class CourseProgressSummary(models.Model):
+    """A student's progress through one course, kept up to date by summaries.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_summaries')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='progress_summaries')
+    completed_videos = models.IntegerField(default=0)
+    total_videos = models.IntegerField(default=0)
+    completed_tasks = models.IntegerField(default=0)
+    total_tasks = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(blank=True, null=True)
+    # First unlocked video the student hasn't completed yet; None once everything is done
+    next_video = models.ForeignKey(Video, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category.name}"
+
+    @property
+    def percent(self):
+        if not self.total_videos:
+            return 0
+        return round(self.completed_videos * 100 / self.total_videos)
+
+    class Meta:
+        db_table = 'course_progress_summaries'
+        unique_together = ['user', 'category']
+
+
+class VideoWatchState(models.Model):
+    """Where a student stopped in a video and which parts they have watched, written by watching.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watch_states')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='watch_states')
+    position = models.FloatField(default=0)  # Seconds; where playback resumes
+    watched_ranges = models.JSONField(default=list)  # Sorted, non-overlapping [start, end] seconds
+    watched_seconds = models.FloatField(default=0)  # Total length of watched_ranges
+    updated_at = models.DateTimeField(default=timezone.now)  # Time of the latest ping, which set `position`
+
+    def __str__(self):
+        return f"{self.user.username} - {self.video.title} @ {self.position:.0f}s"
+
+    class Meta:
+        db_table = 'video_watch_states'
+        unique_together = ['user', 'video']
+
+
 class TaskSubmission(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -204,3 +422,68 @@ class TaskSubmission(models.Model):
     class Meta:
         db_table = 'task_submissions'
         ordering = ['-submitted_at']
+
+
+class TaskStats(models.Model):
+    """Submission counters of a task, kept current by stats.record_submission_change()"""
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_submissions = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    graded = models.IntegerField(default=0)  # Submissions with total > 0
+    percent_sum = models.FloatField(default=0)  # Sum of score * 100 / total over graded submissions
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average_score(self):
+        return round(self.percent_sum / self.graded, 1) if self.graded else 0
+
+    class Meta:
+        db_table = 'task_stats'
+        verbose_name_plural = 'Task stats'
+
+
+class VideoStats(models.Model):
+    """Submission counters over all tasks of a video, kept current like TaskStats"""
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_submissions = models.IntegerField(default=0)
+    pending_submissions = models.IntegerField(default=0)
+    approved_submissions = models.IntegerField(default=0)
+    rejected_submissions = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'video_stats'
+        verbose_name_plural = 'Video stats'
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a large file, assembled on disk one chunk at a time"""
+    PURPOSE_CHOICES = (
+        ('video', 'Video'),
+        ('submission', 'Task Submission'),
+    )
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('completed', 'Completed'),
+        ('attached', 'Attached'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=12, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)  # Bytes received so far
+    checksum = models.CharField(max_length=64)  # Expected SHA-256 of the whole file, hex
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.filename} ({self.offset}/{self.size})"
+
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Module, Video
+
+# Neighbouring keys closer than this have run out of float precision; the siblings get renumbered 1..n
+MIN_GAP = 1e-9
+
+
+def siblings(instance):
+    """Rows that share the instance's place in Meta.ordering"""
+    if isinstance(instance, Video):
+        return Video.objects.filter(category_id=instance.category_id, module_id=instance.module_id)
+    return Module.objects.filter(category_id=instance.category_id)
+
+
+def key_between(before, after):
+    """An order key strictly between two neighbouring keys (either may be None at the ends)"""
+    if before is None and after is None:
+        return 1.0
+    if before is None:
+        return after - 1
+    if after is None:
+        return before + 1
+    return (before + after) / 2
+
+
+def _rebalance(queryset):
+    rows = list(queryset.order_by('order', 'pk').only('pk', 'order'))
+    for position, row in enumerate(rows, start=1):
+        row.order = position
+    queryset.model.objects.bulk_update(rows, ['order'])
+
+
+def _neighbours(queryset, after_id):
+    ordered = queryset.order_by('order', 'pk')
+    if after_id is None:
+        return None, ordered.first()
+    previous = queryset.filter(pk=after_id).first()
+    if previous is None:
+        raise ValueError(f'{after_id} is not a sibling')
+    following = ordered.filter(
+        Q(order__gt=previous.order) | Q(order=previous.order, pk__gt=previous.pk)
+    ).first()
+    return previous, following
+
+
+def move(instance, after_id=None):
+    """Place the instance right after sibling `after_id` (first if None); normally writes only its own row"""
+    with transaction.atomic():
+        others = siblings(instance).exclude(pk=instance.pk).select_for_update()
+        previous, following = _neighbours(others, after_id)
+        if previous and following and following.order - previous.order < MIN_GAP:
+            _rebalance(others)
+            previous, following = _neighbours(others, after_id)
+
+        instance.order = key_between(
+            previous.order if previous else None,
+            following.order if following else None,
+        )
+        # The save signals invalidate the catalog cache
+        instance.save(update_fields=['order'])
+    return instance.order
@@ -0,0 +1,96 @@
+import json
+import logging
+import re
+import subprocess
+
+from django.conf import settings
+
+from .cache import bump_catalog_version
+from .models import Video
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r'\d+')
+
+
+class ProbeError(Exception):
+    pass
+
+
+def probe(path):
+    """Duration (s), resolution, bitrate (bit/s) and audio presence of a media file via ffprobe"""
+    result = subprocess.run(
+        [settings.FFPROBE_BINARY, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.strip() or 'ffprobe failed')
+    info = json.loads(result.stdout)
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if video is None:
+        raise ProbeError('No video stream found')
+    media_format = info.get('format', {})
+    return {
+        'duration': float(media_format.get('duration') or video.get('duration') or 0),
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'bitrate': int(media_format.get('bit_rate') or 0),
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams),
+    }
+
+
+def parse_duration(text):
+    """Seconds from an admin-typed duration: '12:30', '1:02:03', '45', '12 min'; None if unparseable"""
+    if not text:
+        return None
+    text = text.strip().lower()
+    if ':' in text:
+        parts = text.split(':')
+        if not all(part.strip().isdigit() for part in parts):
+            return None
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + int(part)
+        return seconds
+    numbers = NUMBER_RE.findall(text)
+    if len(numbers) != 1:
+        return None
+    value = int(numbers[0])
+    if 'h' in text or 'soat' in text:
+        return value * 3600
+    if 'm' in text or 'daq' in text:
+        return value * 60
+    return value
+
+
+def format_duration(seconds):
+    """'MM:SS' or 'H:MM:SS', the format admins type into Video.duration"""
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes:02d}:{seconds:02d}'
+
+
+def probe_video(video_id):
+    """Store the probed media info of a video's uploaded file"""
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or not video.video_file:
+        return
+    try:
+        info = probe(video.video_file.path)
+    except (ProbeError, OSError) as e:
+        logger.warning(f'Could not probe video {video_id}: {e}')
+        return
+    seconds = round(info['duration'])
+    # Skip the write if the file was replaced while probing
+    Video.objects.filter(pk=video_id, video_file=video.video_file.name).update(
+        duration_seconds=seconds,
+        duration=format_duration(seconds),
+        width=info['width'] or None,
+        height=info['height'] or None,
+        bitrate=info['bitrate'] or None,
+    )
+    bump_catalog_version(video.category_id)
+    logger.info(f'Probed video {video_id}: {seconds}s {info["width"]}x{info["height"]}')
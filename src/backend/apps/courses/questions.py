@@ -0,0 +1,139 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import background, grading, images
+from .cache import bump_catalog_version
+from .models import BankQuestion, TaskQuestion
+
+# Values for fields a new question doesn't send
+DEFAULTS = {'question': '', 'description': '', 'options': [], 'correct_answer': 0}
+
+
+def parse_questions(raw, default):
+    """Question dicts from a request, accepting the JSON-string form FormData sends"""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            return default
+    questions = []
+    for item in raw or []:
+        if isinstance(item, str):
+            try:
+                item = json.loads(item)
+            except (json.JSONDecodeError, TypeError):
+                continue
+        # QueryDict.pop() wraps the single JSON-encoded list in another list
+        if isinstance(item, list):
+            questions.extend(item)
+        else:
+            questions.append(item)
+    return questions
+
+
+def _int_or_none(value):
+    # New questions carry client-side placeholder ids such as 'new-1700000000'
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _values(data, partial):
+    """Bank question fields; existing questions only take the fields the client sent"""
+    return {
+        field: data.get(field, default)
+        for field, default in DEFAULTS.items()
+        if field in data or not partial
+    }
+
+
+def invalidate_bank_questions(bank_question_ids):
+    """Invalidate the catalog and answer keys of every task that uses one of these bank questions"""
+    links = list(
+        TaskQuestion.objects.filter(bank_question_id__in=bank_question_ids)
+        .values_list('task_id', 'task__video__category_id')
+    )
+    for category_id in {category_id for _, category_id in links}:
+        bump_catalog_version(category_id)
+    grading.forget_answer_keys(task_id for task_id, _ in links)
+
+
+def save_questions(task, questions_data, files):
+    """Make the task's question links match `questions_data`
+
+    Each item is matched to an existing link by `id`, or reuses a bank question
+    given as `bank_question`; anything else becomes a new bank question. Edits
+    go to the shared bank question, so every task using it sees them. Unchanged
+    rows are not written and kept links keep their ids, so the question ids
+    stored in TaskSubmission.answers stay valid. Images come from
+    `question_image_<index>` uploads.
+    """
+    existing = {link.id: link for link in task.questions.select_related('bank_question')}
+    reused = BankQuestion.objects.in_bulk(
+        [_int_or_none(data.get('bank_question')) for data in questions_data if data.get('bank_question')]
+    )
+    new_questions, new_links, changed_questions, changed_links = [], [], {}, []
+    bank_fields, with_new_image = set(), []
+
+    for idx, data in enumerate(questions_data):
+        link = existing.pop(_int_or_none(data.get('id')), None)
+        question = link.bank_question if link else reused.get(_int_or_none(data.get('bank_question')))
+        if question is None:
+            question = BankQuestion(**_values(data, partial=False))
+            new_questions.append(question)
+            changed = []
+        else:
+            values = _values(data, partial=True)
+            changed = [field for field, value in values.items() if getattr(question, field) != value]
+            for field in changed:
+                setattr(question, field, values[field])
+
+        image = files.get(f'question_image_{idx}')
+        if image:
+            # Stores the file now; bulk writes don't run FileField.pre_save
+            question.image.save(image.name, image, save=False)
+            with_new_image.append(question)
+            changed.append('image')
+        if changed and question.pk:
+            question.updated_at = timezone.now()  # bulk_update() doesn't apply auto_now
+            changed_questions[question.pk] = question
+            bank_fields.update(changed)
+
+        if link is None:
+            new_links.append(TaskQuestion(task=task, bank_question=question, order=idx + 1))
+        elif link.order != idx + 1:
+            link.order = idx + 1
+            changed_links.append(link)
+
+    with transaction.atomic():
+        if existing:
+            TaskQuestion.objects.filter(pk__in=existing).delete()
+        BankQuestion.objects.bulk_create(new_questions)
+        if changed_questions:
+            BankQuestion.objects.bulk_update(changed_questions.values(), sorted(bank_fields) + ['updated_at'])
+        for link in new_links:
+            link.bank_question_id = link.bank_question.pk
+        TaskQuestion.objects.bulk_create(new_links)
+        TaskQuestion.objects.bulk_update(changed_links, ['order'])
+
+        # Bulk writes skip the save signals: invalidate the catalog and answer keys and resize new images here
+        if existing or new_links or changed_links:
+            bump_catalog_version(task.video.category_id)
+            grading.forget_answer_keys([task.pk])
+        if changed_questions:
+            invalidate_bank_questions(list(changed_questions))
+        for pk in [question.pk for question in with_new_image if question.pk]:
+            transaction.on_commit(
+                lambda pk=pk: background.submit(images.process_image, 'courses.BankQuestion', pk)
+            )
+
+
+def copy_questions(source, target):
+    """Link every question of `source` into `target` in one INSERT; the bank questions are shared"""
+    TaskQuestion.objects.bulk_create([
+        TaskQuestion(task=target, bank_question_id=link.bank_question_id, order=link.order)
+        for link in source.questions.all()
+    ])
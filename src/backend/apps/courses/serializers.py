@@ -1,25 +1,34 @@
 from rest_framework import serializers
-from .models import Category, Module, Video, Task, TaskQuestion, UserCourse, StudentProgress, TaskSubmission
+
+from . import images
+from .probing import parse_duration
+from .models import (
+    Category, Module, Video, Task, BankQuestion, TaskQuestion, UserCourse, StudentProgress, CourseProgressSummary,
+    TaskSubmission, UploadSession,
+)
 
 
 class ModuleSerializer(serializers.ModelSerializer):
     video_count = serializers.ReadOnlyField()
+    total_duration = serializers.ReadOnlyField()
 
     class Meta:
         model = Module
-        fields = ['id', 'category', 'name', 'description', 'order', 'price', 'video_count', 'created_at']
+        fields = ['id', 'category', 'name', 'description', 'order', 'price', 'video_count', 'total_duration',
+                  'created_at']
 
 
 class CategorySerializer(serializers.ModelSerializer):
     video_count = serializers.ReadOnlyField()
     module_count = serializers.ReadOnlyField()
+    total_duration = serializers.ReadOnlyField()
     modules = ModuleSerializer(many=True, read_only=True)
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'icon', 'color', 'price',
                   'is_modular', 'requires_sequential', 'is_active', 'video_count', 'module_count', 
-                  'modules', 'created_at']
+                  'total_duration', 'modules', 'created_at']
 
 
 # class OnlyVideoSerializer(serializers.ModelSerializer):
@@ -31,10 +40,48 @@ class CategorySerializer(serializers.ModelSerializer):
 #                   'order', 'view_count', 'created_at']
 
 
-class TaskQuestionSerializer(serializers.ModelSerializer):
+class AnswerKeyMixin:
+    """Leave correct_answer out for students; tests are graded on the server"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if not (user and (user.is_staff or user.is_superuser)):
+            data.pop('correct_answer', None)
+        return data
+
+
+class BankQuestionSerializer(AnswerKeyMixin, serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BankQuestion
+        fields = ['id', 'question', 'description', 'image', 'image_srcset', 'options', 'correct_answer',
+                  'created_at', 'updated_at']
+
+    def get_image_srcset(self, obj):
+        return images.srcset(obj.image_variants, obj.image.storage, self.context.get('request'))
+
+
+class TaskQuestionSerializer(AnswerKeyMixin, serializers.ModelSerializer):
+    """A task's question link, flattened with the bank question it points at"""
+    question = serializers.CharField(source='bank_question.question', read_only=True)
+    description = serializers.CharField(source='bank_question.description', read_only=True, allow_null=True)
+    image = serializers.ImageField(source='bank_question.image', read_only=True)
+    image_srcset = serializers.SerializerMethodField()
+    options = serializers.JSONField(source='bank_question.options', read_only=True)
+    correct_answer = serializers.IntegerField(source='bank_question.correct_answer', read_only=True)
+
     class Meta:
         model = TaskQuestion
-        fields = ['id', 'question', 'description', 'image', 'options', 'correct_answer', 'order']
+        fields = ['id', 'task', 'bank_question', 'question', 'description', 'image', 'image_srcset', 'options',
+                  'correct_answer', 'order']
+        extra_kwargs = {'task': {'write_only': True}}
+
+    def get_image_srcset(self, obj):
+        question = obj.bank_question
+        return images.srcset(question.image_variants, question.image.storage, self.context.get('request'))
 
 
 class TaskSerializer(serializers.ModelSerializer):
@@ -46,12 +93,47 @@ class TaskSerializer(serializers.ModelSerializer):
                   'allow_resubmission', 'requires_approval', 'questions', 'created_at']
 
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoThumbnailMixin:
+    def get_thumbnail_srcset(self, obj):
+        return images.srcset(obj.thumbnail_variants, obj.thumbnail.storage, self.context.get('request'))
+
+    def get_thumbnail(self, obj):
+        """Return thumbnail file URL or external URL"""
+        if obj.thumbnail:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.thumbnail.url)
+            return obj.thumbnail.url
+        return obj.thumbnail_url
+
+
+class VideoListSerializer(VideoThumbnailMixin, serializers.ModelSerializer):
+    """Lightweight video representation for course listings, without nested tasks"""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    module_name = serializers.CharField(source='module.name', read_only=True, allow_null=True)
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    task_count = serializers.IntegerField(source='num_tasks', read_only=True)
+    task_ids = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Video
+        fields = ['id', 'category', 'category_name', 'module', 'module_name', 'title', 'description',
+                  'duration', 'duration_seconds', 'thumbnail', 'thumbnail_srcset', 'order', 'view_count',
+                  'task_count', 'task_ids', 'created_at']
+        read_only_fields = fields
+
+    def get_task_ids(self, obj):
+        return [task.id for task in obj.tasks.all()]
+
+
+class VideoSerializer(VideoThumbnailMixin, serializers.ModelSerializer):
     tasks = TaskSerializer(many=True, read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     module_name = serializers.CharField(source='module.name', read_only=True, allow_null=True)
     video_url = serializers.SerializerMethodField()
     thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     # Write-only fields - optional for file uploads
     video_file = serializers.FileField(write_only=True, required=False, allow_null=True)
@@ -61,9 +143,11 @@ class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = ['id', 'category', 'category_name', 'module', 'module_name', 'title', 'description',
-                  'duration', 'thumbnail', 'video_url', 'video_file',
+                  'duration', 'duration_seconds', 'width', 'height', 'bitrate',
+                  'thumbnail', 'thumbnail_srcset', 'video_url', 'video_file',
                   'thumbnail_file', 'thumbnail_url',
-                  'order', 'view_count', 'tasks', 'created_at']
+                  'order', 'view_count', 'hls_status', 'hls_progress', 'tasks', 'created_at']
+        read_only_fields = ['duration_seconds', 'width', 'height', 'bitrate', 'hls_status', 'hls_progress']
         extra_kwargs = {
             'category': {'required': True},
             'title': {'required': True},
@@ -72,6 +156,16 @@ class VideoSerializer(serializers.ModelSerializer):
             'module': {'required': False, 'allow_null': True},
         }
 
+    def validate(self, attrs):
+        if 'duration' in attrs:
+            if self.instance is not None and self.instance.video_file:
+                # Probed from the uploaded file; admin forms resend the text (even '0:00') on every edit
+                del attrs['duration']
+            else:
+                # External videos; a new upload is probed after it is saved
+                attrs['duration_seconds'] = parse_duration(attrs['duration'])
+        return attrs
+
     def create(self, validated_data):
         # Handle file uploads
         video_file = validated_data.pop('video_file', None)
@@ -113,23 +207,11 @@ class VideoSerializer(serializers.ModelSerializer):
         return instance
 
     def get_video_url(self, obj):
-        """Return video file URL or external URL"""
+        """External URL; uploaded files are played through the signed URL of the video detail or stream_url"""
         if obj.video_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.video_file.url)
-            return obj.video_file.url
+            return None
         return obj.video_url
 
-    def get_thumbnail(self, obj):
-        """Return thumbnail file URL or external URL"""
-        if obj.thumbnail:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.thumbnail.url)
-            return obj.thumbnail.url
-        return obj.thumbnail_url
-
 
 class UserCourseSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -152,6 +234,16 @@ class StudentProgressSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'completed_videos', 'completed_tasks']
 
 
+class CourseProgressSummarySerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    next_video_title = serializers.CharField(source='next_video.title', read_only=True, default=None)
+
+    class Meta:
+        model = CourseProgressSummary
+        fields = ['category', 'category_name', 'completed_videos', 'total_videos', 'percent',
+                  'completed_tasks', 'total_tasks', 'last_activity_at', 'next_video', 'next_video_title']
+
+
 class TaskSubmissionSerializer(serializers.ModelSerializer):
     task_title = serializers.CharField(source='task.title', read_only=True)
     task_type = serializers.CharField(source='task.task_type', read_only=True)
@@ -165,6 +257,25 @@ class TaskSubmissionSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_name', 'user_full_name', 'task', 'task_title', 'task_type',
                   'video_title', 'file', 'text_content', 'answers', 'score', 'total',
                   'status', 'feedback', 'reviewed_at', 'submitted_at', 'video']
+        read_only_fields = ['score', 'total']  # Graded by the server, see grading.py
 
     def get_user_full_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'purpose', 'filename', 'size', 'offset', 'checksum', 'status', 'created_at']
+        read_only_fields = ['offset', 'status']
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Size must be positive')
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise serializers.ValidationError('Expected a hex SHA-256 digest')
+        return value
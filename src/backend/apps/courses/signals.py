@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.users.models import User
+from . import background, entitlements, grading, images, probing, questions, summaries, view_counter
+from .cache import bump_catalog_version
+from .models import Category, Module, Video, Task, BankQuestion, TaskQuestion, UserCourse
+
+# Saves that only touch these fields don't change any catalog payload
+NON_CATALOG_FIELDS = {
+    Video: {'view_count'},
+}
+
+
+def _is_catalog_change(sender, update_fields):
+    if not update_fields:
+        return True
+    return not set(update_fields) <= NON_CATALOG_FIELDS.get(sender, set())
+
+
+@receiver(pre_save, sender=Module)
+def remember_previous_category(sender, instance, **kwargs):
+    """Modules and videos can move between categories; both sides need invalidating"""
+    if instance.pk and _is_catalog_change(sender, kwargs.get('update_fields')):
+        instance._previous_category_id = (
+            sender.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(pre_save, sender=Video)
+def remember_previous_video(sender, instance, **kwargs):
+    """Like remember_previous_category, plus the stored file so only a new upload is probed"""
+    if instance.pk and _is_catalog_change(sender, kwargs.get('update_fields')):
+        previous = sender.objects.filter(pk=instance.pk).values_list('category_id', 'video_file').first()
+        if previous is not None:
+            instance._previous_category_id, instance._previous_video_file = previous
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_catalog_version(instance.pk)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def module_or_video_changed(sender, instance, **kwargs):
+    if not _is_catalog_change(sender, kwargs.get('update_fields')):
+        return
+    bump_catalog_version(instance.category_id)
+    summaries.schedule_category_refresh(instance.category_id)
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None and previous != instance.category_id:
+        bump_catalog_version(previous)
+        summaries.schedule_category_refresh(previous)
+
+
+@receiver(post_save, sender=Video)
+def video_saved(sender, instance, **kwargs):
+    view_counter.forget(instance.pk, pending=False)
+
+
+@receiver(post_save, sender=Video)
+def schedule_probe(sender, instance, created, **kwargs):
+    """Read duration and resolution from a newly uploaded file once the row is committed
+
+    Only when the file itself changed: other saves (admin edits, background
+    jobs) and files ffprobe can't read must not queue probe after probe.
+    """
+    if not instance.video_file:
+        return
+    if created or getattr(instance, '_previous_video_file', instance.video_file.name) != instance.video_file.name:
+        pk = instance.pk
+        transaction.on_commit(lambda: background.submit(probing.probe_video, pk))
+
+
+@receiver(post_delete, sender=Video)
+def video_deleted(sender, instance, **kwargs):
+    view_counter.forget(instance.pk)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed(sender, instance, **kwargs):
+    category_id = Video.objects.filter(pk=instance.video_id).values_list('category_id', flat=True).first()
+    bump_catalog_version(category_id)
+    summaries.schedule_category_refresh(category_id)
+
+
+@receiver(post_save, sender=TaskQuestion)
+@receiver(post_delete, sender=TaskQuestion)
+def task_question_changed(sender, instance, **kwargs):
+    category_id = (
+        Task.objects.filter(pk=instance.task_id).values_list('video__category_id', flat=True).first()
+    )
+    bump_catalog_version(category_id)
+    grading.forget_answer_keys([instance.task_id])
+
+
+@receiver(post_save, sender=BankQuestion)
+def bank_question_changed(sender, instance, **kwargs):
+    """A bank question can appear in many courses"""
+    questions.invalidate_bank_questions([instance.pk])
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=BankQuestion)
+@receiver(post_save, sender=User)
+def schedule_image_derivatives(sender, instance, **kwargs):
+    """Resize newly uploaded images on the background pool once the row is committed"""
+    label = sender._meta.label
+    if images.needs_derivatives(instance, label):
+        pk = instance.pk
+        transaction.on_commit(lambda: background.submit(images.process_image, label, pk))
+
+
+@receiver(post_save, sender=UserCourse)
+@receiver(post_delete, sender=UserCourse)
+def user_course_changed(sender, instance, **kwargs):
+    entitlements.forget([instance.user_id])
+
+
+@receiver(post_save, sender=UserCourse)
+def start_progress_summary(sender, instance, created, **kwargs):
+    """Granted courses show up in the progress summaries before the first lesson"""
+    if created:
+        summaries.refresh([(instance.user_id, instance.category_id)])
+
+
+@receiver(m2m_changed, sender=UserCourse.modules.through)
+def user_course_modules_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            entitlements.forget([instance.user_id])
+    elif action == 'pre_clear':
+        # module.user_courses.clear(): pk_set is empty, so look the holders up before the rows go
+        entitlements.forget(UserCourse.objects.filter(modules=instance).values_list('user_id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        entitlements.forget(UserCourse.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
@@ -0,0 +1,147 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum
+from django.utils import timezone
+
+from .models import Task, TaskStats, Video, VideoStats
+
+# Upper bound on ids per batch request, keeps the IN clause and response size sane
+MAX_BATCH_IDS = 500
+
+STATUSES = ('pending', 'approved', 'rejected')
+
+# TaskStats counter -> VideoStats counter
+VIDEO_FIELDS = {
+    'total_submissions': 'total_submissions',
+    'pending': 'pending_submissions',
+    'approved': 'approved_submissions',
+    'rejected': 'rejected_submissions',
+}
+
+STATS_FIELDS = ['total_submissions', *STATUSES, 'graded', 'percent_sum']
+
+
+def submission_state(submission):
+    """The part of a submission the stats depend on"""
+    return submission.status, submission.score, submission.total
+
+
+def _contribution(state):
+    status, score, total = state
+    graded = total > 0
+    return {
+        'total_submissions': 1,
+        status: 1,
+        'graded': 1 if graded else 0,
+        'percent_sum': score * 100.0 / total if graded else 0,
+    }
+
+
+def _apply(model, pk, lookup, deltas):
+    if not deltas:
+        return
+    model.objects.get_or_create(**{lookup: pk})
+    model.objects.filter(pk=pk).update(
+        updated_at=timezone.now(), **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def record_submission_change(task, before=None, after=None):
+    """Move one submission's contribution from state `before` to `after` (None = no submission)
+
+    Call inside the transaction that saves the submission; each counter is one
+    F() update on a primary key, so the cost doesn't depend on submission volume.
+    """
+    deltas = Counter()
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            for field, value in _contribution(state).items():
+                deltas[field] += sign * value
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+
+    with transaction.atomic():
+        _apply(TaskStats, task.pk, 'task_id', deltas)
+        _apply(VideoStats, task.video_id, 'video_id', {
+            VIDEO_FIELDS[field]: delta for field, delta in deltas.items() if field in VIDEO_FIELDS
+        })
+
+
+def task_stats(task_ids):
+    """{task id: submission stats} for the given tasks, read from the stats table"""
+    result = {}
+    for task in Task.objects.filter(pk__in=task_ids).select_related('stats').only('id', 'stats'):
+        stats = getattr(task, 'stats', None) or TaskStats(task=task)
+        result[task.id] = {
+            'total_submissions': stats.total_submissions,
+            'pending': stats.pending,
+            'approved': stats.approved,
+            'rejected': stats.rejected,
+            'average_score': stats.average_score,
+        }
+    return result
+
+
+def video_stats(video_ids):
+    """{video id: view/task/submission stats} for the given videos, read from the stats table"""
+    videos = (
+        Video.objects.filter(pk__in=video_ids)
+        .select_related('stats')
+        .only('id', 'view_count', 'stats')
+        .annotate(num_tasks=Count('tasks'))
+    )
+    result = {}
+    for video in videos:
+        stats = getattr(video, 'stats', None) or VideoStats(video=video)
+        result[video.id] = {
+            'view_count': video.view_count,
+            'task_count': video.num_tasks,
+            'total_submissions': stats.total_submissions,
+            'pending_submissions': stats.pending_submissions,
+            'approved_submissions': stats.approved_submissions,
+            'rejected_submissions': stats.rejected_submissions,
+        }
+    return result
+
+
+def rebuild_stats(video_ids=None):
+    """Recompute the stats rows of the given videos (all when None) from task_submissions"""
+    tasks = Task.objects.all() if video_ids is None else Task.objects.filter(video_id__in=video_ids)
+    percent = ExpressionWrapper(F('submissions__score') * 100.0 / F('submissions__total'), output_field=FloatField())
+    graded = Q(submissions__total__gt=0)
+    rows = (
+        tasks.order_by()
+        .values('id', 'video_id')
+        .annotate(
+            total_submissions=Count('submissions'),
+            **{status: Count('submissions', filter=Q(submissions__status=status)) for status in STATUSES},
+            graded=Count('submissions', filter=graded),
+            percent_sum=Sum(percent, filter=graded),
+        )
+    )
+
+    # Videos left without tasks (last one deleted or moved away) are reset to zero
+    videos = Video.objects.all() if video_ids is None else Video.objects.filter(pk__in=video_ids)
+    task_rows, video_totals = [], {video_id: Counter() for video_id in videos.values_list('id', flat=True)}
+    for row in rows:
+        row['percent_sum'] = row['percent_sum'] or 0
+        task_rows.append(TaskStats(task_id=row['id'], **{field: row[field] for field in STATS_FIELDS}))
+        totals = video_totals.setdefault(row['video_id'], Counter())
+        for field, video_field in VIDEO_FIELDS.items():
+            totals[video_field] += row[field]
+    video_rows = [
+        VideoStats(video_id=video_id, **{field: totals[field] for field in VIDEO_FIELDS.values()})
+        for video_id, totals in video_totals.items()
+    ]
+
+    with transaction.atomic():
+        TaskStats.objects.bulk_create(
+            task_rows, batch_size=MAX_BATCH_IDS,
+            update_conflicts=True, unique_fields=['task'], update_fields=STATS_FIELDS + ['updated_at'],
+        )
+        VideoStats.objects.bulk_create(
+            video_rows, batch_size=MAX_BATCH_IDS,
+            update_conflicts=True, unique_fields=['video'],
+            update_fields=list(VIDEO_FIELDS.values()) + ['updated_at'],
+        )
+    return len(task_rows)
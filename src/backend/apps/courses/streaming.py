@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import posixpath
+import re
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import entitlements
+from .models import Video
+from .transcoding import HLS_ROOT
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HLS_CONTENT_TYPES = {'.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t'}
+
+
+def user_can_watch(user, video):
+    """Whether the user is entitled to play the video"""
+    if user.is_staff or user.is_superuser:
+        return True
+    category = video.category
+    if category.price == 0 or (video.module and video.module.price == 0):
+        return True
+    return entitlements.has_video(entitlements.for_user(user.pk), video)
+
+
+def _signature(video_id, name, user_id, expires):
+    value = f'{video_id}:{name}:{user_id}:{expires}'
+    return salted_hmac('apps.courses.streaming', value).hexdigest()
+
+
+def sign_stream_params(video, user):
+    """Query parameters of a short-lived stream URL; the file name travels signed so playback needs no DB hit"""
+    expires = int(time.time()) + settings.VIDEO_STREAM_URL_TTL
+    name = video.video_file.name
+    return {
+        'f': name,
+        'u': user.pk,
+        'e': expires,
+        's': _signature(video.pk, name, user.pk, expires),
+    }
+
+
+def verify_stream_params(video_id, params):
+    """Return the signed file name, or None if the signature is invalid or expired"""
+    try:
+        name, user_id, expires, signature = params['f'], params['u'], int(params['e']), params['s']
+    except (KeyError, ValueError):
+        return None
+    if expires < time.time():
+        return None
+    if not constant_time_compare(signature, _signature(video_id, name, user_id, expires)):
+        return None
+    return name
+
+
+def _hls_dir(video_id):
+    return f'{HLS_ROOT}/{video_id}/'
+
+
+def sign_hls_token(video, user):
+    """(path token, expiry timestamp) granting the user the video's HLS ladder
+
+    The token is a path segment rather than a query string, so the relative
+    rendition and segment URIs in the playlists carry it too.
+    """
+    expires = int(time.time()) + settings.VIDEO_STREAM_URL_TTL
+    return f'{user.pk}-{expires}-{_signature(video.pk, _hls_dir(video.pk), user.pk, expires)}', expires
+
+
+def verify_hls_path(video_id, token, path):
+    """Storage name of a file of the video's HLS ladder, or None if the token is invalid or expired"""
+    try:
+        user_id, expires, signature = token.split('-')
+        expires = int(expires)
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    if not constant_time_compare(signature, _signature(video_id, _hls_dir(video_id), user_id, expires)):
+        return None
+    name = posixpath.normpath(_hls_dir(video_id) + path)
+    # normpath resolves '..', which must not leave the ladder
+    if not name.startswith(_hls_dir(video_id)):
+        return None
+    return name
+
+
+def parse_range(header, size):
+    """(start, end) of a single-range `Range` header, None to serve the whole file, or ValueError if unsatisfiable"""
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def _iter_file(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def build_stream_response(request, name):
+    storage = Video._meta.get_field('video_file').storage
+    path = storage.path(name)
+    if not os.path.isfile(path):
+        return HttpResponse(status=404)
+
+    content_type = (
+        HLS_CONTENT_TYPES.get(os.path.splitext(name)[1]) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    )
+    offload = settings.VIDEO_STREAM_OFFLOAD
+
+    # Let the front proxy move the bytes; it handles Range requests itself
+    if offload == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.VIDEO_STREAM_ACCEL_PREFIX + quote(name)
+        return response
+    if offload == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_file(path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models import Max
+
+from . import background, unlocking
+from .models import CourseProgressSummary, TaskCompletion, TaskSubmission, UserCourse, VideoCompletion
+
+BATCH_SIZE = 500
+
+SUMMARY_FIELDS = [
+    'completed_videos', 'total_videos', 'completed_tasks', 'total_tasks', 'last_activity_at', 'next_video',
+    'updated_at',
+]
+
+
+def _later(a, b):
+    if a is None or b is None:
+        return a or b
+    return max(a, b)
+
+
+def refresh(pairs):
+    """Recompute the summaries of these (user id, category id) pairs
+
+    Reads the users' completions and latest submissions in those courses with
+    three grouped queries and the cached video indexes, then upserts every row
+    in one statement, so the cost doesn't depend on how many pairs are passed.
+    """
+    pairs = {(user_id, category_id) for user_id, category_id in pairs if category_id is not None}
+    if not pairs:
+        return
+    user_ids = {user_id for user_id, _ in pairs}
+    indexes = {category_id: unlocking.video_index(category_id) for _, category_id in pairs}
+    category_ids = [category_id for category_id, index in indexes.items() if index is not None]
+
+    videos, tasks, activity = {}, {}, {}
+    for user_id, category_id, video_id, completed_at in VideoCompletion.objects.filter(
+        user_id__in=user_ids, video__category_id__in=category_ids,
+    ).values_list('user_id', 'video__category_id', 'video_id', 'completed_at'):
+        videos.setdefault((user_id, category_id), set()).add(video_id)
+        activity[user_id, category_id] = _later(activity.get((user_id, category_id)), completed_at)
+    for user_id, category_id, task_id, completed_at in TaskCompletion.objects.filter(
+        user_id__in=user_ids, task__video__category_id__in=category_ids,
+    ).values_list('user_id', 'task__video__category_id', 'task_id', 'completed_at'):
+        tasks.setdefault((user_id, category_id), set()).add(task_id)
+        activity[user_id, category_id] = _later(activity.get((user_id, category_id)), completed_at)
+    for row in TaskSubmission.objects.filter(
+        user_id__in=user_ids, task__video__category_id__in=category_ids,
+    ).values('user_id', 'task__video__category_id').annotate(last=Max('submitted_at')):
+        key = (row['user_id'], row['task__video__category_id'])
+        activity[key] = _later(activity.get(key), row['last'])
+
+    rows = []
+    for user_id, category_id in pairs:
+        index = indexes[category_id]
+        if index is None:
+            continue
+        done_videos = videos.get((user_id, category_id), set())
+        done_tasks = tasks.get((user_id, category_id), set())
+        open_videos = unlocking.unlocked(index, done_videos, done_tasks)
+        rows.append(CourseProgressSummary(
+            user_id=user_id,
+            category_id=category_id,
+            completed_videos=len(done_videos),
+            total_videos=len(index['order']),
+            completed_tasks=len(done_tasks),
+            total_tasks=sum(len(video_tasks) for video_tasks in index['tasks'].values()),
+            last_activity_at=activity.get((user_id, category_id)),
+            next_video_id=next((video_id for video_id in open_videos if video_id not in done_videos), None),
+        ))
+    CourseProgressSummary.objects.bulk_create(
+        rows, batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['user', 'category'], update_fields=SUMMARY_FIELDS,
+    )
+
+
+def refresh_category(category_id):
+    """Recompute every summary of a course, e.g. after videos or tasks were added, removed or reordered"""
+    user_ids = list(
+        CourseProgressSummary.objects.filter(category_id=category_id).order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        refresh((user_id, category_id) for user_id in user_ids[start:start + BATCH_SIZE])
+
+
+def schedule_category_refresh(category_id):
+    """refresh_category() on the background pool once the catalog change is committed"""
+    if category_id is not None:
+        transaction.on_commit(lambda: background.submit(refresh_category, category_id))
+
+
+def rebuild():
+    """Recompute the summaries of every student who holds or has started a course; returns how many"""
+    pairs = set(UserCourse.objects.values_list('user_id', 'category_id'))
+    pairs.update(VideoCompletion.objects.values_list('user_id', 'video__category_id').distinct())
+    pairs.update(TaskCompletion.objects.values_list('user_id', 'task__video__category_id').distinct())
+    pairs = sorted(pairs)
+    for start in range(0, len(pairs), BATCH_SIZE):
+        refresh(pairs[start:start + BATCH_SIZE])
+    return len(pairs)
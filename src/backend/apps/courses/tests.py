@@ -1,3 +1,1197 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock
+from urllib.parse import urlparse
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from apps.users.models import User
+from . import (
+    analytics, completions, entitlements, grading, stats, streaming, summaries, transcoding, unlocking, uploads,
+    watching,
+)
+from .cache import bump_catalog_version, get_catalog_version
+from .images import process_image
+from .probing import format_duration, parse_duration, probe_video
+from .models import (
+    Category, Module, Video, Task, BankQuestion, TaskQuestion, TaskSubmission, TaskStats, UserCourse,
+    UploadSession, VideoCompletion, VideoWatchState,
+)
+from .view_counter import flush_view_counts
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def _add_categories(self, count, modules_per_category=3, videos_per_module=2):
+        for i in range(count):
+            category = Category.objects.create(name=f'Category {i}', icon='x', price=0, is_modular=True)
+            for j in range(modules_per_category):
+                module = Module.objects.create(category=category, name=f'Module {j}', order=j)
+                for k in range(videos_per_module):
+                    Video.objects.create(category=category, module=module, title=f'Video {k}', order=k)
+
+    def _count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_category_list_query_count_is_constant(self):
+        self._add_categories(1)
+        baseline, _ = self._count_queries('/api/categories/')
+
+        self._add_categories(5, modules_per_category=6)
+        queries, response = self._count_queries('/api/categories/')
+
+        self.assertEqual(queries, baseline)
+        first = response.data['results'][0]
+        self.assertEqual(first['video_count'], 6)
+        self.assertEqual(first['module_count'], 3)
+        self.assertEqual(first['modules'][0]['video_count'], 2)
+
+    def test_module_list_query_count_is_constant(self):
+        self._add_categories(1)
+        baseline, _ = self._count_queries('/api/modules/')
+
+        self._add_categories(4)
+        queries, response = self._count_queries('/api/modules/')
+
+        self.assertEqual(queries, baseline)
+        self.assertEqual(response.data['results'][0]['video_count'], 2)
+
+    def test_category_detail_reads_annotations(self):
+        self._add_categories(1, modules_per_category=4)
+        category = Category.objects.get()
+        queries, response = self._count_queries(f'/api/categories/{category.id}/')
+
+        self.assertEqual(response.data['video_count'], 8)
+        self.assertEqual(response.data['module_count'], 4)
+        self.assertLessEqual(queries, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='student'))
+        self.category = Category.objects.create(name='Matematika', icon='x', price=0)
+        self.url = f'/api/videos/by_category/?category_id={self.category.id}'
+
+    def test_matching_etag_returns_304_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_content_change_bumps_version(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(category=self.category, title='Intro')
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual([v['title'] for v in second.data], ['Intro'])
+
+    def test_bumped_version_does_not_expire_on_the_file_cache(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            version = get_catalog_version(self.category.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_catalog_version(self.category.id)
+            with mock.patch('time.time', return_value=time.time() + 3600):
+                self.assertEqual(get_catalog_version(self.category.id), version + 1)
+
+    def test_view_count_update_keeps_cache(self):
+        video = Video.objects.create(category=self.category, title='Intro')
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/videos/{video.id}/increment_view/')
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VideoListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='student'))
+        self.category = Category.objects.create(name='Fizika', icon='x', price=0)
+
+    def _add_videos(self, count):
+        for i in range(count):
+            video = Video.objects.create(category=self.category, title=f'Video {i}', order=i)
+            task = Task.objects.create(video=video, title='Test')
+            question = BankQuestion.objects.create(question='2+2?', options=['3', '4'], correct_answer=1)
+            TaskQuestion.objects.create(task=task, bank_question=question)
+
+    def test_by_category_is_slim_and_query_count_is_constant(self):
+        url = f'/api/videos/by_category/?category_id={self.category.id}'
+        self._add_videos(1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url)
+
+        self._add_videos(5)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+
+        self.assertEqual(len(ctx.captured_queries), len(baseline.captured_queries))
+        self.assertNotIn('tasks', response.data[0])
+        self.assertEqual(response.data[0]['task_count'], 1)
+        self.assertEqual(response.data[0]['category_name'], 'Fizika')
+
+    def test_include_tasks_returns_task_trees(self):
+        self._add_videos(1)
+        response = self.client.get('/api/videos/?include=tasks')
+
+        questions = response.data['results'][0]['tasks'][0]['questions']
+        self.assertEqual(questions[0]['question'], '2+2?')
+
+
+# The in-process locmem cache stands in for Redis, whose incr is atomic across workers
+@override_settings(CACHES=LOCMEM_CACHES, VIEW_COUNT_BUFFER=True)
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='student'))
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        self.video = Video.objects.create(category=category, title='Intro', view_count=10)
+        self.url = f'/api/videos/{self.video.id}/increment_view/'
+
+    def test_views_are_buffered_until_flushed(self):
+        self.client.post(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.data['view_count'], 12)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 10)
+
+        self.assertEqual(flush_view_counts(), 2)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 12)
+        self.assertEqual(self.client.post(self.url).data['view_count'], 13)
+        self.assertEqual(flush_view_counts(), 1)
+
+    @override_settings(VIEW_COUNT_BUFFER=False)
+    def test_plays_are_written_directly_without_an_atomic_cache(self):
+        self.assertEqual(self.client.post(self.url).data['view_count'], 11)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 11)
+        self.assertEqual(flush_view_counts(), 0)
+        self.assertEqual(self.client.post('/api/videos/999/increment_view/').status_code, 404)
+
+    def test_unknown_video_returns_404(self):
+        response = self.client.post('/api/videos/999/increment_view/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, VIDEO_STREAM_OFFLOAD=None)
+class VideoStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Tarix', icon='x', price=100)
+        self.video = Video.objects.create(category=self.category, title='Intro')
+        self.video.video_file.save('lesson.mp4', ContentFile(bytes(range(256)) * 4))
+
+    def _stream_url(self):
+        response = self.client.get(f'/api/videos/{self.video.id}/stream_url/')
+        self.assertEqual(response.status_code, 200)
+        url = urlparse(response.data['url'])
+        return f'{url.path}?{url.query}'
+
+    def test_requires_entitlement(self):
+        response = self.client.get(f'/api/videos/{self.video.id}/stream_url/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_only_videos_issue_stream_urls(self):
+        module = Module.objects.create(category=self.category, name='Kirish')
+        self.assertEqual(self.client.get(f'/api/modules/{module.id}/stream_url/').status_code, 404)
+
+    def test_range_request_returns_partial_content(self):
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+        url = self._stream_url()
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+    def test_tampered_signature_is_rejected(self):
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+        url = self._stream_url().replace('f=videos', 'f=avatars')
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_detail_plays_through_a_signed_url(self):
+        self.assertIsNone(self.client.get(f'/api/videos/{self.video.id}/').data['video_url'])
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+        cache.clear()
+
+        url = urlparse(self.client.get(f'/api/videos/{self.video.id}/').data['video_url'])
+        self.assertEqual(url.path, f'/api/videos/{self.video.id}/stream/')
+        response = self.client.get(f'{url.path}?{url.query}')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+
+    def test_hls_ladder_is_served_behind_a_signed_path(self):
+        ladder = os.path.join(self.media_root, 'hls', str(self.video.id))
+        os.makedirs(os.path.join(ladder, '360p'))
+        for name, content in (('master.m3u8', '#EXTM3U\n360p/index.m3u8\n'), ('360p/index.m3u8', '#EXTM3U\n')):
+            with open(os.path.join(ladder, name), 'w') as f:
+                f.write(content)
+        Video.objects.filter(pk=self.video.pk).update(
+            hls_status='ready', hls_playlist=f'hls/{self.video.id}/master.m3u8',
+        )
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+
+        master = urlparse(self._stream_url()).path
+        self.assertTrue(master.endswith('/master.m3u8'))
+        response = self.client.get(master)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        # Relative URIs in the playlist resolve under the same signed prefix
+        rendition = master.replace('master.m3u8', '360p/index.m3u8')
+        self.assertEqual(b''.join(self.client.get(rendition).streaming_content), b'#EXTM3U\n')
+
+        token = master.split('/')[-2]
+        self.assertEqual(self.client.get(master.replace(token, token[:-1] + 'x')).status_code, 403)
+        self.assertIsNone(streaming.verify_hls_path(self.video.id, token, '../../videos/lesson.mp4'))
+        self.assertIsNone(streaming.verify_hls_path(self.video.id + 1, token, 'master.m3u8'))
+
+    @override_settings(VIDEO_STREAM_OFFLOAD='x-accel-redirect')
+    def test_offload_to_proxy(self):
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+
+        response = self.client.get(self._stream_url())
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/lesson.mp4')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(
+            MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'chunked_uploads')
+        )
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        video = Video.objects.create(category=Category.objects.create(name='Ona tili', icon='x', price=0))
+        self.task = Task.objects.create(video=video, title='Insho', task_type='file')
+        self.content = os.urandom(3000)
+
+    def _create_session(self, checksum=None):
+        response = self.client.post('/api/uploads/', {
+            'purpose': 'submission',
+            'filename': 'insho.pdf',
+            'size': len(self.content),
+            'checksum': checksum or hashlib.sha256(self.content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploads/{response.data['id']}/", response.data['id']
+
+    def _patch(self, url, offset, body):
+        return self.client.generic(
+            'PATCH', url, body, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_resume_complete_and_attach(self):
+        url, upload_id = self._create_session()
+
+        self.assertEqual(self._patch(url, 0, self.content[:1000]).data['offset'], 1000)
+        self.assertEqual(self._patch(url, 0, self.content[:1000]).status_code, 409)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '1000')
+        self.assertEqual(self._patch(url, 1000, self.content[1000:]).data['offset'], 3000)
+        self.assertEqual(self.client.post(f'{url}complete/').data['status'], 'completed')
+
+        response = self.client.post('/api/submissions/submit/', {'task_id': self.task.id, 'upload_id': upload_id})
+
+        self.assertEqual(response.status_code, 201)
+        submission = TaskSubmission.objects.get()
+        with submission.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_a_chunk_that_loses_the_race_is_rejected(self):
+        url, upload_id = self._create_session()
+        stale = UploadSession.objects.get(pk=upload_id)
+        self._patch(url, 0, self.content[:1000])
+
+        with self.assertRaises(uploads.UploadError):
+            uploads.append_chunk(stale, 0, io.BytesIO(self.content[:500]))
+        self.assertEqual(stale.offset, 1000)
+
+    def test_a_rejected_request_doesnt_open_the_upload(self):
+        url, upload_id = self._create_session()
+        self._patch(url, 0, self.content)
+        self.client.post(f'{url}complete/')
+
+        with mock.patch.object(uploads, 'open_completed') as open_completed:
+            response = self.client.post('/api/submissions/submit/', {'task_id': 0, 'upload_id': upload_id})
+        self.assertEqual(response.status_code, 404)
+        open_completed.assert_not_called()
+
+    def test_abandoned_sessions_are_expired(self):
+        url, upload_id = self._create_session()
+        self._patch(url, 0, self.content[:1000])
+        part = uploads.part_path(UploadSession.objects.get(pk=upload_id))
+        orphan = os.path.join(os.path.dirname(part), f'{uuid.uuid4()}.part')
+        open(orphan, 'wb').close()
+
+        self.assertEqual(uploads.expire_sessions(), 0)
+        later = timezone.now() + datetime.timedelta(days=2)
+        self.assertEqual(uploads.expire_sessions(now=later), 1)
+        self.assertEqual(uploads.remove_orphaned_parts(now=later), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.dirname(part)), [])
+
+    def test_checksum_mismatch_is_rejected(self):
+        url, _ = self._create_session(checksum='0' * 64)
+        self._patch(url, 0, self.content)
+
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_thumbnail_variants_are_generated_and_exposed(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (500, 300), 'red').save(buffer, 'PNG')
+        video = Video.objects.create(category=Category.objects.create(name='Art', icon='x', price=0))
+        video.thumbnail.save('cover.png', ContentFile(buffer.getvalue()))
+
+        process_image('courses.Video', video.id)
+
+        video.refresh_from_db()
+        self.assertEqual(sorted(video.thumbnail_variants['webp']), ['160', '320'])
+        with video.thumbnail.storage.open(video.thumbnail_variants['jpeg']['320']) as f:
+            self.assertEqual(Image.open(f).size, (320, 192))
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='student'))
+        srcset = client.get(f'/api/videos/{video.id}/').data['thumbnail_srcset']
+        self.assertTrue(srcset['webp'].endswith('cover_w320.webp 320w'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MediaInfoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('12:30'), 750)
+        self.assertEqual(parse_duration('1:02:03'), 3723)
+        self.assertEqual(parse_duration('45'), 45)
+        self.assertEqual(parse_duration('15 daqiqa'), 900)
+        self.assertIsNone(parse_duration('noma\'lum'))
+        self.assertEqual(format_duration(3723), '1:02:03')
+
+    def test_course_totals_sum_video_durations(self):
+        category = Category.objects.create(name='Kimyo', icon='x', price=0, is_modular=True)
+        module = Module.objects.create(category=category, name='Asoslar')
+        for duration in ('10:00', '05:30'):
+            response = self.client.post('/api/videos/', {
+                'category': category.id, 'module': module.id, 'title': 'Dars', 'duration': duration,
+            })
+            self.assertEqual(response.status_code, 201)
+
+        data = self.client.get(f'/api/categories/{category.id}/').data
+        self.assertEqual(data['total_duration'], 930)
+        self.assertEqual(data['modules'][0]['total_duration'], 930)
+
+    def test_resending_the_duration_keeps_the_probed_seconds(self):
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        video = Video.objects.create(
+            category=category, title='Dars', video_file='videos/a.mp4', duration='12:31', duration_seconds=751,
+        )
+
+        for duration in ('0:00', ''):
+            response = self.client.patch(f'/api/videos/{video.id}/', {'title': 'Dars 1', 'duration': duration})
+            self.assertEqual(response.status_code, 200)
+            video.refresh_from_db()
+            self.assertEqual((video.duration, video.duration_seconds), ('12:31', 751))
+
+        external = Video.objects.create(category=category, title='Dars', video_url='https://example.com/v')
+        self.client.patch(f'/api/videos/{external.id}/', {'duration': '13:00'})
+        self.assertEqual(Video.objects.get(pk=external.pk).duration_seconds, 780)
+
+    def test_probe_is_queued_only_for_a_new_file(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        with override_settings(MEDIA_ROOT=media_root), mock.patch('apps.courses.background.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                video = Video.objects.create(category=category, title='Dars', video_file=ContentFile(b'x', 'a.mp4'))
+            with self.captureOnCommitCallbacks(execute=True):
+                video.title = 'Dars 1'
+                video.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                video.video_file = ContentFile(b'y', 'b.mp4')
+                video.save()
+
+        probes = [call for call in submit.call_args_list if call.args[0] is probe_video]
+        self.assertEqual(len(probes), 2)
+
+    def test_stale_transcodes_are_requeued(self):
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        now = timezone.now()
+        crashed, running = [
+            Video.objects.create(category=category, title='Dars', hls_status='processing', hls_claimed_at=claimed_at)
+            for claimed_at in (now - datetime.timedelta(hours=3), now - datetime.timedelta(minutes=5))
+        ]
+
+        self.assertEqual(transcoding.requeue_stale(), 1)
+        self.assertEqual(Video.objects.get(pk=crashed.pk).hls_status, 'pending')
+        self.assertEqual(Video.objects.get(pk=running.pk).hls_status, 'processing')
+
+    def test_a_transcode_refreshes_its_claim_when_it_starts(self):
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        video = Video.objects.create(category=category, title='Dars', video_file='videos/a.mp4', hls_status='pending')
+        transcoding.claim_video(video.pk)
+        # Waited in the pool's queue for longer than the stale window
+        Video.objects.filter(pk=video.pk).update(hls_claimed_at=timezone.now() - datetime.timedelta(hours=3))
+
+        requeued = []
+
+        def probe(path):
+            requeued.append(transcoding.requeue_stale())
+            raise transcoding.TranscodingError('stop')
+
+        with mock.patch.object(transcoding, 'probe', side_effect=probe):
+            transcoding.transcode_video(video.pk)
+        self.assertEqual(requeued, [0])
+
+    def test_a_transcode_of_a_replaced_file_is_discarded(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        category = Category.objects.create(name='Kimyo', icon='x', price=0)
+        video = Video.objects.create(category=category, title='Dars', video_file='videos/a.mp4', hls_status='pending')
+        transcoding.claim_video(video.pk)
+
+        def upload_during_transcode(command, duration, on_progress):
+            on_progress(50)
+            video.video_file = 'videos/b.mp4'
+            video.mark_new_upload()
+            video.save()
+
+        info = {'duration': 10, 'width': 640, 'height': 360, 'bitrate': 0, 'has_audio': False}
+        with override_settings(MEDIA_ROOT=media_root), mock.patch.object(transcoding, 'probe', return_value=info), \
+                mock.patch.object(transcoding, '_run_ffmpeg', side_effect=upload_during_transcode):
+            self.assertEqual(transcoding.transcode_video(video.pk), (video.pk, 'No longer claimed'))
+
+        video.refresh_from_db()
+        self.assertEqual((video.hls_status, video.hls_progress, video.hls_playlist), ('pending', 0, None))
+        self.assertEqual(os.listdir(os.path.join(media_root, 'hls')), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        self.category = Category.objects.create(name='Tarix', icon='x', price=0)
+
+    def _add_videos(self, orders):
+        return [
+            Video.objects.create(category=self.category, title=f'Video {i}', order=order)
+            for i, order in enumerate(orders)
+        ]
+
+    def _titles(self):
+        return list(Video.objects.filter(category=self.category).values_list('title', flat=True))
+
+    def test_move_writes_a_single_row(self):
+        videos = self._add_videos(range(1, 6))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/api/videos/{videos[4].id}/move/', {'after_id': videos[0].id})
+
+        self.assertEqual(response.data['order'], 1.5)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._titles(), ['Video 0', 'Video 4', 'Video 1', 'Video 2', 'Video 3'])
+
+        self.client.post(f'/api/videos/{videos[2].id}/move/', {'after_id': None}, format='json')
+        self.assertEqual(self._titles()[0], 'Video 2')
+
+    def test_tied_keys_are_renumbered(self):
+        videos = self._add_videos([0, 0, 0])
+
+        self.client.post(f'/api/videos/{videos[0].id}/move/', {'after_id': videos[1].id})
+
+        self.assertEqual(self._titles(), ['Video 1', 'Video 0', 'Video 2'])
+
+    def test_bulk_update_order_skips_unchanged_rows(self):
+        videos = self._add_videos([1, 2, 3])
+
+        response = self.client.post('/api/videos/bulk_update_order/', {'updates': [
+            {'id': videos[0].id, 'order': 3}, {'id': videos[1].id, 'order': 2}, {'id': videos[2].id, 'order': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self._titles(), ['Video 2', 'Video 1', 'Video 0'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TaskQuestionWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        category = Category.objects.create(name='Biologiya', icon='x', price=0)
+        self.video = Video.objects.create(category=category, title='Hujayra')
+
+    def _questions(self, count):
+        return [
+            {'question': f'Savol {i}', 'options': ['a', 'b', 'c', 'd'], 'correct_answer': i % 4}
+            for i in range(count)
+        ]
+
+    def test_create_saves_questions_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/tasks/', {
+                'video': self.video.id, 'title': 'Test', 'task_type': 'test', 'questions': self._questions(50),
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['questions']), 50)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)  # task, bank questions, links
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_update_keeps_ids_and_only_writes_changed_rows(self):
+        task = self.client.post('/api/tasks/', {
+            'video': self.video.id, 'title': 'Test', 'task_type': 'test', 'questions': self._questions(3),
+        }, format='json').data
+        first, second, third = task['questions']
+        first['question'] = 'Yangi savol'
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(f'/api/tasks/{task["id"]}/', {
+                'questions': [first, second, {'id': 'new-1', 'question': 'Qo\'shimcha', 'options': ['x', 'y']}],
+            }, format='json')
+
+        ids = [question['id'] for question in response.data['questions']]
+        self.assertEqual(ids[:2], [first['id'], second['id']])
+        self.assertNotIn(third['id'], ids)
+        self.assertEqual(response.data['questions'][0]['question'], 'Yangi savol')
+        statements = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE "bank_questions"')]), 1)
+        self.assertFalse([sql for sql in statements if sql.startswith('UPDATE "task_questions"')])
+
+    def test_linked_tasks_share_question_edits(self):
+        task = self.client.post('/api/tasks/', {
+            'video': self.video.id, 'title': 'Test', 'task_type': 'test', 'questions': self._questions(2),
+        }, format='json').data
+        other_video = Video.objects.create(category=self.video.category, title='Boshqa')
+        linked = self.client.post(f'/api/tasks/{task["id"]}/link_to_video/', {'video_id': other_video.id}).data
+
+        question = dict(task['questions'][1], question='Tahrirlangan')
+        self.client.put(f'/api/tasks/{task["id"]}/', {'questions': [task['questions'][0], question]}, format='json')
+
+        linked = self.client.get(f'/api/tasks/{linked["id"]}/').data
+        self.assertEqual(linked['questions'][1]['question'], 'Tahrirlangan')
+        self.assertEqual(BankQuestion.objects.count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CloneCategoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def _build_course(self, videos_per_module):
+        category = Category.objects.create(name='Ingliz tili', icon='x', price=100, is_modular=True)
+        for m in range(2):
+            module = Module.objects.create(category=category, name=f'Module {m}', order=m)
+            for v in range(videos_per_module):
+                video = Video.objects.create(
+                    category=category, module=module, title=f'Video {m}.{v}', order=v, view_count=7,
+                    video_file='videos/lesson.mp4',
+                )
+                task = Task.objects.create(video=video, title='Test')
+                question = BankQuestion.objects.create(question='Savol', options=['a', 'b'], correct_answer=1)
+                TaskQuestion.objects.create(task=task, bank_question=question)
+        return category
+
+    def _clone(self, category):
+        return self.client.post(f'/api/categories/{category.id}/clone/', {'name': 'Ingliz tili 2027'})
+
+    def test_clone_copies_the_whole_tree(self):
+        category = self._build_course(videos_per_module=2)
+
+        response = self._clone(category)
+
+        self.assertEqual(response.status_code, 201)
+        clone = Category.objects.get(pk=response.data['id'])
+        self.assertEqual(clone.name, 'Ingliz tili 2027')
+        self.assertFalse(clone.is_active)
+        self.assertEqual(response.data['video_count'], 4)
+        videos = Video.objects.filter(category=clone).select_related('module')
+        self.assertTrue(all(video.module.category_id == clone.id for video in videos))
+        self.assertTrue(all(video.view_count == 0 and video.video_file.name == 'videos/lesson.mp4' for video in videos))
+        self.assertEqual(TaskQuestion.objects.filter(task__video__category=clone).count(), 4)
+        self.assertEqual(TaskQuestion.objects.filter(task__video__category=category).count(), 4)
+
+    def test_query_count_does_not_grow_with_course_size(self):
+        small, large = self._build_course(videos_per_module=1), self._build_course(videos_per_module=5)
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self._clone(small)
+        with CaptureQueriesContext(connection) as large_ctx:
+            self._clone(large)
+
+        self.assertEqual(len(small_ctx.captured_queries), len(large_ctx.captured_queries))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.student = User.objects.create(username='student')
+        self.client.force_authenticate(self.student)
+        video = Video.objects.create(category=Category.objects.create(name='Algebra', icon='x', price=0))
+        self.task = Task.objects.create(video=video, title='Test', task_type='test')
+        self.links = [
+            TaskQuestion.objects.create(
+                task=self.task, order=i,
+                bank_question=BankQuestion.objects.create(question=f'Q{i}', options=['a', 'b', 'c'], correct_answer=i),
+            )
+            for i in range(3)
+        ]
+
+    def _submit(self, answers, **extra):
+        return self.client.post('/api/submissions/submit/', {
+            'task_id': self.task.id, 'answers': json.dumps(answers), **extra,
+        })
+
+    def test_submission_is_graded_on_the_server(self):
+        answers = {str(self.links[0].id): 0, str(self.links[1].id): 2, str(self.links[2].id): 2}
+
+        response = self._submit(answers, score=3, total=3)
+
+        self.assertEqual((response.data['score'], response.data['total']), (2, 3))
+        self.assertEqual(response.data['answers'], answers)
+
+    def test_question_edit_invalidates_key_and_regrade_rescores(self):
+        self._submit({str(self.links[1].id): 2})
+        self.assertEqual(TaskSubmission.objects.get().score, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question = self.links[1].bank_question
+            question.correct_answer = 2
+            question.save()
+        self.assertEqual(grading.answer_key(self.task.id)[1].tolist(), [0, 2, 2])
+
+        self.assertEqual(grading.regrade_task(self.task.id), 1)
+        self.assertEqual(TaskSubmission.objects.get().score, 1)
+
+    def test_students_dont_get_the_answer_key(self):
+        video_id = self.task.video_id
+        responses = [
+            self.client.get(f'/api/tasks/{self.task.id}/'),
+            self.client.get(f'/api/videos/{video_id}/'),
+            self.client.get('/api/videos/?include=tasks'),
+            self.client.get('/api/question-bank/'),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('correct_answer', json.dumps(response.data))
+
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        questions = self.client.get(f'/api/tasks/{self.task.id}/').data['questions']
+        self.assertEqual([question['correct_answer'] for question in questions], [0, 1, 2])
+
+    def test_students_cant_edit_shared_questions(self):
+        question = self.links[0].bank_question
+        self.assertEqual(self.client.get(f'/api/question-bank/{question.id}/').status_code, 200)
+        response = self.client.patch(f'/api/question-bank/{question.id}/', {'correct_answer': 2}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/task-questions/{self.links[0].id}/').status_code, 403)
+        self.assertEqual(BankQuestion.objects.get(pk=question.pk).correct_answer, 0)
+
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        response = self.client.patch(f'/api/question-bank/{question.id}/', {'correct_answer': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        category = Category.objects.create(name='Geometriya', icon='x', price=0)
+        self.videos = [Video.objects.create(category=category, title=f'Video {i}', view_count=i) for i in range(3)]
+        self.tasks = [Task.objects.create(video=video, title='Test') for video in self.videos]
+        students = [User.objects.create(username=f'student{i}') for i in range(3)]
+        # Task 0: 1/2 approved, 2/2 pending, 0/0 rejected -> average of 50% and 100%
+        results = [(1, 2, 'approved'), (2, 2, 'pending'), (0, 0, 'rejected')]
+        for student, (score, total, submission_status) in zip(students, results):
+            TaskSubmission.objects.create(
+                user=student, task=self.tasks[0], score=score, total=total, status=submission_status,
+            )
+        # Created behind the API's back, like drift: recount
+        self.assertEqual(stats.rebuild_stats(), 3)
+
+    def test_task_stats_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/tasks/{self.tasks[0].id}/stats/')
+
+        self.assertEqual(response.data, {
+            'total_submissions': 3, 'pending': 1, 'approved': 1, 'rejected': 1, 'average_score': 75.0,
+        })
+        self.assertEqual(len(ctx.captured_queries), 2)  # get_object() + stats row
+
+    def test_batch_stats(self):
+        ids = ','.join(str(video.id) for video in self.videos)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/videos/batch_stats/?ids={ids}')
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data[self.videos[0].id]['pending_submissions'], 1)
+        self.assertEqual(response.data[self.videos[2].id], {
+            'view_count': 2, 'task_count': 1, 'total_submissions': 0,
+            'pending_submissions': 0, 'approved_submissions': 0, 'rejected_submissions': 0,
+        })
+        tasks = self.client.get(f'/api/tasks/batch_stats/?ids={self.tasks[1].id}').data
+        self.assertEqual(tasks[self.tasks[1].id]['average_score'], 0)
+        self.assertEqual(self.client.get('/api/tasks/batch_stats/?ids=1,x').status_code, 400)
+
+    def test_submit_and_review_update_stats(self):
+        student = User.objects.create(username='student')
+        self.client.force_authenticate(student)
+        self.client.post('/api/submissions/submit/', {'task_id': self.tasks[1].id, 'text_content': 'x'})
+        self.assertEqual(TaskStats.objects.get(pk=self.tasks[1].pk).approved, 1)  # tests are auto-approved
+
+        submission = TaskSubmission.objects.get(user=student)
+        self.client.force_authenticate(User.objects.get(username='admin'))
+        self.client.post(f'/api/submissions/{submission.id}/reject/', {'feedback': 'Qayta'})
+        pending = TaskSubmission.objects.get(task=self.tasks[0], status='pending')
+        self.client.post(f'/api/submissions/{pending.id}/approve/')
+
+        self.assertEqual(stats.task_stats([self.tasks[1].id])[self.tasks[1].id], {
+            'total_submissions': 1, 'pending': 0, 'approved': 0, 'rejected': 1, 'average_score': 0,
+        })
+        video = stats.video_stats([self.videos[0].id])[self.videos[0].id]
+        self.assertEqual((video['pending_submissions'], video['approved_submissions']), (0, 2))
+
+        self.client.delete(f'/api/submissions/{submission.id}/')
+        self.assertEqual(TaskStats.objects.get(pk=self.tasks[1].pk).total_submissions, 0)
+
+    def test_deleting_the_last_task_resets_video_totals(self):
+        self.client.delete(f'/api/tasks/{self.tasks[0].id}/')
+
+        video = stats.video_stats([self.videos[0].id])[self.videos[0].id]
+        self.assertEqual((video['task_count'], video['total_submissions'], video['pending_submissions']), (0, 0, 0))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CompletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Fizika', icon='x', price=0)
+        self.videos = [Video.objects.create(category=category, title=f'Video {i}') for i in range(2)]
+        self.task = Task.objects.create(video=self.videos[0], title='Test')
+
+    def test_completions_are_idempotent_and_keep_the_response_shape(self):
+        for video in [self.videos[1], self.videos[0], self.videos[1]]:
+            response = self.client.post('/api/progress/complete_video/', {'video_id': video.id})
+        self.client.post('/api/progress/complete_task/', {'task_id': self.task.id})
+
+        response = self.client.get('/api/progress/my_progress/')
+        self.assertEqual(set(response.data), {'id', 'user', 'completed_videos', 'completed_tasks'})
+        self.assertEqual(response.data['completed_videos'], [self.videos[1].id, self.videos[0].id])
+        self.assertEqual(response.data['completed_tasks'], [self.task.id])
+        self.assertEqual(VideoCompletion.objects.filter(video=self.videos[1]).count(), 1)
+
+    def test_unknown_items_are_rejected(self):
+        self.assertEqual(self.client.post('/api/progress/complete_video/', {'video_id': 999}).status_code, 404)
+        self.assertEqual(self.client.post('/api/progress/complete_task/', {'task_id': 'x'}).status_code, 400)
+
+    def test_user_progress_query_count_is_fixed(self):
+        extra = Video.objects.create(category=self.videos[0].category, title='Extra')
+        TaskSubmission.objects.create(user=self.user, task=self.task, score=1, total=2, status='rejected')
+        TaskSubmission.objects.create(user=self.user, task=self.task, score=2, total=2, status='approved')
+        # No progress row: completions.complete() and sync() never create one
+        completions.complete(self.user, video_ids=[self.videos[0].id])
+
+        def fetch():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(f'/api/progress/user_progress/?user_id={self.user.id}')
+            return response, len(ctx.captured_queries)
+
+        response, one = fetch()
+        self.assertEqual(response.data['video_details'], [{
+            'video_id': self.videos[0].id, 'video_title': 'Video 0', 'category_name': 'Fizika',
+            'category_id': self.videos[0].category_id, 'task_score': 2, 'task_total': 2, 'task_status': 'approved',
+        }])
+        completions.complete(self.user, video_ids=Video.objects.values_list('id', flat=True))
+        response, many = fetch()
+        self.assertEqual(len(response.data['video_details']), 3)
+        self.assertEqual(one, many)
+        self.assertEqual(response.data['completed_videos'], [self.videos[0].id, self.videos[1].id, extra.id])
+        self.assertEqual(self.client.get('/api/progress/user_progress/').status_code, 400)
+
+    def test_sync_applies_a_batch_and_returns_the_delta(self):
+        events = [
+            {'type': 'video', 'id': self.videos[1].id, 'completed_at': '2026-01-02T10:00:00Z'},
+            {'type': 'video', 'id': self.videos[0].id, 'completed_at': '2026-01-01T10:00:00Z'},
+            {'type': 'video', 'id': self.videos[1].id, 'completed_at': '2026-01-03T10:00:00Z'},
+            {'type': 'task', 'id': self.task.id},
+            {'type': 'video', 'id': 999},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/progress/sync/', {'events': events}, format='json')
+        self.assertLess(len(ctx.captured_queries), 20)  # fixed, whatever the number of events
+        self.assertEqual(sorted(response.data['completed_videos']), sorted(v.id for v in self.videos))
+        self.assertEqual((response.data['completed_tasks'], response.data['ignored']), ([self.task.id], 1))
+        self.assertEqual(
+            self.client.get('/api/progress/my_progress/').data['completed_videos'],
+            [self.videos[0].id, self.videos[1].id],
+        )
+
+        # Replaying is a no-op; completions from another device show up in the next delta
+        cursor = response.data['cursor']
+        replay = self.client.post('/api/progress/sync/', {'events': events, 'cursor': cursor}, format='json')
+        self.assertEqual((replay.data['completed_videos'], replay.data['cursor']), ([], cursor))
+        video = Video.objects.create(category=self.videos[0].category, title='Other device')
+        completions.complete(self.user, video_ids=[video.id])
+        later = self.client.post('/api/progress/sync/', {'events': [], 'cursor': cursor}, format='json')
+        self.assertEqual(later.data['completed_videos'], [video.id])
+
+        bad = self.client.post('/api/progress/sync/', {'events': [{'type': 'module', 'id': 1}]}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UnlockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Kimyo', icon='x', price=0, is_modular=True)
+        second = Module.objects.create(category=self.category, name='Second', order=2)
+        first = Module.objects.create(category=self.category, name='First', order=1)
+        # Study order follows the modules, not creation order
+        self.videos = [
+            Video.objects.create(category=self.category, module=first, title='A', order=1),
+            Video.objects.create(category=self.category, module=first, title='B', order=2),
+            Video.objects.create(category=self.category, module=second, title='C', order=1),
+        ]
+        self.task = Task.objects.create(video=self.videos[0], title='Test')
+
+    def unlocked(self):
+        return self.client.get(f'/api/categories/{self.category.id}/unlocked/').data['unlocked_video_ids']
+
+    def test_videos_unlock_in_order(self):
+        self.assertEqual(self.unlocked(), [self.videos[0].id])
+        self.assertEqual(self.client.get(f'/api/videos/{self.videos[1].id}/').status_code, 403)
+
+        completions.complete(self.user, video_ids=[self.videos[0].id])
+        self.assertEqual(self.unlocked(), [self.videos[0].id])  # its task is still open
+        completions.complete(self.user, task_ids=[self.task.id], video_ids=[self.videos[1].id])
+        self.assertEqual(self.unlocked(), [v.id for v in self.videos])
+
+        self.client.get(f'/api/videos/{self.videos[2].id}/')  # warms the cached index
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(unlocking.is_unlocked(self.user, self.videos[2]))
+        self.assertEqual(len(ctx.captured_queries), 1)  # B has no tasks
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.unlocked(), [self.videos[0].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(pk=self.category.pk).update(requires_sequential=False)
+            bump_catalog_version(self.category.pk)
+        self.assertEqual(len(self.unlocked()), 3)
+        self.assertEqual(self.client.get(f'/api/videos/{self.videos[2].id}/').status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EntitlementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='student')
+        self.category = Category.objects.create(name='Biologiya', icon='x', price=100, is_modular=True)
+        self.modules = [Module.objects.create(category=self.category, name=f'M{i}', order=i) for i in range(2)]
+        self.videos = [Video.objects.create(category=self.category, module=module, title='V') for module in self.modules]
+
+    def test_grants_are_cached_and_refreshed_on_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+            course.modules.add(self.modules[0])
+
+        grants = entitlements.for_user(self.user.pk)
+        entitlements.has_video(grants, self.videos[1])
+        with CaptureQueriesContext(connection) as ctx:
+            grants = entitlements.for_user(self.user.pk)
+            allowed = [entitlements.has_video(grants, video) for video in self.videos]
+            self.assertEqual([course.has_access_to_video(video) for video in self.videos], [True, False])
+            self.assertFalse(course.has_access_to_module(self.modules[1]))
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(allowed, [True, False])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modules[1].user_courses.add(course)
+        self.assertTrue(entitlements.has_video(entitlements.for_user(self.user.pk), self.videos[1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modules[1].user_courses.clear()
+        self.assertFalse(entitlements.has_video(entitlements.for_user(self.user.pk), self.videos[1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(entitlements.for_user(self.user.pk), {})
+
+    def test_catalog_edits_keep_the_cached_grants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+        self.assertFalse(entitlements.has_video(entitlements.for_user(self.user.pk), self.videos[0]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.is_modular = False
+            self.category.save()
+        with CaptureQueriesContext(connection) as ctx:
+            grants = entitlements.for_user(self.user.pk)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        # Only whether the course is modular is reloaded
+        self.assertTrue(entitlements.has_video(grants, self.videos[0]))
+
+    def test_expired_grants_are_ignored(self):
+        UserCourse.objects.create(
+            user=self.user, category=self.category, granted_by='gift',
+            expires_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        self.assertEqual(entitlements.for_user(self.user.pk), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProgressSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Matematika', icon='x', price=0)
+        self.videos = [Video.objects.create(category=self.category, title=f'V{i}', order=i) for i in range(3)]
+        self.task = Task.objects.create(video=self.videos[0], title='Test')
+
+    def courses(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/progress/courses/').data
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return data
+
+    def test_summary_follows_progress_and_catalog(self):
+        UserCourse.objects.create(user=self.user, category=self.category, granted_by='gift')
+        summary = self.courses()[0]
+        self.assertEqual((summary['completed_videos'], summary['total_videos'], summary['total_tasks']), (0, 3, 1))
+        self.assertEqual(summary['next_video'], self.videos[0].id)
+
+        self.client.post('/api/progress/complete_video/', {'video_id': self.videos[0].id})
+        self.client.post('/api/progress/complete_task/', {'task_id': self.task.id})
+        summary = self.courses()[0]
+        self.assertEqual((summary['completed_videos'], summary['percent'], summary['completed_tasks']), (1, 33, 1))
+        self.assertEqual((summary['next_video'], summary['next_video_title']), (self.videos[1].id, 'V1'))
+        self.assertIsNotNone(summary['last_activity_at'])
+
+        Video.objects.create(category=self.category, title='V3', order=3)
+        # Both happen on commit: the catalog version bump (which drops the cached index) and the refresh
+        cache.clear()
+        summaries.refresh_category(self.category.id)
+        self.assertEqual(self.courses()[0]['total_videos'], 4)
+
+    def test_rebuild_covers_students_without_a_grant(self):
+        VideoCompletion.objects.create(user=self.user, video=self.videos[2])
+        self.assertEqual(summaries.rebuild(), 1)
+        self.assertEqual(self.courses()[0]['completed_videos'], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, WATCH_FLUSH_INTERVAL=0)
+class WatchStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        watching._pending.clear()
+        watching._flush_queued = False
+        self.user = User.objects.create(username='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Tarix', icon='x', price=0)
+        self.video = Video.objects.create(category=category, title='Intro')
+        self.url = f'/api/videos/{self.video.id}/heartbeat/'
+
+    def ping(self, position, ranges):
+        return self.client.post(self.url, {'position': position, 'watched_ranges': ranges}, format='json')
+
+    def test_pings_are_coalesced_into_one_upsert(self):
+        self.ping(0, [])
+        with CaptureQueriesContext(connection) as ctx:
+            self.ping(30, [[0, 30]])
+            response = self.ping(75.5, [[0, 30], [60, 75.5]])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertFalse(VideoWatchState.objects.exists())
+
+        self.assertEqual(self.client.get(f'/api/videos/{self.video.id}/').data['resume_position'], 75.5)
+        self.assertEqual(watching.flush(), 1)
+        self.ping(90, [[70, 90]])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(watching.flush(), 1)
+        # Savepoint, users, videos, insert of new pairs, locked read, upsert, release
+        self.assertEqual(len(ctx.captured_queries), 7)
+
+        state = VideoWatchState.objects.get()
+        self.assertEqual((state.position, state.watched_ranges, state.watched_seconds), (90, [[0, 30], [60, 90]], 60))
+        cache.clear()
+        self.assertEqual(self.client.get(f'/api/videos/{self.video.id}/').data['resume_position'], 90)
+
+    def test_analytics_for_admins(self):
+        self.video.duration_seconds = 10
+        self.video.save()
+        students = [User.objects.create(username=f'viewer{i}') for i in range(3)]
+        # Ranges past the end (stored before durations were enforced) only count up to the duration
+        for student, ranges in zip(students, [[[0, 1000]], [[0, 4], [6, 8]], []]):
+            VideoWatchState.objects.create(
+                user=student, video=self.video, watched_ranges=ranges,
+                watched_seconds=sum(end - start for start, end in ranges),
+            )
+        url = f'/api/videos/{self.video.id}/analytics/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        data = self.client.get(url).data
+        self.assertEqual(data['retention'], [2, 2, 2, 2, 1, 1, 2, 2, 1, 1])
+        self.assertEqual((data['viewers'], data['median_watch_seconds'], data['average_watch_seconds']), (3, 6, 5.3))
+        self.assertEqual(data['completion_rate'], 33.3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), 1)  # The video lookup; the result is cached
+
+    def test_malformed_ranges_dont_shift_other_rows(self):
+        students = [User.objects.create(username=f'viewer{i}') for i in range(3)]
+        for student, ranges in zip(students, [[[0, 2], [3]], [[0, 1, 2]], [[4, 6]]]):
+            VideoWatchState.objects.create(user=student, video=self.video, watched_ranges=ranges)
+
+        viewer, intervals, viewers = analytics.load_watch_data(self.video.pk)
+        self.assertEqual((viewer.tolist(), intervals.tolist(), viewers), ([2], [[4, 6]], 3))
+
+    def test_retention_curve_rounds_range_ends(self):
+        intervals = np.array([[0, 3.4], [2.6, 5], [4.2, 9]])
+        self.assertEqual(analytics.retention_curve(intervals, 6).tolist(), [1, 1, 1, 1, 2, 1])
+
+    def test_pings_are_clamped_to_the_duration(self):
+        self.video.duration_seconds = 100
+        self.video.save()
+        self.ping(1e9, [[0, 1e9]])
+        watching.flush()
+
+        state = VideoWatchState.objects.get()
+        self.assertEqual((state.position, state.watched_ranges, state.watched_seconds), (100, [[0, 100]], 100))
+
+    def test_pings_need_access_to_the_video(self):
+        paid = Category.objects.create(name='Pullik', icon='x', price=100)
+        video = Video.objects.create(category=paid, title='Dars')
+        response = self.client.post(f'/api/videos/{video.id}/heartbeat/', {'position': 1}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        UserCourse.objects.create(user=self.user, category=paid, granted_by='gift')
+        cache.clear()
+        response = self.client.post(f'/api/videos/{video.id}/heartbeat/', {'position': 1}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+    def test_flush_merges_with_a_row_written_by_another_process(self):
+        self.ping(30, [[0, 30]])
+        # Another worker flushed a later ping for the same pair in the meantime
+        VideoWatchState.objects.create(
+            user=self.user, video=self.video, position=55, watched_ranges=[[50, 60]], watched_seconds=10,
+            updated_at=timezone.now() + datetime.timedelta(seconds=5),
+        )
+        watching.flush()
+
+        state = VideoWatchState.objects.get()
+        self.assertEqual((state.position, state.watched_ranges, state.watched_seconds), (55, [[0, 30], [50, 60]], 40))
+
+    @override_settings(WATCH_BUFFER_SIZE=1)
+    def test_a_full_buffer_queues_one_flush_at_a_time(self):
+        other = Video.objects.create(category=self.video.category, title='Other')
+        with mock.patch('apps.courses.background.submit') as submit:
+            self.ping(1, [])
+            self.client.post(f'/api/videos/{other.id}/heartbeat/', {'position': 1}, format='json')
+            self.assertEqual(submit.call_count, 1)
+            watching.flush()
+            self.ping(2, [])
+            self.assertEqual(submit.call_count, 2)
+
+    def test_bad_pings_are_rejected(self):
+        self.assertEqual(self.ping(-1, []).status_code, 400)
+        self.assertEqual(self.ping(10, [[20, 10]]).status_code, 400)
+        self.assertEqual(self.ping(10, 'all').status_code, 400)
+        self.assertEqual(self.client.post('/api/videos/999/heartbeat/', {'position': 1}, format='json').status_code, 404)
+        self.assertEqual(watching._pending, {})
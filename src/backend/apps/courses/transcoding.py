@@ -0,0 +1,182 @@
+import datetime
+import logging
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Video
+from .probing import probe
+
+logger = logging.getLogger(__name__)
+
+HLS_ROOT = 'hls'
+HLS_SEGMENT_SECONDS = 6
+MASTER_PLAYLIST = 'master.m3u8'
+
+# (height, video bitrate, audio bitrate); renditions taller than the source are skipped
+HLS_LADDER = (
+    (360, '800k', '96k'),
+    (480, '1400k', '128k'),
+    (720, '2800k', '128k'),
+    (1080, '5000k', '192k'),
+)
+
+# Write progress to the database at most every this many percent
+PROGRESS_STEP = 5
+
+# A processing video whose worker hasn't reported for this long is considered abandoned. The
+# claim is only refreshed once a pool worker starts the job, so this has to be longer than
+# jobs wait in the pool's queue
+STALE_AFTER_MINUTES = 120
+
+
+class TranscodingError(Exception):
+    pass
+
+
+def build_ladder(source_height):
+    ladder = [rung for rung in HLS_LADDER if rung[0] <= source_height]
+    # Always produce at least the smallest rendition, even for tiny sources
+    return ladder or [HLS_LADDER[0]]
+
+
+def build_ffmpeg_command(source, output_dir, ladder, has_audio):
+    """One ffmpeg run that decodes once and encodes every rendition of the ladder"""
+    count = len(ladder)
+    split = f'[0:v]split={count}' + ''.join(f'[v{i}]' for i in range(count))
+    scales = [f'[v{i}]scale=-2:{height}[v{i}out]' for i, (height, _, _) in enumerate(ladder)]
+
+    command = [
+        settings.FFMPEG_BINARY, '-y', '-hide_banner', '-loglevel', 'error',
+        '-progress', 'pipe:1', '-nostats',
+        '-i', source,
+        '-filter_complex', ';'.join([split] + scales),
+    ]
+    stream_map = []
+    for i, (height, video_bitrate, audio_bitrate) in enumerate(ladder):
+        command += [
+            '-map', f'[v{i}out]',
+            f'-c:v:{i}', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+            f'-b:v:{i}', video_bitrate, f'-maxrate:v:{i}', video_bitrate, f'-bufsize:v:{i}', video_bitrate,
+            # Keyframes on segment boundaries so every rendition switches cleanly
+            '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+        ]
+        if has_audio:
+            command += ['-map', 'a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', audio_bitrate, '-ac', '2']
+            stream_map.append(f'v:{i},a:{i},name:{height}p')
+        else:
+            stream_map.append(f'v:{i},name:{height}p')
+
+    command += [
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%05d.ts'),
+        '-master_pl_name', MASTER_PLAYLIST,
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, '%v', 'index.m3u8'),
+    ]
+    return command
+
+
+def _run_ffmpeg(command, duration, on_progress):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    reported = 0
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        # ffmpeg reports out_time_ms in microseconds, like out_time_us
+        if key not in ('out_time_us', 'out_time_ms') or not value.isdigit() or not duration:
+            continue
+        percent = min(int(int(value) / 1_000_000 / duration * 100), 99)
+        if percent >= reported + PROGRESS_STEP:
+            reported = percent
+            on_progress(percent)
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise TranscodingError(stderr.strip() or f'ffmpeg exited with {process.returncode}')
+
+
+def claim_video(video_id):
+    """Atomically move a pending video to processing; False if another worker got it first"""
+    return Video.objects.filter(pk=video_id, hls_status='pending').update(
+        hls_status='processing', hls_progress=0, hls_claimed_at=timezone.now(),
+    ) == 1
+
+
+def requeue_stale(minutes=STALE_AFTER_MINUTES):
+    """Put videos left in processing by a crashed worker back in the queue; returns how many"""
+    cutoff = timezone.now() - datetime.timedelta(minutes=minutes)
+    return Video.objects.filter(hls_status='processing').filter(
+        Q(hls_claimed_at__lt=cutoff) | Q(hls_claimed_at__isnull=True)
+    ).update(hls_status='pending', hls_progress=0, hls_claimed_at=None)
+
+
+def transcode_video(video_id):
+    """Turn the uploaded file of a claimed video into an HLS ladder under MEDIA_ROOT/hls/<id>/
+
+    Every write is guarded on the claim still holding for the same file, so a
+    worker whose video got a new upload or was requeued meanwhile changes nothing.
+    """
+    video = Video.objects.get(pk=video_id)
+    name = video.video_file.name
+    queryset = Video.objects.filter(pk=video_id, hls_status='processing', video_file=name)
+    # The claim is refreshed when the job starts, so time spent waiting in the pool's
+    # queue doesn't count toward STALE_AFTER_MINUTES
+    claimed_at = timezone.now()
+    if not queryset.update(hls_claimed_at=claimed_at):
+        return video_id, 'No longer claimed'
+
+    storage = video.video_file.storage
+    relative_dir = os.path.join(HLS_ROOT, str(video_id))
+    final_dir = storage.path(relative_dir)
+    # One work dir per claim, so a worker that claims the requeued video doesn't share it
+    work_dir = f'{final_dir}.{int(claimed_at.timestamp() * 1_000_000)}.tmp'
+
+    try:
+        source = video.video_file.path
+        info = probe(source)
+        ladder = build_ladder(info['height'])
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for height, _, _ in ladder:
+            os.makedirs(os.path.join(work_dir, f'{height}p'))
+
+        _run_ffmpeg(
+            build_ffmpeg_command(source, work_dir, ladder, info['has_audio']),
+            info['duration'],
+            lambda percent: queryset.update(hls_progress=percent, hls_claimed_at=timezone.now()),
+        )
+
+        with transaction.atomic():
+            # Locked so a new upload can't reset the row between the check and the swap
+            swapped = queryset.select_for_update().exists()
+            if swapped:
+                # Swap the finished ladder in so players never see a half-written one
+                shutil.rmtree(final_dir, ignore_errors=True)
+                os.replace(work_dir, final_dir)
+                queryset.update(
+                    hls_status='ready',
+                    hls_progress=100,
+                    hls_playlist=os.path.join(relative_dir, MASTER_PLAYLIST).replace(os.sep, '/'),
+                )
+    except Exception as e:
+        logger.exception(f'Transcoding failed for video {video_id}')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        queryset.update(hls_status='failed')
+        return video_id, str(e)
+
+    if not swapped:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        logger.info(f'Discarded the transcode of video {video_id}: its file changed or it was requeued')
+        return video_id, 'No longer claimed'
+
+    bump_catalog_version(video.category_id)
+    logger.info(f'Transcoded video {video_id} into {len(ladder)} renditions')
+    return video_id, None
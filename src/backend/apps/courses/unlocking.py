@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.db.models import F
+
+from .cache import CATALOG_CACHE_TIMEOUT, get_catalog_version
+from .models import Category, Task, TaskCompletion, Video, VideoCompletion
+
+
+def _index_key(category_id):
+    return f'unlock:index:{category_id}:{get_catalog_version(category_id)}'
+
+
+def video_index(category_id):
+    """The course's videos in study order (module order, then video order); None if it doesn't exist
+
+    Cached under the category's catalog version, so any change to its
+    modules, videos or tasks builds a fresh index.
+    """
+    key = _index_key(category_id)
+    index = cache.get(key)
+    if index is None:
+        category = Category.objects.filter(pk=category_id).values('requires_sequential', 'is_active').first()
+        if category is None:
+            return None
+        order = list(
+            Video.objects.filter(category_id=category_id)
+            .order_by(F('module__order').asc(nulls_first=True), 'module_id', 'order', 'id')
+            .values_list('id', flat=True)
+        )
+        tasks = {}
+        for task_id, video_id in Task.objects.filter(video__category_id=category_id).values_list('id', 'video_id'):
+            tasks.setdefault(video_id, []).append(task_id)
+        index = {
+            **category,
+            'order': order,
+            'position': {video_id: position for position, video_id in enumerate(order)},
+            'tasks': tasks,
+        }
+        cache.set(key, index, CATALOG_CACHE_TIMEOUT)
+    return index
+
+
+def _follows_completed(previous_id, index, completed_videos, completed_tasks):
+    # Same rule the student pages used: the previous video is completed and,
+    # if it has tasks, at least one of them is completed too
+    previous_tasks = index['tasks'].get(previous_id, ())
+    return previous_id in completed_videos and (
+        not previous_tasks or any(task_id in completed_tasks for task_id in previous_tasks)
+    )
+
+
+def unlocked(index, completed_videos, completed_tasks):
+    """Ids of the course videos open to someone with these completed video and task ids, in study order"""
+    order = index['order']
+    if not index['requires_sequential']:
+        return list(order)
+    return [
+        video_id for position, video_id in enumerate(order)
+        if position == 0 or _follows_completed(order[position - 1], index, completed_videos, completed_tasks)
+    ]
+
+
+def unlocked_video_ids(user, index):
+    """Ids of the course videos the user may open, in study order"""
+    if not index['requires_sequential']:
+        return list(index['order'])
+
+    completed_videos = set(
+        VideoCompletion.objects.filter(user=user, video_id__in=index['order']).values_list('video_id', flat=True)
+    )
+    task_ids = [task_id for video_tasks in index['tasks'].values() for task_id in video_tasks]
+    completed_tasks = set(
+        TaskCompletion.objects.filter(user=user, task_id__in=task_ids).values_list('task_id', flat=True)
+    ) if task_ids else set()
+    return unlocked(index, completed_videos, completed_tasks)
+
+
+def is_unlocked(user, video):
+    """Whether the user may open the video: a dict lookup plus at most two unique-index probes"""
+    index = video_index(video.category_id)
+    if index is None or not index['requires_sequential']:
+        return True
+    position = index['position'].get(video.pk)
+    if not position:
+        return True
+    previous_id = index['order'][position - 1]
+    previous_tasks = index['tasks'].get(previous_id, ())
+
+    completed_videos = set(
+        VideoCompletion.objects.filter(user=user, video_id=previous_id).values_list('video_id', flat=True)
+    )
+    completed_tasks = set(
+        TaskCompletion.objects.filter(user=user, task_id__in=previous_tasks).values_list('task_id', flat=True)
+    ) if previous_tasks and completed_videos else set()
+    return _follows_completed(previous_id, index, completed_videos, completed_tasks)
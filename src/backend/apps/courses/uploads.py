@@ -0,0 +1,157 @@
+import datetime
+import hashlib
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+EXPIRE_BATCH_SIZE = 500
+PART_SUFFIX = '.part'
+
+
+class UploadError(Exception):
+    pass
+
+
+class AssembledFile(File):
+    """A finished upload; storages that support it move the file instead of copying it"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{session.pk}{PART_SUFFIX}')
+
+
+def start(session):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(session), 'wb').close()
+
+
+def append_chunk(session, offset, stream):
+    """Write the request body at `offset` without buffering it; returns the new offset"""
+    if session.status != 'uploading':
+        raise UploadError('Upload is already complete')
+    if offset != session.offset:
+        raise UploadError(f'Expected offset {session.offset}')
+
+    remaining = session.size - offset
+    written = 0
+    with open(part_path(session), 'r+b') as f:
+        f.seek(offset)
+        while stream is not None:
+            chunk = stream.read(min(CHUNK_SIZE, remaining - written + 1))
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > remaining:
+                raise UploadError('Chunk exceeds the declared upload size')
+            f.write(chunk)
+
+    new_offset = offset + written
+    # A concurrent PATCH for the same offset wrote the same bytes; only one of them advances it
+    # updated_at also marks the session as active for expire_sessions()
+    advanced = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+        offset=new_offset, updated_at=timezone.now(),
+    )
+    if not advanced:
+        session.refresh_from_db(fields=['offset'])
+        raise UploadError(f'Another request advanced the upload; expected offset {session.offset}')
+    session.offset = new_offset
+    return new_offset
+
+
+def complete(session):
+    """Verify the assembled file against the declared size and checksum"""
+    if session.offset != session.size:
+        raise UploadError(f'Upload incomplete: {session.offset} of {session.size} bytes received')
+
+    digest = hashlib.sha256()
+    with open(part_path(session), 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    if digest.hexdigest() != session.checksum.lower():
+        raise UploadError('Checksum mismatch')
+
+    session.status = 'completed'
+    session.save(update_fields=['status', 'updated_at'])
+
+
+def open_completed(session):
+    """File object for assigning the upload to a FileField; call mark_attached() after saving"""
+    if session.status != 'completed':
+        raise UploadError('Upload is not complete')
+    return AssembledFile(open(part_path(session), 'rb'), name=session.filename)
+
+
+def mark_attached(session, file):
+    file.close()
+    session.status = 'attached'
+    session.save(update_fields=['status', 'updated_at'])
+    if os.path.exists(part_path(session)):
+        os.remove(part_path(session))
+
+
+def discard(session):
+    if os.path.exists(part_path(session)):
+        os.remove(part_path(session))
+
+
+def _cutoff(now):
+    return (now or timezone.now()) - datetime.timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+
+def expire_sessions(now=None, batch_size=EXPIRE_BATCH_SIZE):
+    """Delete sessions untouched for UPLOAD_SESSION_TTL seconds along with their partial files; returns how many"""
+    queryset = UploadSession.objects.filter(updated_at__lt=_cutoff(now)).order_by('updated_at', 'pk')
+    expired = 0
+    while True:
+        sessions = list(queryset[:batch_size])
+        for session in sessions:
+            discard(session)
+        UploadSession.objects.filter(pk__in=[session.pk for session in sessions]).delete()
+        expired += len(sessions)
+        if len(sessions) < batch_size:
+            break
+    if expired:
+        logger.info(f'Expired {expired} upload sessions')
+    return expired
+
+
+def remove_orphaned_parts(now=None):
+    """Delete old partial files whose session is gone (e.g. deleted with its user); returns how many"""
+    if not os.path.isdir(settings.CHUNKED_UPLOAD_DIR):
+        return 0
+    cutoff = _cutoff(now).timestamp()
+    candidates = {}
+    with os.scandir(settings.CHUNKED_UPLOAD_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(PART_SUFFIX) or entry.stat().st_mtime >= cutoff:
+                continue
+            try:
+                candidates[uuid.UUID(entry.name[:-len(PART_SUFFIX)])] = entry.path
+            except ValueError:
+                continue
+
+    session_ids = list(candidates)
+    existing = set()
+    for start in range(0, len(session_ids), EXPIRE_BATCH_SIZE):
+        existing.update(UploadSession.objects.filter(
+            pk__in=session_ids[start:start + EXPIRE_BATCH_SIZE],
+        ).values_list('pk', flat=True))
+
+    removed = 0
+    for session_id, path in candidates.items():
+        if session_id not in existing:
+            os.remove(path)
+            removed += 1
+    return removed
@@ -2,8 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet, ModuleViewSet, VideoViewSet, TaskViewSet, 
-    TaskQuestionViewSet, UserCourseViewSet, 
-    StudentProgressViewSet, TaskSubmissionViewSet
+    BankQuestionViewSet, TaskQuestionViewSet, UserCourseViewSet, 
+    StudentProgressViewSet, TaskSubmissionViewSet, UploadSessionViewSet, stream_hls, stream_video
 )
 
 router = DefaultRouter()
@@ -11,11 +11,15 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'modules', ModuleViewSet, basename='module')
 router.register(r'videos', VideoViewSet, basename='video')
 router.register(r'tasks', TaskViewSet, basename='task')
+router.register(r'question-bank', BankQuestionViewSet, basename='bank-question')
 router.register(r'task-questions', TaskQuestionViewSet, basename='task-question')
 router.register(r'user-courses', UserCourseViewSet, basename='user-course')
 router.register(r'progress', StudentProgressViewSet, basename='progress')
 router.register(r'submissions', TaskSubmissionViewSet, basename='submission')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
+    path('videos/<int:pk>/stream/', stream_video, name='video-stream'),
+    path('videos/<int:pk>/hls/<str:token>/<path:path>', stream_hls, name='video-hls'),
     path('', include(router.urls)),
 ]
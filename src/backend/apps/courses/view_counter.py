@@ -0,0 +1,105 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Video
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+
+def _pending_key(video_id):
+    return f'video_views:pending:{video_id}'
+
+
+def _base_key(video_id):
+    return f'video_views:base:{video_id}'
+
+
+def get_base_count(video_id):
+    """Last flushed view count of a video, or None if the video doesn't exist"""
+    base = cache.get(_base_key(video_id))
+    if base is None:
+        base = Video.objects.filter(pk=video_id).values_list('view_count', flat=True).first()
+        if base is not None:
+            cache.set(_base_key(video_id), base, timeout=None)
+    return base
+
+
+def _record_view_directly(video_id):
+    if not Video.objects.filter(pk=video_id).update(view_count=F('view_count') + 1):
+        return None
+    return Video.objects.filter(pk=video_id).values_list('view_count', flat=True).first()
+
+
+def record_view(video_id):
+    """Buffer one play of a video and return the approximate live view count
+
+    The buffer relies on incr being atomic across workers, so without
+    VIEW_COUNT_BUFFER (Redis or Memcached) the play is written right away.
+    """
+    if not settings.VIEW_COUNT_BUFFER:
+        return _record_view_directly(video_id)
+
+    base = get_base_count(video_id)
+    if base is None:
+        return None
+
+    key = _pending_key(video_id)
+    try:
+        pending = cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            pending = 1
+        else:
+            pending = cache.incr(key)
+    return base + pending
+
+
+def forget(video_id, pending=True):
+    """Drop the cached base count (and, for deleted videos, the unflushed plays)"""
+    keys = [_base_key(video_id)]
+    if pending:
+        keys.append(_pending_key(video_id))
+    cache.delete_many(keys)
+
+
+def flush_view_counts(batch_size=FLUSH_BATCH_SIZE):
+    """Apply buffered plays to the database as one UPDATE per batch; returns the number of plays flushed"""
+    video_ids = list(Video.objects.values_list('id', flat=True))
+    flushed = 0
+
+    for start in range(0, len(video_ids), batch_size):
+        keys = {_pending_key(video_id): video_id for video_id in video_ids[start:start + batch_size]}
+        pending = {keys[key]: count for key, count in cache.get_many(list(keys)).items() if count}
+        if not pending:
+            continue
+
+        # Take the counts out of the buffer first; plays recorded meanwhile stay for the next flush
+        for video_id, count in pending.items():
+            cache.decr(_pending_key(video_id), count)
+
+        try:
+            with transaction.atomic():
+                Video.objects.filter(pk__in=pending).update(view_count=F('view_count') + Case(
+                    *[When(pk=video_id, then=Value(count)) for video_id, count in pending.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ))
+        except Exception:
+            logger.exception('Failed to flush view counts, returning them to the buffer')
+            for video_id, count in pending.items():
+                cache.incr(_pending_key(video_id), count)
+            raise
+
+        cache.set_many({
+            _base_key(video_id): view_count
+            for video_id, view_count in Video.objects.filter(pk__in=pending).values_list('id', 'view_count')
+        }, timeout=None)
+        flushed += sum(pending.values())
+
+    return flushed
@@ -1,27 +1,119 @@
 import datetime
 import json
-
-from rest_framework import viewsets, status
+import posixpath
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponseForbidden
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .models import Category, Module, Video, Task, TaskQuestion, UserCourse, StudentProgress, TaskSubmission
+from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAuthenticated
+from . import (
+    analytics, cloning, completions, grading, ordering, questions, streaming, summaries, unlocking, uploads,
+    view_counter, watching,
+)
+from .cache import CatalogCacheMixin, bump_catalog_version
+from .models import (
+    Category, Module, Video, Task, BankQuestion, TaskQuestion, UserCourse, StudentProgress, VideoCompletion,
+    CourseProgressSummary, TaskSubmission, UploadSession,
+)
 from .serializers import (
-    CategorySerializer, ModuleSerializer, VideoSerializer, TaskSerializer,
-    TaskQuestionSerializer, UserCourseSerializer,
-    StudentProgressSerializer, TaskSubmissionSerializer
+    CategorySerializer, ModuleSerializer, VideoSerializer, VideoListSerializer, TaskSerializer,
+    BankQuestionSerializer, TaskQuestionSerializer, UserCourseSerializer,
+    StudentProgressSerializer, CourseProgressSummarySerializer, TaskSubmissionSerializer, UploadSessionSerializer
+)
+from .stats import (
+    MAX_BATCH_IDS, rebuild_stats, record_submission_change, submission_state, task_stats, video_stats,
 )
 from apps.notifacations.models import Notification, UserNotification
 from apps.users.models import User
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class IsStaffOrReadOnly(BasePermission):
+    """Students may read; only admins may write"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return request.method in SAFE_METHODS or user.is_staff or user.is_superuser
+
+
+def _parse_category_id(request):
+    """Read ?category_id= as an int; None when missing, ValueError when malformed"""
+    category_id = request.query_params.get('category_id')
+    if not category_id:
+        return None
+    return int(category_id)
+
+
+def _parse_ids(request):
+    """Read ?ids=1,2,3 as a list of ints; ValueError when malformed or too long"""
+    try:
+        ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integers')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids per request')
+    return ids
+
+
+def _completed_upload(request, purpose):
+    """The completed chunked upload named by `upload_id`; None if not given
+
+    Open it with uploads.open_completed() only once the request is validated,
+    so a rejected request doesn't leave the file open.
+    """
+    upload_id = request.data.get('upload_id')
+    if not upload_id:
+        return None
+    try:
+        session = UploadSession.objects.filter(
+            pk=upload_id, user=request.user, purpose=purpose, status='completed'
+        ).first()
+    except DjangoValidationError:
+        session = None
+    if session is None:
+        raise ValidationError({'upload_id': 'Unknown or incomplete upload'})
+    return session
+
+
+def _playback_url(request, video):
+    """(signed URL, expiry timestamp) of the HLS master playlist once transcoded, else of the uploaded file"""
+    if video.hls_status == 'ready' and video.hls_playlist:
+        token, expires = streaming.sign_hls_token(video, request.user)
+        path = reverse('video-hls', args=[video.pk, token, posixpath.basename(video.hls_playlist)])
+    else:
+        params = streaming.sign_stream_params(video, request.user)
+        path, expires = reverse('video-stream', args=[video.pk]) + '?' + urlencode(params), params['e']
+    return request.build_absolute_uri(path), expires
+
+
+def _move(instance, request):
+    """Shared body of the `move` actions"""
+    after_id = request.data.get('after_id')
+    try:
+        order = ordering.move(instance, int(after_id) if after_id is not None else None)
+    except (TypeError, ValueError):
+        return Response({'error': 'after_id must be a sibling id or null'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'id': instance.id, 'order': order})
+
+
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Category.objects.all()
+        # Counts are annotated and modules prefetched so the query count doesn't grow with rows
+        queryset = Category.objects.with_counts().prefetch_related(
+            Prefetch('modules', queryset=Module.objects.with_counts())
+        )
         is_modular = self.request.query_params.get('is_modular')
         is_active = self.request.query_params.get('is_active')
         
@@ -36,6 +128,16 @@ class CategoryViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, lambda: super(CategoryViewSet, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request,
+            lambda: super(CategoryViewSet, self).retrieve(request, *args, **kwargs).data,
+            scope=kwargs['pk'],
+        )
+
     @action(detail=True, methods=['post'])
     def add_module(self, request, pk=None):
         """Add a module to a category"""
@@ -54,37 +156,124 @@ class CategoryViewSet(viewsets.ModelViewSet):
         module = serializer.save()
         return Response(ModuleSerializer(module).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Deep-copy the course (modules, videos, tasks, questions) as a new, inactive category"""
+        if not (request.user.is_staff or request.user.is_superuser):
+            return Response({'error': 'Only admins can clone courses'}, status=status.HTTP_403_FORBIDDEN)
+        category = self.get_object()
+        clone = cloning.clone_category(
+            category,
+            name=request.data.get('name'),
+            is_active=str(request.data.get('is_active', False)).lower() == 'true',
+        )
+        clone = self.get_queryset().get(pk=clone.pk)
+        return Response(self.get_serializer(clone).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def unlocked(self, request, pk=None):
+        """Ids of the course videos the current user may open (requires_sequential courses unlock in order)"""
+        try:
+            index = unlocking.video_index(int(pk))
+        except ValueError:
+            index = None
+        is_admin = request.user.is_staff or request.user.is_superuser
+        if index is None or not (index['is_active'] or is_admin):
+            return Response({'error': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        video_ids = index['order'] if is_admin else unlocking.unlocked_video_ids(request.user, index)
+        return Response({
+            'category_id': int(pk),
+            'requires_sequential': index['requires_sequential'],
+            'unlocked_video_ids': video_ids,
+        })
 
-class ModuleViewSet(viewsets.ModelViewSet):
+
+class ModuleViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return Module.objects.with_counts()
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, lambda: super(ModuleViewSet, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request, lambda: super(ModuleViewSet, self).retrieve(request, *args, **kwargs).data
+        )
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move one module right after `after_id` (or first when null), writing a single row"""
+        return _move(self.get_object(), request)
+
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        category_id = request.query_params.get('category_id')
+        try:
+            category_id = _parse_category_id(request)
+        except ValueError:
+            return Response({'error': 'category_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         if category_id:
-            modules = Module.objects.filter(category_id=category_id)
-            serializer = self.get_serializer(modules, many=True)
-            return Response(serializer.data)
+            return self.catalog_response(
+                request,
+                lambda: self.get_serializer(self.get_queryset().filter(category_id=category_id), many=True).data,
+                scope=category_id,
+            )
         return Response({'error': 'category_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class VideoViewSet(viewsets.ModelViewSet):
+class VideoViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
     permission_classes = [IsAuthenticated]
+    list_actions = ('list', 'by_category')
+
+    def _is_slim_listing(self):
+        """Listings are slim unless ?include=tasks asks for the nested task trees"""
+        if self.action not in self.list_actions:
+            return False
+        return 'tasks' not in self.request.query_params.get('include', '').split(',')
+
+    def get_queryset(self):
+        if self._is_slim_listing():
+            return Video.objects.for_listing()
+        if self.action in self.list_actions + ('retrieve',):
+            return Video.objects.with_task_trees()
+        return Video.objects.all()
+
+    def get_serializer_class(self):
+        if self._is_slim_listing():
+            return VideoListSerializer
+        return VideoSerializer
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+    def retrieve(self, request, *args, **kwargs):
+        video = self.get_object()
+        user = request.user
+        if not (user.is_staff or user.is_superuser) and not unlocking.is_unlocked(user, video):
+            return Response(
+                {'error': 'Complete the previous video and its task first'}, status=status.HTTP_403_FORBIDDEN,
+            )
+        data = self.get_serializer(video).data
+        # Signed for this user, so it is only ever in this response and never in a cached listing
+        if video.video_file and streaming.user_can_watch(user, video):
+            data['video_url'], data['video_url_expires_at'] = _playback_url(request, video)
+        data['resume_position'] = watching.resume_position(user.pk, video.pk)
+        return Response(data)
+
     def create(self, request, *args, **kwargs):
         data = request.data.dict()  # ❗ file bo‘lmagan fieldlar
 
         video_file = request.FILES.get('video_file')
         thumbnail_file = request.FILES.get('thumbnail')
+        upload = _completed_upload(request, 'video')
 
         video_url = data.get('video_url')
         thumbnail_url = data.get('thumbnail_url')
@@ -94,11 +283,14 @@ class VideoViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
+        uploaded_file = uploads.open_completed(upload) if upload else None
+        video_file = video_file or uploaded_file
         video = serializer.save()
 
         if video_file:
             video.video_file = video_file
             video.video_url = None
+            video.mark_new_upload()
         elif video_url:
             video.video_url = video_url
 
@@ -109,6 +301,8 @@ class VideoViewSet(viewsets.ModelViewSet):
             video.thumbnail_url = thumbnail_url
 
         video.save()
+        if upload:
+            uploads.mark_attached(upload, uploaded_file)
 
         return Response(self.get_serializer(video).data, status=status.HTTP_201_CREATED)
 
@@ -117,8 +311,9 @@ class VideoViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         data = request.data.copy()
 
-        # Handle video file or URL
+        # Handle video file (direct or chunked upload) or URL
         video_file = request.FILES.get('video_file')
+        upload = _completed_upload(request, 'video')
         video_url = data.get('video_url', '')
 
         # Handle thumbnail file or URL
@@ -126,18 +321,21 @@ class VideoViewSet(viewsets.ModelViewSet):
         thumbnail_url = data.get('thumbnail_url', '')
 
         # Remove file fields from data to avoid serializer conflicts
-        fields_to_remove = ['video_file', 'thumbnail', 'thumbnail_url', 'video_url']
+        fields_to_remove = ['video_file', 'thumbnail', 'thumbnail_url', 'video_url', 'upload_id']
         for field in fields_to_remove:
             data.pop(field, None)
 
         serializer = self.get_serializer(instance, data=data, partial=True)
         serializer.is_valid(raise_exception=True)
+        uploaded_file = uploads.open_completed(upload) if upload else None
+        video_file = video_file or uploaded_file
         video = serializer.save()
 
         # Update video file if provided
         if video_file:
             video.video_file = video_file
             video.video_url = None
+            video.mark_new_upload()
         elif video_url:
             video.video_url = video_url
 
@@ -149,49 +347,130 @@ class VideoViewSet(viewsets.ModelViewSet):
             video.thumbnail_url = thumbnail_url
 
         video.save()
+        if upload:
+            uploads.mark_attached(upload, uploaded_file)
 
         return Response(self.get_serializer(video).data)
 
     @action(detail=True, methods=['post'])
     def increment_view(self, request, pk=None):
+        # With VIEW_COUNT_BUFFER, plays are buffered in the cache and written by the flush_view_counts command
+        try:
+            view_count = view_counter.record_view(int(pk))
+        except ValueError:
+            view_count = None
+        if view_count is None:
+            return Response({'error': 'Video not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'view_count': view_count})
+
+    @action(detail=True, methods=['post'])
+    def heartbeat(self, request, pk=None):
+        """Playback ping {position, watched_ranges}, buffered and written to video_watch_states in batches"""
+        # Cached per user and video, so a ping normally doesn't touch the database
+        access = watching.playback_access(request.user, int(pk)) if pk.isdigit() else None
+        if access is None:
+            return Response({'error': 'Video not found'}, status=status.HTTP_404_NOT_FOUND)
+        allowed, duration = access
+        if not allowed:
+            return Response({'error': 'You do not have access to this video'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            position, ranges = watching.parse_heartbeat(request.data, duration)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        watching.record_heartbeat(request.user.pk, int(pk), position, ranges)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['get'])
+    def stream_url(self, request, pk=None):
+        """Issue a fresh short-lived signed URL for the video's HLS playlist or uploaded file"""
         video = self.get_object()
-        video.view_count += 1
-        video.save()
-        return Response({'view_count': video.view_count})
+        if not video.video_file:
+            return Response({'error': 'Video has no uploaded file'}, status=status.HTTP_404_NOT_FOUND)
+        if not streaming.user_can_watch(request.user, video):
+            return Response({'error': 'You do not have access to this video'}, status=status.HTTP_403_FORBIDDEN)
+
+        url, expires = _playback_url(request, video)
+        return Response({'url': url, 'expires_at': expires})
 
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        category_id = request.query_params.get('category_id')
+        try:
+            category_id = _parse_category_id(request)
+        except ValueError:
+            return Response({'error': 'category_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         if category_id:
-            videos = Video.objects.filter(category_id=category_id)
-            serializer = self.get_serializer(videos, many=True)
-            return Response(serializer.data)
+            return self.catalog_response(
+                request,
+                lambda: self.get_serializer(self.get_queryset().filter(category_id=category_id), many=True).data,
+                scope=category_id,
+            )
         return Response({'error': 'category_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
         video = self.get_object()
-        tasks = video.tasks.all()
-
-        # Get all submissions for this video's tasks
-        submissions = TaskSubmission.objects.filter(task__in=tasks)
-
-        stats_data = {
-            'view_count': video.view_count,
-            'task_count': tasks.count(),
-            'total_submissions': submissions.count(),
-            'pending_submissions': submissions.filter(status='pending').count(),
-            'approved_submissions': submissions.filter(status='approved').count(),
-            'rejected_submissions': submissions.filter(status='rejected').count(),
-        }
-        return Response(stats_data)
+        return Response(video_stats([video.pk])[video.pk])
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """Audience retention per second, median watch time and completion rate, from the watch states"""
+        if not (request.user.is_staff or request.user.is_superuser):
+            return Response({'error': 'Only admins can view video analytics'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(analytics.video_analytics(self.get_object()))
+
+    @action(detail=False, methods=['get'])
+    def batch_stats(self, request):
+        """Stats of many videos at once: ?ids=1,2,3 -> {id: stats}"""
+        try:
+            video_ids = _parse_ids(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(video_stats(video_ids))
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move one video right after `after_id` (or first when null), writing a single row"""
+        return _move(self.get_object(), request)
 
     @action(detail=False, methods=['post'])
     def bulk_update_order(self, request):
-        updates = request.data.get('updates', [])
-        for item in updates:
-            Video.objects.filter(id=item['id']).update(order=item['order'])
-        return Response({'status': 'success'})
+        try:
+            orders = {int(item['id']): float(item['order']) for item in request.data.get('updates', [])}
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'updates must be a list of {id, order}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            videos = [
+                video for video in Video.objects.filter(id__in=orders).only('id', 'order', 'category_id')
+                if video.order != orders[video.id]
+            ]
+            for video in videos:
+                video.order = orders[video.id]
+            Video.objects.bulk_update(videos, ['order'])
+
+            # bulk_update() bypasses the save signals that invalidate the catalog cache
+            for category_id in {video.category_id for video in videos}:
+                bump_catalog_version(category_id)
+                summaries.schedule_category_refresh(category_id)
+        return Response({'status': 'success', 'updated': len(videos)})
+
+
+@require_safe
+def stream_video(request, pk):
+    """Serve (or hand off to the proxy) byte ranges of a video file behind a signed URL"""
+    name = streaming.verify_stream_params(pk, request.GET)
+    if name is None:
+        return HttpResponseForbidden('Invalid or expired link')
+    return streaming.build_stream_response(request, name)
+
+
+@require_safe
+def stream_hls(request, pk, token, path):
+    """Serve a playlist or segment of a video's HLS ladder behind a signed path"""
+    name = streaming.verify_hls_path(pk, token, path)
+    if name is None:
+        return HttpResponseForbidden('Invalid or expired link')
+    return streaming.build_stream_response(request, name)
 
 
 class TaskViewSet(viewsets.ModelViewSet):
@@ -199,102 +478,62 @@ class TaskViewSet(viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        if self.action == 'stats':
+            return Task.objects.all()
+        return Task.objects.with_questions()
+
     def create(self, request, *args, **kwargs):
         """Handle task creation with questions"""
         data = request.data.copy()
-        questions_data = data.pop('questions', [])
+        questions_data = questions.parse_questions(data.pop('questions', []), default=[])
         task_type = data.get('task_type', 'test')
 
-        # Parse questions if sent as JSON string (FormData case)
-        if isinstance(questions_data, str):
-            try:
-                questions_data = json.loads(questions_data)
-            except (json.JSONDecodeError, TypeError):
-                questions_data = []
-
         # Set requires_approval for file/text tasks
         if task_type in ['file', 'text']:
             data['requires_approval'] = True
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
-
-        # Create questions if provided
-        for idx, q_data in enumerate(questions_data):
-            if isinstance(q_data, str):
-                try:
-                    q_data = json.loads(q_data)
-                except (json.JSONDecodeError, TypeError):
-                    continue
-
-            # Handle question image from FormData
-            image_key = f'question_image_{idx}'
-            question_image = request.FILES.get(image_key)
-
-            TaskQuestion.objects.create(
-                task=task,
-                question=q_data.get('question', ''),
-                options=q_data.get('options', []),
-                correct_answer=q_data.get('correct_answer', 0),
-                order=idx + 1,
-                description=q_data.get('description', ''),
-                image=question_image,
-            )
+        with transaction.atomic():
+            task = serializer.save()
+            questions.save_questions(task, questions_data, request.FILES)
 
-        # Refresh to include questions
-        task.refresh_from_db()
+        # Refetch to include questions
+        task = self.get_queryset().get(pk=task.pk)
         return Response(self.get_serializer(task).data, status=status.HTTP_201_CREATED)
 
     def update(self, request, *args, **kwargs):
         """Handle task update with questions"""
         instance = self.get_object()
+        old_video_id = instance.video_id
         data = request.data.copy()
-        questions_data = data.pop('questions', None)
-
-        # Parse questions if sent as JSON string (FormData case)
-        if isinstance(questions_data, str):
-            try:
-                questions_data = json.loads(questions_data)
-            except (json.JSONDecodeError, TypeError):
-                questions_data = None
+        questions_data = questions.parse_questions(data.pop('questions', None), default=None)
 
         serializer = self.get_serializer(instance, data=data, partial=True)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
-
-        # Update questions if provided
-        if questions_data is not None:
-            # Delete existing questions and recreate
-            task.questions.all().delete()
-            for idx, q_data in enumerate(questions_data):
-                if isinstance(q_data, str):
-                    try:
-                        q_data = json.loads(q_data)
-                    except (json.JSONDecodeError, TypeError):
-                        continue
-
-                image_key = f'question_image_{idx}'
-                question_image = request.FILES.get(image_key)
-
-                TaskQuestion.objects.create(
-                    task=task,
-                    question=q_data.get('question', ''),
-                    options=q_data.get('options', []),
-                    correct_answer=q_data.get('correct_answer', 0),
-                    order=idx + 1,
-                    description=q_data.get('description', ''),
-                    image=question_image,
-                )
-
-        task.refresh_from_db()
+        with transaction.atomic():
+            task = serializer.save()
+            # Questions are matched by id, so unchanged ones keep their ids and aren't rewritten
+            if questions_data is not None:
+                questions.save_questions(task, questions_data, request.FILES)
+            if task.video_id != old_video_id:
+                rebuild_stats([old_video_id, task.video_id])
+
+        task = self.get_queryset().get(pk=task.pk)
         return Response(self.get_serializer(task).data)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            # The task's submissions went with it; recount its video's totals
+            rebuild_stats([instance.video_id])
+
     @action(detail=False, methods=['get'])
     def by_video(self, request):
         video_id = request.query_params.get('video_id')
         if video_id:
-            tasks = Task.objects.filter(video_id=video_id)
+            tasks = self.get_queryset().filter(video_id=video_id)
             serializer = self.get_serializer(tasks, many=True)
             return Response(serializer.data)
         return Response({'error': 'video_id is required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -303,27 +542,20 @@ class TaskViewSet(viewsets.ModelViewSet):
     def stats(self, request, pk=None):
         """Get task statistics with all submissions"""
         task = self.get_object()
-        submissions = TaskSubmission.objects.filter(task=task).select_related('user')
-
-        stats_data = {
-            'total_submissions': submissions.count(),
-            'pending': submissions.filter(status='pending').count(),
-            'approved': submissions.filter(status='approved').count(),
-            'rejected': submissions.filter(status='rejected').count(),
-            'average_score': 0,
-        }
-
-        # Calculate average for tests
-        test_subs = submissions.filter(total__gt=0)
-        if test_subs.exists():
-            total_percent = sum((s.score / s.total) * 100 for s in test_subs)
-            stats_data['average_score'] = round(total_percent / test_subs.count(), 1)
+        return Response(task_stats([task.pk])[task.pk])
 
-        return Response(stats_data)
+    @action(detail=False, methods=['get'])
+    def batch_stats(self, request):
+        """Stats of many tasks at once: ?ids=1,2,3 -> {id: stats}"""
+        try:
+            task_ids = _parse_ids(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(task_stats(task_ids))
 
     @action(detail=True, methods=['post'])
     def link_to_video(self, request, pk=None):
-        """Create a copy of this task linked to another video"""
+        """Create a copy of this task for another video, sharing its bank questions"""
         task = self.get_object()
         video_id = request.data.get('video_id')
 
@@ -340,33 +572,47 @@ class TaskViewSet(viewsets.ModelViewSet):
         if existing:
             return Response({'error': 'Task already linked to this video'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create new task copy
-        new_task = Task.objects.create(
-            video=video,
-            title=task.title,
-            description=task.description,
-            task_type=task.task_type,
-            allow_resubmission=task.allow_resubmission,
-            requires_approval=task.requires_approval
-        )
-
-        # Copy questions
-        for q in task.questions.all():
-            TaskQuestion.objects.create(
-                task=new_task,
-                question=q.question,
-                options=q.options,
-                correct_answer=q.correct_answer,
-                order=q.order
+        with transaction.atomic():
+            # Create new task copy
+            new_task = Task.objects.create(
+                video=video,
+                title=task.title,
+                description=task.description,
+                task_type=task.task_type,
+                allow_resubmission=task.allow_resubmission,
+                requires_approval=task.requires_approval
             )
+            questions.copy_questions(task, new_task)
 
+        new_task = self.get_queryset().get(pk=new_task.pk)
         return Response(self.get_serializer(new_task).data, status=status.HTTP_201_CREATED)
 
 
+class BankQuestionViewSet(viewsets.ModelViewSet):
+    """Reusable questions; editing one updates every task that links it"""
+    queryset = BankQuestion.objects.all()
+    serializer_class = BankQuestionSerializer
+    # A bank question is shared by every task linking it, so one write rewrites all of them
+    permission_classes = [IsAuthenticated, IsStaffOrReadOnly]
+
+    def get_queryset(self):
+        queryset = BankQuestion.objects.all()
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.filter(question__icontains=search)
+        return queryset
+
+    def destroy(self, request, *args, **kwargs):
+        question = self.get_object()
+        if question.task_links.exists():
+            return Response({'error': 'Question is still used by tasks'}, status=status.HTTP_400_BAD_REQUEST)
+        return super().destroy(request, *args, **kwargs)
+
+
 class TaskQuestionViewSet(viewsets.ModelViewSet):
-    queryset = TaskQuestion.objects.all()
+    queryset = TaskQuestion.objects.select_related('bank_question')
     serializer_class = TaskQuestionSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsStaffOrReadOnly]
 
 
 class UserCourseViewSet(viewsets.ModelViewSet):
@@ -488,85 +734,109 @@ class StudentProgressViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_progress(self, request):
+        return self._progress_response(request)
+
+    def _progress_response(self, request):
         progress, created = StudentProgress.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(progress)
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def complete_video(self, request):
-        video_id = request.data.get('video_id')
-        progress, created = StudentProgress.objects.get_or_create(user=request.user)
-
-        # Convert to int for consistent storage
         try:
-            video_id_int = int(video_id)
+            video_id = int(request.data.get('video_id'))
         except (ValueError, TypeError):
-            video_id_int = video_id
-
-        if video_id_int not in progress.completed_videos:
-            progress.completed_videos.append(video_id_int)
-            progress.save()
+            return Response({'error': 'video_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Video.objects.filter(pk=video_id).exists():
+            return Response({'error': 'Video not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(progress)
-        return Response(serializer.data)
+        completions.complete(request.user, video_ids=[video_id])
+        return self._progress_response(request)
 
     @action(detail=False, methods=['post'])
     def complete_task(self, request):
-        task_id = request.data.get('task_id')
-        progress, created = StudentProgress.objects.get_or_create(user=request.user)
-
-        # Convert to int for consistent storage
         try:
-            task_id_int = int(task_id)
+            task_id = int(request.data.get('task_id'))
         except (ValueError, TypeError):
-            task_id_int = task_id
+            return Response({'error': 'task_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Task.objects.filter(pk=task_id).exists():
+            return Response({'error': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if task_id_int not in progress.completed_tasks:
-            progress.completed_tasks.append(task_id_int)
-            progress.save()
+        completions.complete(request.user, task_ids=[task_id])
+        return self._progress_response(request)
 
-        serializer = self.get_serializer(progress)
-        return Response(serializer.data)
+    @action(detail=False, methods=['get'])
+    def courses(self, request):
+        """Progress of the current user in each course (?category_id= for one), read from the summary table"""
+        summaries_qs = (
+            CourseProgressSummary.objects.filter(user=request.user)
+            .select_related('category', 'next_video')
+            .order_by(F('last_activity_at').desc(nulls_last=True), 'category_id')
+        )
+        try:
+            category_id = _parse_category_id(request)
+        except ValueError:
+            return Response({'error': 'category_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if category_id is not None:
+            summaries_qs = summaries_qs.filter(category_id=category_id)
+        return Response(CourseProgressSummarySerializer(summaries_qs, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """Apply offline completions in one round-trip: {events: [...], cursor} -> delta and new cursor"""
+        try:
+            delta = completions.sync(request.user, request.data.get('events', []), request.data.get('cursor'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(delta)
 
     @action(detail=False, methods=['get'])
     def user_progress(self, request):
         """Get user progress with detailed video information for admin"""
         user_id = request.query_params.get('user_id')
+        if not user_id or not user_id.isdigit():
+            return Response({'error': 'user_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Completions live in their own tables; synced ones never create the progress row
+        progress = StudentProgress.objects.filter(user_id=user_id).first() or StudentProgress(user_id=int(user_id))
+
+        # Completed videos with their category and first task, in completion order
+        first_task = Task.objects.filter(video_id=OuterRef('video_id')).order_by('created_at', 'id').values('id')[:1]
+        completed = list(
+            VideoCompletion.objects.filter(user_id=user_id)
+            .order_by('completed_at', 'id')
+            .select_related('video__category')
+            .annotate(first_task_id=Subquery(first_task))
+        )
+        # Latest submission of the user for each of those tasks
+        latest = {
+            row['task_id']: row
+            for row in TaskSubmission.objects.filter(
+                user_id=user_id, task_id__in=[c.first_task_id for c in completed if c.first_task_id],
+            ).annotate(
+                rank=Window(RowNumber(), partition_by=F('task_id'), order_by=[F('submitted_at').desc(), F('id').desc()]),
+            ).filter(rank=1).values('task_id', 'score', 'total', 'status')
+        }
 
-        progress = StudentProgress.objects.filter(user_id=user_id).first()
-
-        if not progress:
-            return Response({'completed_videos': [], 'completed_tasks': [], 'video_details': []}, status=status.HTTP_200_OK)
-
-        # Get detailed video information
         video_details = []
-        for vid_id in progress.completed_videos:
-            try:
-                video = Video.objects.get(id=vid_id)
-                # Get latest submission for this video's tasks
-                task_info = {}
-                task = video.tasks.first()
-                if task:
-                    submission = TaskSubmission.objects.filter(
-                        user_id=user_id, 
-                        task=task
-                    ).order_by('-submitted_at').first()
-                    if submission:
-                        task_info = {
-                            'task_score': submission.score,
-                            'task_total': submission.total,
-                            'task_status': submission.status
-                        }
-                
-                video_details.append({
-                    'video_id': video.id,
-                    'video_title': video.title,
-                    'category_name': video.category.name,
-                    'category_id': video.category.id,
-                    **task_info
-                })
-            except Video.DoesNotExist:
-                continue
+        for completion in completed:
+            video = completion.video
+            task_info = {}
+            submission = latest.get(completion.first_task_id)
+            if submission:
+                task_info = {
+                    'task_score': submission['score'],
+                    'task_total': submission['total'],
+                    'task_status': submission['status']
+                }
+
+            video_details.append({
+                'video_id': video.id,
+                'video_title': video.title,
+                'category_name': video.category.name,
+                'category_id': video.category.id,
+                **task_info
+            })
 
         serializer = self.get_serializer(progress)
         data = serializer.data
@@ -595,6 +865,26 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
 
         return TaskSubmission.objects.filter(user=request_user)
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            submission = serializer.save()
+            record_submission_change(submission.task, after=submission_state(submission))
+
+    def perform_update(self, serializer):
+        old_task, before = serializer.instance.task, submission_state(serializer.instance)
+        with transaction.atomic():
+            submission = serializer.save()
+            if submission.task_id == old_task.pk:
+                record_submission_change(old_task, before, submission_state(submission))
+            else:
+                record_submission_change(old_task, before=before)
+                record_submission_change(submission.task, after=submission_state(submission))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            record_submission_change(instance.task, before=submission_state(instance))
+
     @action(detail=False, methods=['get'])
     def my_submissions(self, request):
         submissions = TaskSubmission.objects.filter(user=request.user)
@@ -628,7 +918,7 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
         """Get submission detail with question details"""
         submission = self.get_object()
         task = submission.task
-        questions = task.questions.all().order_by('order')
+        links = task.questions.select_related('bank_question').order_by('order')
 
         serializer_data = self.get_serializer(submission).data
 
@@ -640,11 +930,12 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
         if isinstance(answers, str):
             answers = json.loads(answers)
 
-        for q in questions:
-            user_answer = answers.get(str(q.id))
+        for link in links:
+            q = link.bank_question
+            user_answer = answers.get(str(link.id))
 
             questions_detail.append({
-                'id': q.id,
+                'id': link.id,
                 'question': q.question,
                 'options': q.options,
                 'correct_answer': q.correct_answer,
@@ -659,49 +950,63 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
     def submit(self, request):
         task_id = request.data.get('task_id')
         file = request.FILES.get('file')
+        upload = _completed_upload(request, 'submission')
         text_content = request.data.get('text_content', '')
-        answers = request.data.get('answers', {})
-        score = request.data.get('score', 0)
-        total = request.data.get('total', 0)
+        answers = grading.normalize_answers(request.data.get('answers', {}))
 
         try:
             task = Task.objects.get(id=task_id)
         except Task.DoesNotExist:
             return Response({'error': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        # Check if submission already exists
+        existing = TaskSubmission.objects.filter(user=request.user, task_id=task_id).first()
+        if existing and not answers:
+            answers = grading.normalize_answers(existing.answers)
+
         # Determine initial status based on task type
         initial_status = 'pending'
+        score, total = 0, 0
         if task.task_type == 'test':
             initial_status = 'approved'  # Test auto-approved
-
-        # Check if submission already exists
-        existing = TaskSubmission.objects.filter(user=request.user, task_id=task_id).first()
-
-        if existing:
-            if not task.allow_resubmission:
-                return Response({'error': 'Resubmission not allowed'}, status=status.HTTP_400_BAD_REQUEST)
-            # Update existing submission
-            existing.file = file if file else existing.file
-            existing.text_content = text_content if text_content else existing.text_content
-            existing.answers = answers if answers else existing.answers
-            existing.score = score
-            existing.total = total
-            existing.status = initial_status
-            existing.feedback = None
-            existing.reviewed_at = None
-            existing.save()
-            submission = existing
-        else:
-            submission = TaskSubmission.objects.create(
-                user=request.user,
-                task_id=task_id,
-                file=file,
-                text_content=text_content,
-                answers=answers,
-                score=score,
-                total=total,
-                status=initial_status
-            )
+            # Graded here against the answer key; score/total sent by the client are ignored
+            score, total = grading.grade(task.id, answers)
+
+        if existing and not task.allow_resubmission:
+            return Response({'error': 'Resubmission not allowed'}, status=status.HTTP_400_BAD_REQUEST)
+
+        uploaded_file = uploads.open_completed(upload) if upload else None
+        file = file or uploaded_file
+        with transaction.atomic():
+            if existing:
+                before = submission_state(existing)
+                # Update existing submission
+                existing.file = file if file else existing.file
+                existing.text_content = text_content if text_content else existing.text_content
+                existing.answers = answers
+                existing.score = score
+                existing.total = total
+                existing.status = initial_status
+                existing.feedback = None
+                existing.reviewed_at = None
+                existing.save()
+                submission = existing
+            else:
+                before = None
+                submission = TaskSubmission.objects.create(
+                    user=request.user,
+                    task_id=task_id,
+                    file=file,
+                    text_content=text_content,
+                    answers=answers,
+                    score=score,
+                    total=total,
+                    status=initial_status
+                )
+            record_submission_change(task, before, submission_state(submission))
+            completions.refresh_summaries(request.user, task_ids=[task.id])
+        if upload:
+            uploads.mark_attached(upload, uploaded_file)
 
         serializer = self.get_serializer(submission)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -712,10 +1017,13 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
         submission = self.get_object()
         feedback = request.data.get('feedback', '')
 
+        before = submission_state(submission)
         submission.status = 'approved'
         submission.feedback = feedback
         submission.reviewed_at = datetime.datetime.now()
-        submission.save()
+        with transaction.atomic():
+            submission.save()
+            record_submission_change(submission.task, before, submission_state(submission))
 
         # Send notification to student
         try:
@@ -744,10 +1052,13 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
         submission = self.get_object()
         feedback = request.data.get('feedback', '')
 
+        before = submission_state(submission)
         submission.status = 'rejected'
         submission.feedback = feedback
         submission.reviewed_at = datetime.datetime.now()
-        submission.save()
+        with transaction.atomic():
+            submission.save()
+            record_submission_change(submission.task, before, submission_state(submission))
 
         # Send notification to student
         try:
@@ -769,3 +1080,58 @@ class TaskSubmissionViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(submission)
         return Response(serializer.data)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Resumable uploads: create a session, PATCH chunks at Upload-Offset, then complete.
+
+    The completed session's id is passed as `upload_id` to video create/update or task submit.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if serializer.validated_data['purpose'] == 'video' and not (user.is_staff or user.is_superuser):
+            raise PermissionDenied('Only admins can upload videos')
+        session = serializer.save(user=user)
+        uploads.start(session)
+
+    def retrieve(self, request, *args, **kwargs):
+        # HEAD is routed here too, so clients can resume from Upload-Offset
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = str(response.data['offset'])
+        response['Upload-Length'] = str(response.data['size'])
+        return response
+
+    def partial_update(self, request, *args, **kwargs):
+        """Append the raw request body (application/offset+octet-stream) at Upload-Offset"""
+        session = self.get_object()
+        try:
+            offset = int(request.headers.get('Upload-Offset'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            new_offset = uploads.append_chunk(session, offset, request.stream)
+        except uploads.UploadError as e:
+            return Response({'error': str(e), 'offset': session.offset}, status=status.HTTP_409_CONFLICT)
+        return Response({'offset': new_offset}, headers={'Upload-Offset': str(new_offset)})
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Verify size and SHA-256 of the assembled file"""
+        session = self.get_object()
+        try:
+            uploads.complete(session)
+        except uploads.UploadError as e:
+            return Response({'error': str(e), 'offset': session.offset}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(session).data)
@@ -0,0 +1,246 @@
+import atexit
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import User
+from . import background, streaming, unlocking
+from .models import Video, VideoWatchState
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+MAX_RANGES = 200
+POSITION_TIMEOUT = 60 * 60 * 24 * 7
+ACCESS_TIMEOUT = 60 * 10
+
+# Heartbeats of this process not yet written: (user id, video id) -> (position, merged ranges, time of the ping)
+_pending = {}
+_lock = threading.Lock()
+_flusher = None
+# Whether a flush for the full buffer is already waiting on the background pool
+_flush_queued = False
+
+
+def _position_key(user_id, video_id):
+    return f'watch:position:{user_id}:{video_id}'
+
+
+def _access_key(user_id, video_id):
+    return f'watch:access:{user_id}:{video_id}'
+
+
+def merge_ranges(ranges):
+    """Sort [start, end] pairs and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _seconds(value):
+    try:
+        seconds = float(value)
+    except TypeError:
+        seconds = math.nan
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f'{value!r} is not a number of seconds')
+    return round(seconds, 1)
+
+
+def parse_heartbeat(data, duration=None):
+    """(position, merged watched ranges) from a heartbeat body; raises ValueError if it is malformed
+
+    With the video's duration known, the position and ranges are clamped to it.
+    """
+    if data.get('position') is None:
+        raise ValueError('position is required')
+    position = _seconds(data['position'])
+
+    items = data.get('watched_ranges') or []
+    if not isinstance(items, list) or len(items) > MAX_RANGES:
+        raise ValueError(f'watched_ranges must be a list of at most {MAX_RANGES} [start, end] pairs')
+    ranges = []
+    for item in items:
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise ValueError('watched_ranges must be a list of [start, end] pairs')
+        start, end = _seconds(item[0]), _seconds(item[1])
+        if start > end:
+            raise ValueError('a watched range must not end before it starts')
+        if duration:
+            start, end = min(start, duration), min(end, duration)
+        if end > start:
+            ranges.append([start, end])
+    if duration:
+        position = min(position, duration)
+    return position, merge_ranges(ranges)
+
+
+def playback_access(user, video_id):
+    """(whether the user may watch the video, its duration in seconds or None); None if it doesn't exist
+
+    Course access and sequential unlocking are checked against the database
+    once per user and video every ACCESS_TIMEOUT seconds; pings in between
+    cost a cache read.
+    """
+    key = _access_key(user.pk, video_id)
+    access = cache.get(key)
+    if access is None:
+        video = Video.objects.select_related('category', 'module').filter(pk=video_id).first()
+        if video is None:
+            access = False
+        else:
+            allowed = user.is_staff or user.is_superuser or (
+                streaming.user_can_watch(user, video) and unlocking.is_unlocked(user, video)
+            )
+            access = (allowed, video.duration_seconds)
+        cache.set(key, access, ACCESS_TIMEOUT)
+    return access or None
+
+
+def record_heartbeat(user_id, video_id, position, ranges):
+    """Buffer one playback ping; pings of the same user and video coalesce until the next flush()
+
+    The resume position goes to the shared cache right away, so every
+    worker serves it before the row is written.
+    """
+    global _flush_queued
+    key = (user_id, video_id)
+    with _lock:
+        previous = _pending.get(key)
+        if previous is not None:
+            ranges = merge_ranges(previous[1] + ranges)
+        _pending[key] = (position, ranges, timezone.now())
+        queue_flush = len(_pending) >= settings.WATCH_BUFFER_SIZE and not _flush_queued
+        if queue_flush:
+            _flush_queued = True
+    cache.set(_position_key(user_id, video_id), position, POSITION_TIMEOUT)
+
+    _start_flusher()
+    if queue_flush:
+        background.submit(flush)
+
+
+def _state(user_id, video_id, position, ranges, pinged_at):
+    return VideoWatchState(
+        user_id=user_id,
+        video_id=video_id,
+        position=position,
+        watched_ranges=ranges,
+        watched_seconds=round(sum(end - start for start, end in ranges), 1),
+        updated_at=pinged_at,
+    )
+
+
+def _write(batch):
+    user_ids = {user_id for user_id, _ in batch}
+    video_ids = {video_id for _, video_id in batch}
+    with transaction.atomic():
+        # Users or videos deleted since the ping would fail the whole batch
+        users = set(User.objects.filter(pk__in=user_ids).values_list('id', flat=True))
+        videos = set(Video.objects.filter(pk__in=video_ids).values_list('id', flat=True))
+        batch = {
+            (user_id, video_id): batch[user_id, video_id]
+            for user_id, video_id in sorted(batch) if user_id in users and video_id in videos
+        }
+
+        # Insert rows for new pairs first so the locked read below covers them too; a row
+        # another process inserts meanwhile wins here and is merged with under the lock
+        VideoWatchState.objects.bulk_create(
+            [_state(*key, *value) for key, value in batch.items()], ignore_conflicts=True,
+        )
+        # Locked in a fixed order, so flushes of other processes wait for each other
+        # instead of dropping each other's ranges, and can't deadlock
+        locked = VideoWatchState.objects.select_for_update().filter(
+            user_id__in=user_ids, video_id__in=video_ids,
+        ).order_by('user_id', 'video_id')
+        stored = {
+            (user_id, video_id): (position, ranges, updated_at)
+            for user_id, video_id, position, ranges, updated_at in locked.values_list(
+                'user_id', 'video_id', 'position', 'watched_ranges', 'updated_at',
+            )
+        }
+
+        rows = []
+        for (user_id, video_id), (position, ranges, pinged_at) in batch.items():
+            if (user_id, video_id) not in stored:
+                continue  # Deleted with its user or video since the insert
+            stored_position, stored_ranges, stored_at = stored[user_id, video_id]
+            # A later ping flushed by another process keeps its position
+            if stored_at > pinged_at:
+                position, pinged_at = stored_position, stored_at
+            rows.append(_state(user_id, video_id, position, merge_ranges(stored_ranges + ranges), pinged_at))
+        VideoWatchState.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['user', 'video'],
+            update_fields=['position', 'watched_ranges', 'watched_seconds', 'updated_at'],
+        )
+    return len(rows)
+
+
+def flush(batch_size=FLUSH_BATCH_SIZE):
+    """Write this process's buffered heartbeats as one upsert per batch; returns how many rows were written"""
+    global _pending, _flush_queued
+    with _lock:
+        pending, _pending = _pending, {}
+        _flush_queued = False
+    items = list(pending.items())
+    written = 0
+
+    for start in range(0, len(items), batch_size):
+        try:
+            written += _write(dict(items[start:start + batch_size]))
+        except Exception:
+            logger.exception('Failed to flush watch states, returning them to the buffer')
+            with _lock:
+                for key, (position, ranges, pinged_at) in items[start:]:
+                    newer = _pending.get(key)
+                    if newer is not None:
+                        position, ranges, pinged_at = newer[0], merge_ranges(ranges + newer[1]), newer[2]
+                    _pending[key] = (position, ranges, pinged_at)
+            raise
+
+    return written
+
+
+def _flush_periodically(interval):
+    while True:
+        time.sleep(interval)
+        if _pending:
+            background.submit(flush)
+
+
+def _start_flusher():
+    """Start the thread that flushes every WATCH_FLUSH_INTERVAL seconds, once per process"""
+    global _flusher
+    interval = settings.WATCH_FLUSH_INTERVAL
+    if _flusher is not None or not interval:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_periodically, args=(interval,), name='watch-flusher', daemon=True,
+            )
+            _flusher.start()
+            # Don't lose the last pings on a graceful restart
+            atexit.register(flush)
+
+
+def resume_position(user_id, video_id):
+    """Where the user stopped in the video, in seconds (0 if they haven't started it)"""
+    key = _position_key(user_id, video_id)
+    position = cache.get(key)
+    if position is None:
+        position = VideoWatchState.objects.filter(user_id=user_id, video_id=video_id).values_list(
+            'position', flat=True,
+        ).first() or 0
+        cache.set(key, position, POSITION_TIMEOUT)
+    return position
@@ -0,0 +1,138 @@
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.courses.models import UserCourse
+from apps.notifacations.models import Notification, UserNotification
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def _notify(messages, notification_type):
+    """Send (user id, title, message) triples with one Notification per distinct text, using bulk inserts"""
+    recipients = {}
+    for user_id, title, message in messages:
+        recipients.setdefault((title, message), []).append(user_id)
+    if not recipients:
+        return
+
+    notifications = Notification.objects.bulk_create([
+        Notification(title=title, message=message, type=notification_type, sent_count=len(user_ids))
+        for (title, message), user_ids in recipients.items()
+    ])
+    Recipient = Notification.recipients.through
+    Recipient.objects.bulk_create([
+        Recipient(notification_id=notification.pk, user_id=user_id)
+        for notification, user_ids in zip(notifications, recipients.values())
+        for user_id in user_ids
+    ], ignore_conflicts=True)
+    UserNotification.objects.bulk_create([
+        UserNotification(notification=notification, user_id=user_id)
+        for notification, user_ids in zip(notifications, recipients.values())
+        for user_id in user_ids
+    ])
+
+
+def _payment_expires_at(expires_on):
+    # A payment is valid through its expiry date, local time
+    return timezone.make_aware(datetime.datetime.combine(expires_on + datetime.timedelta(days=1), datetime.time.min))
+
+
+def _due(queryset, batch_size):
+    # Concurrent sweepers skip each other's rows instead of waiting (ignored where rows can't be locked)
+    return list(queryset.order_by('expires_at', 'pk').select_for_update(skip_locked=True, of=('self',))[:batch_size])
+
+
+def expire_user_courses(now=None, batch_size=BATCH_SIZE):
+    """Revoke up to `batch_size` courses whose expires_at has passed; returns how many"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        courses = _due(UserCourse.objects.filter(expires_at__lte=now).select_related('category'), batch_size)
+        if not courses:
+            return 0
+        # Row deletes so the signals drop the cached entitlements
+        UserCourse.objects.filter(pk__in=[course.pk for course in courses]).delete()
+        _notify([
+            (course.user_id, "Kurs muddati tugadi ⏰", f"'{course.category.name}' kursiga kirish muddati tugadi.")
+            for course in courses
+        ], 'course')
+    logger.info(f'Expired {len(courses)} user courses')
+    return len(courses)
+
+
+def expire_payments(now=None, batch_size=BATCH_SIZE):
+    """Mark up to `batch_size` active payments past their expiry date as expired; returns how many
+
+    Courses granted by an expired payment are revoked unless another active
+    payment of the user still covers the same category.
+    """
+    today = timezone.localdate(now or timezone.now())
+    with transaction.atomic():
+        payments = _due(Payment.objects.filter(status='active', expires_at__lt=today), batch_size)
+        if not payments:
+            return 0
+        Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+            status='expired', updated_at=timezone.now(),
+        )
+
+        paid = {(payment.user_id, payment.category_id) for payment in payments if payment.category_id}
+        still_paid = set(
+            Payment.objects.filter(
+                status='active',
+                user_id__in={user_id for user_id, _ in paid},
+                category_id__in={category_id for _, category_id in paid},
+            ).exclude(expires_at__lt=today).values_list('user_id', 'category_id')
+        )
+        revoke = Q()
+        for user_id, category_id in paid - still_paid:
+            revoke |= Q(user_id=user_id, category_id=category_id)
+        if revoke:
+            UserCourse.objects.filter(revoke, granted_by='payment').delete()
+
+        _notify([
+            (payment.user_id, "To'lov muddati tugadi", f"Sizning to'lovingiz ({payment.amount} so'm) muddati tugadi.")
+            for payment in payments
+        ], 'payment')
+    logger.info(f'Expired {len(payments)} payments')
+    return len(payments)
+
+
+def sweep(now=None, batch_size=BATCH_SIZE):
+    """Expire everything that is due, one bounded batch per transaction; returns (courses, payments)"""
+    totals = [0, 0]
+    for position, expire in enumerate((expire_user_courses, expire_payments)):
+        while True:
+            count = expire(now, batch_size)
+            totals[position] += count
+            if count < batch_size:
+                break
+    return tuple(totals)
+
+
+def next_expiry():
+    """When the next course or payment expires (None if nothing will), read from the expiry indexes"""
+    moments = []
+    course = UserCourse.objects.filter(expires_at__isnull=False).order_by('expires_at').values_list(
+        'expires_at', flat=True,
+    ).first()
+    if course:
+        moments.append(course)
+    payment = Payment.objects.filter(status='active', expires_at__isnull=False).order_by('expires_at').values_list(
+        'expires_at', flat=True,
+    ).first()
+    if payment:
+        moments.append(_payment_expires_at(payment))
+    return min(moments) if moments else None
+
+
+def seconds_until_next_expiry(now=None):
+    moment = next_expiry()
+    if moment is None:
+        return None
+    return max((moment - (now or timezone.now())).total_seconds(), 0)
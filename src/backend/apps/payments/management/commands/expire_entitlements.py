@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.expiry import BATCH_SIZE, seconds_until_next_expiry, sweep
+
+
+class Command(BaseCommand):
+    help = 'Revoke expired user courses and mark expired payments, notifying their users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, sleeping until the next expiry')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per transaction')
+        parser.add_argument(
+            '--max-sleep', type=int, default=300,
+            help='Longest sleep in --loop mode, so newly granted expiries are picked up (seconds)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            courses, payments = sweep(batch_size=options['batch_size'])
+            self.stdout.write(f'Expired {courses} user courses and {payments} payments')
+            if not options['loop']:
+                break
+            delay = seconds_until_next_expiry()
+            time.sleep(options['max_sleep'] if delay is None else min(delay, options['max_sleep']) + 1)
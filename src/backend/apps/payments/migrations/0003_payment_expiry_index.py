@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_payment_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'expires_at'], name='payment_status_expiry_idx'),
+        ),
+    ]
@@ -31,6 +31,10 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Due payments and the next expiry for the expire_entitlements sweeper
+            models.Index(fields=['status', 'expires_at'], name='payment_status_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} so'm - {self.status}"
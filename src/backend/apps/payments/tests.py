@@ -1,3 +1,53 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.courses.models import Category, UserCourse
+from apps.notifacations.models import UserNotification
+from apps.users.models import User
+from . import expiry
+from .models import Payment
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.users = [User.objects.create(username=f'student{i}') for i in range(3)]
+        self.category = Category.objects.create(name='Ingliz tili', icon='x', price=100)
+
+    def test_sweep_expires_due_rows_in_batches(self):
+        for user, days in zip(self.users, [-2, -1, 3]):
+            UserCourse.objects.create(
+                user=user, category=self.category, granted_by='gift',
+                expires_at=self.now + datetime.timedelta(days=days),
+            )
+
+        self.assertEqual(expiry.sweep(now=self.now, batch_size=1), (2, 0))
+
+        self.assertEqual(list(UserCourse.objects.values_list('user_id', flat=True)), [self.users[2].id])
+        self.assertEqual(UserNotification.objects.filter(notification__type='course').count(), 2)
+        self.assertAlmostEqual(expiry.seconds_until_next_expiry(now=self.now), 3 * 24 * 3600, delta=5)
+
+    def test_expired_payment_revokes_its_course_unless_still_paid(self):
+        today = timezone.localdate(self.now)
+        for user in self.users[:2]:
+            Payment.objects.create(
+                user=user, category=self.category, amount=100, status='active',
+                expires_at=today - datetime.timedelta(days=1),
+            )
+            UserCourse.objects.create(user=user, category=self.category, granted_by='payment')
+        # A renewal keeps the second user's access
+        Payment.objects.create(user=self.users[1], category=self.category, amount=100, status='active',
+                               expires_at=today + datetime.timedelta(days=30))
+
+        self.assertEqual(expiry.sweep(now=self.now), (0, 2))
+
+        self.assertEqual(Payment.objects.filter(status='active').count(), 1)
+        self.assertEqual(list(UserCourse.objects.values_list('user_id', flat=True)), [self.users[1].id])
+        self.assertEqual(UserNotification.objects.filter(user=self.users[0], notification__type='payment').count(), 1)
@@ -1,11 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from apps.courses import images
 from .models import User
 
-class UserSerializer(serializers.ModelSerializer):
+
+class AvatarSrcsetMixin(serializers.Serializer):
+    avatar_srcset = serializers.SerializerMethodField()
+
+    def get_avatar_srcset(self, obj):
+        return images.srcset(obj.avatar_variants, obj.avatar.storage, self.context.get('request'))
+
+
+class UserSerializer(AvatarSrcsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'phone', 'role', 'avatar', 'watermark_id',
+        fields = ['id', 'username', 'email', 'phone', 'role', 'avatar', 'avatar_srcset', 'watermark_id',
                   'is_blocked', 'created_at', 'first_name', 'last_name']
         read_only_fields = ['id', 'created_at', 'role']
 
@@ -35,10 +44,10 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(AvatarSrcsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'phone', 'role', 'avatar', 
+        fields = ['id', 'username', 'email', 'phone', 'role', 'avatar', 'avatar_srcset',
                   'is_blocked', 'created_at', 'first_name', 'last_name', 'watermark_id',
                   'date_joined', 'last_login']
         read_only_fields = ['id', 'created_at', 'date_joined', 'last_login', 'role']
@@ -122,6 +122,23 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Cache
+# The catalog cache versions must be visible to every gunicorn worker, so the
+# default is a shared on-disk cache; point CACHE_BACKEND/CACHE_LOCATION at
+# Redis or Memcached in production for atomic version bumps and view counts
+# (the file cache's incr is a plain read and write).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+# Video plays are counted in the cache and flushed in batches only where incr is
+# atomic and keys aren't culled; otherwise each play is one UPDATE
+VIEW_COUNT_BUFFER = any(name in CACHES['default']['BACKEND'].lower() for name in ('redis', 'memcached'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -170,6 +187,33 @@ SIMPLE_JWT = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resumable uploads are assembled here before being attached to a model
+CHUNKED_UPLOAD_DIR = MEDIA_ROOT / 'chunked_uploads'
+# Upload sessions (and their partial files) idle this long are removed by expire_upload_sessions (seconds)
+UPLOAD_SESSION_TTL = 60 * 60 * 24
+
+# Video delivery
+# Signed stream URLs stay valid this long (seconds)
+VIDEO_STREAM_URL_TTL = 60 * 60 * 2
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) hands the transfer
+# to the front proxy; unset streams the file from Django
+VIDEO_STREAM_OFFLOAD = os.environ.get('VIDEO_STREAM_OFFLOAD')
+# nginx `internal` location that maps onto MEDIA_ROOT
+VIDEO_STREAM_ACCEL_PREFIX = '/protected-media/'
+
+# Threads for media post-processing (image derivatives, probing) run off the request path
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 2))
+
+# Video heartbeats are coalesced in memory per user and video and written in batches
+# every WATCH_FLUSH_INTERVAL seconds (0 = only when flushed explicitly), or sooner
+# once WATCH_BUFFER_SIZE pairs are waiting
+WATCH_FLUSH_INTERVAL = int(os.environ.get('WATCH_FLUSH_INTERVAL', 15))
+WATCH_BUFFER_SIZE = int(os.environ.get('WATCH_BUFFER_SIZE', 5000))
+
+# ffmpeg/ffprobe used by the transcode_videos command
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+
 # Swagger settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -2,6 +2,10 @@ import {useState, useEffect, useRef, useCallback} from 'react';
 import {Lock, AlertTriangle} from 'lucide-react';
 import {useToast} from '@/hooks/use-toast';
 import {cn} from '@/lib/utils';
+import {videosApi} from '@/services/api';
+
+// How often playback position and watched ranges are reported (ms)
+const HEARTBEAT_INTERVAL = 15000;
 
 interface SecureVideoPlayerProps {
     videoUrl: string;
@@ -9,6 +13,8 @@ interface SecureVideoPlayerProps {
     watermarkId: string;
     onComplete?: () => void;
     className?: string;
+    videoId?: string;
+    resumePosition?: number;
 }
 
 export function SecureVideoPlayer({
@@ -16,12 +22,18 @@ export function SecureVideoPlayer({
                                       title,
                                       watermarkId,
                                       onComplete,
-                                      className
+                                      className,
+                                      videoId,
+                                      resumePosition
                                   }: SecureVideoPlayerProps) {
     const {toast} = useToast();
     const containerRef = useRef<HTMLDivElement>(null);
     const videoRef = useRef<HTMLVideoElement>(null);
     const [isBlurred, setIsBlurred] = useState(false);
+    // Uploaded videos play through signed links that expire; this is replaced by a fresh one when it does
+    const [src, setSrc] = useState(videoUrl);
+    const refreshedRef = useRef(false);
+    const seekToRef = useRef<number | null>(null);
     const [watermarkPosition, setWatermarkPosition] = useState({x: 20, y: 20});
 
     // Move watermark randomly to prevent overlay removal
@@ -35,6 +47,64 @@ export function SecureVideoPlayer({
         return () => clearInterval(interval);
     }, []);
 
+    // Report where playback is and what has been watched, so it can resume later
+    useEffect(() => {
+        const videoEl = videoRef.current;
+        if (!videoId || !videoEl) return;
+
+        const sendHeartbeat = () => {
+            if (!videoEl.played.length) return;
+            const ranges: [number, number][] = [];
+            for (let i = 0; i < videoEl.played.length; i++) {
+                ranges.push([videoEl.played.start(i), videoEl.played.end(i)]);
+            }
+            videosApi.heartbeat(videoId, videoEl.currentTime, ranges).catch(() => {
+                // Next heartbeat carries the same ranges
+            });
+        };
+
+        const interval = setInterval(() => {
+            if (!videoEl.paused) sendHeartbeat();
+        }, HEARTBEAT_INTERVAL);
+        videoEl.addEventListener('pause', sendHeartbeat);
+        return () => {
+            clearInterval(interval);
+            videoEl.removeEventListener('pause', sendHeartbeat);
+            sendHeartbeat();
+        };
+    }, [videoId, videoUrl]);
+
+    useEffect(() => {
+        setSrc(videoUrl);
+        refreshedRef.current = false;
+    }, [videoUrl]);
+
+    // Start where the student stopped last time (or where playback was when the link expired)
+    const handleLoadedMetadata = useCallback(() => {
+        const videoEl = videoRef.current;
+        if (videoEl && seekToRef.current !== null) {
+            videoEl.currentTime = seekToRef.current;
+            seekToRef.current = null;
+            videoEl.play().catch(() => {});
+        } else if (videoEl && resumePosition && resumePosition < videoEl.duration - 5) {
+            videoEl.currentTime = resumePosition;
+        }
+        refreshedRef.current = false;
+    }, [resumePosition]);
+
+    // A signed link that expired mid-lesson fails with an error; fetch a fresh one once
+    const handleError = useCallback(async () => {
+        if (!videoId || refreshedRef.current) return;
+        refreshedRef.current = true;
+        try {
+            const {url} = await videosApi.getStreamUrl(videoId);
+            seekToRef.current = videoRef.current?.currentTime || null;
+            setSrc(url);
+        } catch {
+            // No access any more, or not an uploaded video
+        }
+    }, [videoId]);
+
     // Prevent right-click
     const handleContextMenu = useCallback((e: React.MouseEvent) => {
         e.preventDefault();
@@ -153,13 +223,15 @@ export function SecureVideoPlayer({
 
                 <video
                     ref={videoRef}
-                    src={videoUrl}
+                    src={src}
                     className="w-full h-full rounded-xl bg-black"
                     controls
                     playsInline
                     webkit-playsinline="true"
                     preload="metadata"
                     onEnded={onComplete}
+                    onLoadedMetadata={handleLoadedMetadata}
+                    onError={handleError}
                     // 🔴 MUHIM: mobile’da HECH QANDAY cheklov YO‘Q
                     {...(!isMobile && {
                         controlsList: "nodownload noplaybackrate",
@@ -39,16 +39,18 @@ interface Video {
 
 interface SortableVideoListProps {
     videos: Video[];
-    onReorder: (videos: Video[]) => Promise<void>;
+    // `moved` is enough for the single-row /videos/{id}/move/ endpoint
+    onReorder: (videos: Video[], moved: {id: string; afterId: string | null}) => Promise<void>;
     onVideoClick?: (video: Video) => void;
 }
 
 interface SortableItemProps {
     video: Video;
+    position: number;
     onClick?: () => void;
 }
 
-function SortableItem({video, onClick}: SortableItemProps) {
+function SortableItem({video, position, onClick}: SortableItemProps) {
     const {
         attributes,
         listeners,
@@ -75,7 +77,7 @@ function SortableItem({video, onClick}: SortableItemProps) {
             </button>
             
             <span className="flex h-8 w-8 items-center justify-center rounded-lg bg-primary/10 text-primary font-semibold text-sm">
-                {video.order}
+                {position}
             </span>
 
             <img
@@ -105,7 +107,12 @@ function SortableItem({video, onClick}: SortableItemProps) {
 export function SortableVideoList({videos, onReorder, onVideoClick}: SortableVideoListProps) {
     const [items, setItems] = useState(videos);
     const [showConfirm, setShowConfirm] = useState(false);
-    const [pendingChange, setPendingChange] = useState<{from: number; to: number; newItems: Video[]} | null>(null);
+    const [pendingChange, setPendingChange] = useState<{
+        from: number;
+        to: number;
+        newItems: Video[];
+        moved: {id: string; afterId: string | null};
+    } | null>(null);
 
     const sensors = useSensors(
         useSensor(PointerSensor),
@@ -121,15 +128,14 @@ export function SortableVideoList({videos, onReorder, onVideoClick}: SortableVid
         const oldIndex = items.findIndex(v => v.id === active.id);
         const newIndex = items.findIndex(v => v.id === over.id);
 
-        const newItems = arrayMove(items, oldIndex, newIndex).map((item, idx) => ({
-            ...item,
-            order: idx + 1,
-        }));
+        // Order keys are fractional ranks, so lessons are numbered by position
+        const newItems = arrayMove(items, oldIndex, newIndex);
 
         setPendingChange({
-            from: items[oldIndex].order,
-            to: items[newIndex].order,
+            from: oldIndex + 1,
+            to: newIndex + 1,
             newItems,
+            moved: {id: items[oldIndex].id, afterId: newIndex > 0 ? newItems[newIndex - 1].id : null},
         });
         setShowConfirm(true);
     };
@@ -137,7 +143,7 @@ export function SortableVideoList({videos, onReorder, onVideoClick}: SortableVid
     const handleConfirm = async () => {
         if (!pendingChange) return;
         setItems(pendingChange.newItems);
-        await onReorder(pendingChange.newItems);
+        await onReorder(pendingChange.newItems, pendingChange.moved);
         setShowConfirm(false);
         setPendingChange(null);
     };
@@ -152,10 +158,11 @@ export function SortableVideoList({videos, onReorder, onVideoClick}: SortableVid
             <DndContext sensors={sensors} collisionDetection={closestCenter} onDragEnd={handleDragEnd}>
                 <SortableContext items={items.map(v => v.id)} strategy={verticalListSortingStrategy}>
                     <div className="space-y-3">
-                        {items.map((video) => (
+                        {items.map((video, index) => (
                             <SortableItem
                                 key={video.id}
                                 video={video}
+                                position={index + 1}
                                 onClick={() => onVideoClick?.(video)}
                             />
                         ))}
@@ -130,6 +130,7 @@ export default function AdminTaskDetail() {
                 description: formData.description,
                 allow_resubmission: formData.allow_resubmission,
                 questions: formData.questions.map((q, idx) => ({
+                    id: q.id,
                     question: q.question,
                     options: q.options.filter(o => o.trim()),
                     correct_answer: q.correct_answer,
@@ -10,7 +10,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { useProgress } from '@/contexts/ProgressContext';
 import { useToast } from '@/hooks/use-toast';
 import api from "@/services/api.ts";
-import { modulesApi, userCoursesApi } from '@/services/api';
+import { categoriesApi, modulesApi, userCoursesApi } from '@/services/api';
 
 type ViewMode = 'card' | 'table';
 type FilterStatus = 'all' | 'completed' | 'not-completed' | 'locked';
@@ -27,13 +27,14 @@ interface Module {
 export default function StudentCategoryView() {
     const { categoryId } = useParams();
     const navigate = useNavigate();
-    const { isVideoCompleted, isTaskCompleted } = useProgress();
+    const { isVideoCompleted, isTaskCompleted, completedVideos, completedTasks } = useProgress();
     const { toast } = useToast();
     const [category, setCategory] = useState<any>(null);
     const [allVideos, setAllVideos] = useState<any[]>([]);
     const [modules, setModules] = useState<Module[]>([]);
     const [selectedModuleId, setSelectedModuleId] = useState<string | null>(null);
     const [accessibleModuleIds, setAccessibleModuleIds] = useState<string[]>([]);
+    const [unlockedVideoIds, setUnlockedVideoIds] = useState<Set<string> | null>(null);
     const [viewMode, setViewMode] = useState<ViewMode>('card');
     const [search, setSearch] = useState('');
     const [filterStatus, setFilterStatus] = useState<FilterStatus>('all');
@@ -88,6 +89,15 @@ export default function StudentCategoryView() {
         }
     };
 
+    const getUnlockedVideos = async (categoryId: string) => {
+        try {
+            const response = await categoriesApi.getUnlocked(categoryId);
+            setUnlockedVideoIds(new Set((response?.unlocked_video_ids || []).map(String)));
+        } catch (e) {
+            console.log(e);
+        }
+    };
+
     const getVideosByCategoryId = async (categoryId: string, moduleId?: string) => {
         try {
             const response = await api.get(`/videos/by_category/`, {
@@ -117,6 +127,13 @@ export default function StudentCategoryView() {
         }
     }, [categoryId]);
 
+    // The server decides what is unlocked; ask again whenever progress changes
+    useEffect(() => {
+        if (categoryId) {
+            getUnlockedVideos(categoryId);
+        }
+    }, [categoryId, completedVideos, completedTasks]);
+
     useEffect(() => {
         if (selectedModuleId && categoryId) {
             getVideosByCategoryId(categoryId, selectedModuleId);
@@ -141,7 +158,9 @@ export default function StudentCategoryView() {
     // Check if video is locked (previous video not completed or task not done)
     const isVideoLocked = (video: any): boolean => {
         if (!category?.requires_sequential) return false;
-        
+        if (unlockedVideoIds) return !unlockedVideoIds.has(String(video.id));
+
+        // Until the server answers, fall back to the same rule on the loaded videos
         const videoIndex = allVideos.findIndex(v => v.id === video.id);
         if (videoIndex === 0) return false; // First video is always unlocked
 
@@ -149,8 +168,8 @@ export default function StudentCategoryView() {
         if (!isVideoCompleted(previousVideo.id)) return true;
 
         // Check if previous video's task is completed (if it has one)
-        if (previousVideo.tasks && previousVideo.tasks.length > 0) {
-            const hasCompletedTask = previousVideo.tasks.some((task: any) => isTaskCompleted(task.id));
+        if (previousVideo.task_ids && previousVideo.task_ids.length > 0) {
+            const hasCompletedTask = previousVideo.task_ids.some((taskId: any) => isTaskCompleted(taskId));
             if (!hasCompletedTask) return true;
         }
 
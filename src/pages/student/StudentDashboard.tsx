@@ -7,7 +7,7 @@ import {VideoCard} from '@/components/VideoCard';
 import {CategoryCard} from '@/components/CategoryCard';
 import {useAuth} from '@/contexts/AuthContext';
 import {useProgress} from '@/contexts/ProgressContext';
-import {videosApi, categoriesApi, userCoursesApi} from '@/services/api';
+import {videosApi, categoriesApi, userCoursesApi, progressApi} from '@/services/api';
 
 export default function StudentDashboard() {
     const {user} = useAuth();
@@ -16,6 +16,7 @@ export default function StudentDashboard() {
     const [accessibleVideos, setAccessibleVideos] = useState<any[]>([]);
     const [accessibleCategories, setAccessibleCategories] = useState<any[]>([]);
     const [allCategories, setAllCategories] = useState<any[]>([]);
+    const [courseSummaries, setCourseSummaries] = useState<any[]>([]);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
@@ -25,10 +26,11 @@ export default function StudentDashboard() {
     const fetchData = async () => {
         try {
             // Get user's accessible courses
-            const [myCoursesRes, categoriesRes, videosRes] = await Promise.all([
+            const [myCoursesRes, categoriesRes, videosRes, summariesRes] = await Promise.all([
                 userCoursesApi.getMyCourses(),
                 categoriesApi.getAll(),
                 videosApi.getAll(),
+                progressApi.getCourseSummaries(),
             ]);
             
             const myCourses = myCoursesRes?.results || myCoursesRes || [];
@@ -36,6 +38,7 @@ export default function StudentDashboard() {
             const allVideos = videosRes?.results || videosRes || [];
             
             setAllCategories(categories);
+            setCourseSummaries(summariesRes || []);
             
             // Filter categories that user has access to (and are active)
             const accessibleCategoryIds = myCourses.map((c: any) => String(c.category?.id || c.category));
@@ -71,8 +74,11 @@ export default function StudentDashboard() {
         }
     };
 
-    const totalVideos = accessibleVideos.length || 1;
-    const completedVideosCount = completedVideos.length;
+    // Per-course totals come precomputed from the server
+    const totalVideos = courseSummaries.reduce((sum, s) => sum + s.total_videos, 0) || 1;
+    const completedVideosCount = courseSummaries.length > 0
+        ? courseSummaries.reduce((sum, s) => sum + s.completed_videos, 0)
+        : completedVideos.length;
     const progressPercent = totalVideos > 0 ? Math.round((completedVideosCount / totalVideos) * 100) : 0;
 
     return (
@@ -60,13 +60,14 @@ export default function StudentSubmissionDetail() {
 
   const loadData = async () => {
     try {
-      const subData = await submissionsApi.getById(submissionId!);
+      // The answer key only comes with the graded submission, not with the task
+      const subData = await submissionsApi.getDetailWithAnswers(submissionId!);
       setSubmission(subData);
       
       // Load task
       const taskId = typeof subData.task === 'object' ? subData.task.id : subData.task;
       const taskData = await tasksApi.getById(String(taskId));
-      setTask(taskData);
+      setTask({ ...taskData, questions: subData.questions_detail || taskData.questions });
       
       // Load video
       if (taskData.video) {
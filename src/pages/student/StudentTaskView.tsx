@@ -16,7 +16,7 @@ interface TaskQuestion {
     id: number;
     question: string;
     options: string[];
-    correct_answer: number;
+    correct_answer?: number;
     order: number;
 }
 
@@ -156,21 +156,12 @@ export default function StudentTaskView() {
             formData.append('task_id', String(task.id));
 
             if (task.task_type === 'test') {
-                // Calculate score
-                let correct = 0;
-                task.questions.forEach(q => {
-                    if (answers[String(q.id)] === q.correct_answer) {
-                        correct++;
-                    }
-                });
-
                 formData.append('answers', JSON.stringify(answers));
-                formData.append('score', String(correct));
-                formData.append('total', String(task.questions.length));
 
-                await submissionsApi.submit(formData);
+                // The server grades the answers
+                const submission = await submissionsApi.submit(formData);
 
-                setScore({correct, total: task.questions.length});
+                setScore({correct: submission.score, total: submission.total});
                 setSubmitted(true);
 
                 // Mark task as completed
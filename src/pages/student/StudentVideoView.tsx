@@ -31,6 +31,7 @@ interface Video {
     category: string;
     category_name?: string;
     order: number;
+    resume_position?: number;
 }
 
 interface Task {
@@ -320,6 +321,8 @@ export default function StudentVideoView() {
                             title={video.title}
                             watermarkId={user?.watermark_id || user?.id?.toString().slice(-8).toUpperCase() || 'USER'}
                             onComplete={handleMarkCompleted}
+                            videoId={video.id}
+                            resumePosition={video.resume_position}
                         />
 
                         {/* Video Info */}
@@ -533,7 +536,7 @@ export default function StudentVideoView() {
                          style={{animationDelay: '0.2s'}}>
                         <h3 className="font-semibold text-card-foreground mb-4">Bu bo'limdagi boshqa darslar</h3>
                         <div className="space-y-3 max-h-[300px] overflow-y-auto">
-                            {categoryVideos.map((v) => {
+                            {categoryVideos.map((v, index) => {
                                 const locked = isVideoLocked(v.id);
                                 const videoCompleted = isVideoCompleted(v.id);
 
@@ -558,7 +561,7 @@ export default function StudentVideoView() {
                         }`}
                     >
                       {videoCompleted ? <CheckCircle2 className="h-4 w-4"/> :
-                          locked ? <Lock className="h-3 w-3"/> : v.order}
+                          locked ? <Lock className="h-3 w-3"/> : index + 1}
                     </span>
                                         <div className="flex-1 min-w-0">
                                             <p className={`font-medium truncate ${String(v.id) === String(videoId) ? 'text-primary' : locked ? 'text-muted-foreground' : 'text-foreground'}`}>
@@ -75,6 +75,9 @@ export const categoriesApi = {
   addModule: async (categoryId: string, data: any) => {
     return api.post(`/categories/${categoryId}/add_module/`, data);
   },
+  getUnlocked: async (categoryId: string) => {
+    return api.get(`/categories/${categoryId}/unlocked/`);
+  },
 };
 
 // Modules API
@@ -122,6 +125,15 @@ export const videosApi = {
   incrementView: async (id: string) => {
     return api.post(`/videos/${id}/increment_view/`, {});
   },
+  getStreamUrl: async (id: string) => {
+    return api.get(`/videos/${id}/stream_url/`);
+  },
+  heartbeat: async (id: string, position: number, watchedRanges: [number, number][]) => {
+    return api.post(`/videos/${id}/heartbeat/`, { position, watched_ranges: watchedRanges });
+  },
+  getAnalytics: async (id: string) => {
+    return api.get(`/videos/${id}/analytics/`);
+  },
 };
 
 // Tasks API
@@ -148,6 +160,9 @@ export const tasksApi = {
   getStats: async (taskId: string) => {
     return api.get(`/tasks/${taskId}/stats/`);
   },
+  getBatchStats: async (taskIds: string[]) => {
+    return api.get(`/tasks/batch_stats/?ids=${taskIds.join(',')}`);
+  },
   linkToVideo: async (taskId: string, videoId: string) => {
     return api.post(`/tasks/${taskId}/link_to_video/`, { video_id: parseInt(videoId, 10) || videoId });
   },
@@ -158,8 +173,11 @@ export const videoStatsApi = {
   getVideoStats: async (videoId: string) => {
     return api.get(`/videos/${videoId}/stats/`);
   },
-  updateOrder: async (videoId: string, newOrder: number) => {
-    return api.post(`/videos/${videoId}/update_order/`, { order: newOrder });
+  getBatchVideoStats: async (videoIds: string[]) => {
+    return api.get(`/videos/batch_stats/?ids=${videoIds.join(',')}`);
+  },
+  moveVideo: async (videoId: string, afterId: string | null) => {
+    return api.post(`/videos/${videoId}/move/`, { after_id: afterId });
   },
   bulkUpdateOrder: async (orderUpdates: { id: string; order: number }[]) => {
     return api.post('/videos/bulk_update_order/', { updates: orderUpdates });
@@ -204,6 +222,15 @@ export const progressApi = {
   getUserProgress: async (userId: string) => {
     return api.get(`/progress/user_progress/?user_id=${userId}`);
   },
+  getCourseSummaries: async (categoryId?: string) => {
+    return api.get('/progress/courses/', categoryId ? { category_id: categoryId } : undefined);
+  },
+  sync: async (
+    events: { type: 'video' | 'task'; id: string | number; completed_at?: string }[],
+    cursor?: string
+  ) => {
+    return api.post('/progress/sync/', { events, cursor });
+  },
 };
 
 // Task Submissions API